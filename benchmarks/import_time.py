@@ -0,0 +1,94 @@
+"""
+Import time regression check.
+
+Imports each entry point in a fresh interpreter with `python -X importtime`
+and fails when its cumulative import time exceeds the budget or when it
+pulls in one of the heavy modules that must only be loaded on use (the
+OpenAI client, Swarm, pyarrow, ...). The best of several runs counts, so a
+busy machine does not cause false alarms.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 50 --repeat 10 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Entry points and their import budgets in milliseconds.
+BUDGETS_MS = {
+    "swarm_agents": 50,
+    "swarm_cli": 50,
+    "swarm_batch": 60,
+}
+# Modules an import of the entry points must not load.
+FORBIDDEN = ("openai", "swarm", "pyarrow", "lunary", "dotenv", "pydantic", "requests", "httpx")
+# "import time:       123 |       4567 |     package.module"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module: str, python: str = sys.executable) -> dict:
+    """
+    Imports `module` once in a fresh interpreter.
+
+    Returns:
+        dict: total (cumulative microseconds of the module), modules (name -> cumulative microseconds).
+    """
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-3000:]}")
+    # (depth, name, cumulative microseconds); children are listed before their parent, one level deeper.
+    lines = [(len(match.group(3)) // 2, match.group(4), int(match.group(2)))
+             for match in map(IMPORTTIME_LINE.match, result.stderr.splitlines()) if match]
+    # Everything before the module's own subtree was imported at startup (site, ...).
+    end = max((index for index, (depth, name, _) in enumerate(lines) if depth == 0 and name == module), default=None)
+    if end is None:
+        return {"total": 0, "modules": {}}
+    start = end
+    while start > 0 and lines[start - 1][0] > 0:
+        start -= 1
+    modules = {name: micros for _, name, micros in lines[start:end + 1]}
+    return {"total": modules.get(module, 0), "modules": modules}
+
+
+def check(module: str, budget_ms: float, repeat: int = 5, top: int = 10) -> list:
+    """Measures `module` `repeat` times, prints the best run and returns the problems found."""
+    runs = [measure(module) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["total"])
+    problems = []
+    total_ms = best["total"] / 1000
+    if total_ms > budget_ms:
+        problems.append(f"{module}: {total_ms:.1f} ms > budget {budget_ms:.0f} ms")
+    loaded = sorted({name.split(".")[0] for run in runs for name in run["modules"]} & set(FORBIDDEN))
+    if loaded:
+        problems.append(f"{module}: imports {', '.join(loaded)} at import time")
+
+    print(f"{module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms, best of {repeat})")
+    own = [(name, micros) for name, micros in best["modules"].items() if name != module]
+    for name, micros in sorted(own, key=lambda item: -item[1])[:top]:
+        print(f"    {micros / 1000:8.1f} ms  {name}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time regression check of the entry points")
+    parser.add_argument("modules", nargs="*", help=f"Modules to check (default: {', '.join(BUDGETS_MS)})")
+    parser.add_argument("--budget-ms", type=float, help="Budget for every module instead of the defaults")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to show per module")
+    args = parser.parse_args(argv)
+
+    problems = []
+    for module in args.modules or list(BUDGETS_MS):
+        budget = args.budget_ms or BUDGETS_MS.get(module, 100)
+        problems += check(module, budget, args.repeat, args.top)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,290 @@
+"""
+Agents of the swarm and the headless pipeline of one SWE-Bench instance.
+
+Importing this module is cheap and has no side effects: the Swarm client
+(with .env loading, the completion cache, tracing, parallel tool calls and
+checkpoints) is created on first use by get_client(), the agents by
+create_agents(), which also imports the tools. The command line lives in
+swarm_cli.py.
+"""
 import logging
-import os
-from swarm import Swarm, Agent
-from swarm.repl import run_demo_loop
-from swarm_prompts import *
-from tools.file_toolkit import extract_function, find_and_replace, list_files_in_repository, list_functions, modify_function, modify_function_args, modify_return_type, read_file, remove_function, write_file
-from tools.github_toolkit import analyze_issue, clone_repository, checkout_commit
-from tools.executor_toolkit import run_code_execution
-from openai import OpenAI
-from dotenv import load_dotenv
-import pyarrow.parquet as pq
-import lunary
 import re
-import random
+import threading
+
+from swarm_prompts import *
+
+MODEL = "gpt-4o-mini"
+TERMINATION_MARKER = "TERMINATEEXEC"
+SUCCESS_MARKER = "SUCCESSFUL TERMINATEEXEC"
+
+_lock = threading.Lock()
+_client = None
+_agents = None
+
+
+def get_client():
+    """The shared Swarm client, created on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            from dotenv import load_dotenv
+
+            from swarm_checkpoint import CheckpointSwarm
+            from swarm_llm_cache import CachingClient
+
+            load_dotenv()
+            # Record/replay completion cache, see swarm_llm_cache.py (SWARM_LLM_CACHE).
+            openai_client = CachingClient()
+            # import lunary
+            # lunary.tags_ctx.set(None)
+            # lunary.tags_ctx.set("SECOND")
+            # lunary.monitor(openai_client)
+
+            # Records agent turns, LLM calls, tool calls and handoffs, see swarm_tracing.py (SWARM_TRACE),
+            # runs independent tool calls of one turn concurrently, see swarm_parallel.py (SWARM_TOOL_THREADS),
+            # and saves a checkpoint after every turn of recorded runs, see swarm_checkpoint.py.
+            _client = CheckpointSwarm(client=openai_client)
+    return _client
 
-load_dotenv()
 
-openai_client=OpenAI()
-# lunary.tags_ctx.set(None)
-# lunary.tags_ctx.set("SECOND")
-# lunary.monitor(openai_client)
+def create_agents(hand_off: bool = True) -> dict:
+    """
+    Creates the Issue Analyzer, Triage, Coder, File and Tester agents. Handoffs go to agents of the same set.
 
-client = Swarm(client=openai_client)
+    Args:
+        hand_off (bool): Let the Issue Analyzer transfer to Triage. Without it the analyzer ends its run with the analysis.
 
-def transfer_to_coder():
-    """Transfers to Coder Agent"""
-    return coder_agent
+    Returns:
+        dict: Agents by name.
+    """
+    from swarm import Agent
 
-def transfer_to_file_agent():
-    """Transfers to File Agent"""
-    return file_agent
+    from tools.code_search import search_code
+    from tools.code_store import apply_diff, resolve_handle, store_file
+    from tools.edit_session import begin_edit_session, commit_edit_session, rollback_edit_session
+    from tools.executor_toolkit import run_code_execution, run_impacted_tests
+    from tools.file_toolkit import extract_function, find_and_replace, list_files_in_repository, list_functions, modify_function, read_file, write_file
+    from tools.github_toolkit import analyze_issue, checkout_commit, clone_repository, find_related_files
+    from tools.symbol_index import find_symbol, goto_symbol
+    from tools.test_digest import get_test_details
 
-def transfer_to_tester():
-    """Transfers to Tester Agent"""
-    return tester_agent
+    agents = {}
 
-def transfer_to_triage():
-    """Transfers to Triage Agent"""
-    return triage_agent
+    def transfer_to_coder():
+        """Transfers to Coder Agent"""
+        return agents["Coder"]
 
-def create_issue_analyzer_agent():
-    return Agent(
-        name="Issue Analyzer",
-        instructions=GITHUB_PROMPT + "When done transfer to Triage. NO USER INPUT NEEDED",
-        model="gpt-4o-mini",
-        functions=[analyze_issue, clone_repository, checkout_commit, transfer_to_triage],
+    def transfer_to_file_agent():
+        """Transfers to File Agent"""
+        return agents["File"]
+
+    def transfer_to_tester():
+        """Transfers to Tester Agent"""
+        return agents["Tester"]
+
+    def transfer_to_triage():
+        """Transfers to Triage Agent"""
+        return agents["Triage"]
+
+    analyzer_functions = [analyze_issue, clone_repository, checkout_commit, search_code, find_symbol, store_file]
+    if hand_off:
+        agents["Issue Analyzer"] = Agent(
+            name="Issue Analyzer",
+            instructions=GITHUB_PROMPT + "When done transfer to Triage. NO USER INPUT NEEDED",
+            model=MODEL,
+            functions=analyzer_functions + [transfer_to_triage],
+        )
+    else:
+        agents["Issue Analyzer"] = Agent(
+            name="Issue Analyzer",
+            instructions=GITHUB_PROMPT + "When done answer with the JSON structure. NO USER INPUT NEEDED",
+            model=MODEL,
+            functions=analyzer_functions,
+        )
+    agents["Triage"] = Agent(
+        name="Triage",
+        instructions=TRIAGE_PROMPT,
+        model=MODEL,
+        functions=[transfer_to_file_agent, transfer_to_coder, transfer_to_tester]
+    )
+    agents["Coder"] = Agent(
+        name="Coder",
+        instructions=PROMPT_CODE_GEN + "When done transfer to File Agent. NO USER INPUT NEEDED",
+        model=MODEL,
+        functions=[resolve_handle, search_code, find_symbol, goto_symbol, transfer_to_file_agent]
+    )
+    agents["File"] = Agent(
+        name="File",
+        instructions=PROMPT_FILE_MANIPULATOR + "When all files are manipulated transfer to Triage and claim TERMINATE. NO USER INPUT NEEDED",
+        model=MODEL,
+        functions=[begin_edit_session, commit_edit_session, rollback_edit_session, apply_diff, resolve_handle, store_file, write_file, modify_function, find_and_replace, read_file, search_code, find_symbol, goto_symbol, list_files_in_repository, list_functions, extract_function, find_related_files, transfer_to_triage]
     )
+    agents["Tester"] = Agent(
+        name="Tester",
+        instructions=CODE_PREP + "Use run_impacted_tests to run the existing tests affected by the changes before running your own test file. When execution was not sucessful. Transfer back to triage. When successfull terminate.",
+        model=MODEL,
+        functions=[resolve_handle, write_file, run_code_execution, run_impacted_tests, get_test_details, transfer_to_triage]
+    )
+    return agents
+
+
+def get_agents() -> dict:
+    """The shared agents by name (e.g. to continue a checkpointed run with its active agent), created on first use."""
+    global _agents
+    with _lock:
+        if _agents is None:
+            _agents = create_agents()
+    return _agents
+
+
+# Module attributes of earlier versions, resolved on first access.
+_LAZY_AGENTS = {"issue_analyzer_agent": "Issue Analyzer", "triage_agent": "Triage", "coder_agent": "Coder",
+                "file_agent": "File", "tester_agent": "Tester"}
+
+
+def __getattr__(name):
+    if name == "client":
+        return get_client()
+    if name == "AGENTS":
+        return get_agents()
+    if name in _LAZY_AGENTS:
+        return get_agents()[_LAZY_AGENTS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def build_task_message(row: dict) -> str:
+    """Builds the initial user message for a SWE-Bench row."""
+    repo = row["repo"]
+    issue = int(re.search(r'\d+', row["instance_id"]).group())
+    commit = row["base_commit"]
+    issue_detail = row["problem_statement"]
+    return f"{repo}/{issue} with base commit {commit} \n ISSUE Description:\n {issue_detail}".replace("\n", " ")
+
+
+def run_instance(row: dict, max_turns: int = 30, max_rounds: int = 10, resume: bool = False) -> dict:
+    """
+    Runs the Issue Analyzer -> Triage -> Coder/File/Tester pipeline for one SWE-Bench row without user input.
+    A checkpoint is saved after every turn.
+
+    Args:
+        row (dict): SWE-Bench row with repo, instance_id, base_commit and problem_statement.
+        max_turns (int): Maximum number of agent turns per round.
+        max_rounds (int): Maximum number of rounds. A round ends when an agent answers without calling a tool.
+        resume (bool): Continue from the last checkpoint of the instance if there is one.
+
+    Returns:
+        dict: Summary of the run (instance_id, last agent, success flag, message count, last message).
+    """
+    import swarm_checkpoint
+    from swarm_tracing import span
+    from tools import env_manager
+    from tools.workspace import repo_path
+
+    client = get_client()
+    agents = get_agents()
+    checkpointer = swarm_checkpoint.Checkpointer(row)
+    # Tests of the checkout run in the cached environment of the instance's repository version.
+    env_manager.bind(repo_path(checkpointer.repository), row)
+    state = checkpointer.load() if resume else None
+    if state is not None and state["result"] is not None:
+        return state["result"]
+    if state is not None:
+        checkpointer.restore(state)
+        messages = state["messages"]
+        agent = agents[state["agent"]]
+        context_variables = state["context_variables"]
+    else:
+        messages = [{"role": "user", "content": build_task_message(row)}]
+        agent = agents["Issue Analyzer"]
+        # Tools keep per-conversation state (e.g. which file versions read_file already returned) under the session id.
+        context_variables = {"session_id": row["instance_id"]}
+    content = ""
+    with span("instance", row["instance_id"], instance_id=row["instance_id"], resumed=state is not None) as instance_span, \
+            swarm_checkpoint.recording(checkpointer):
+        for number in range(checkpointer.round, max_rounds):
+            checkpointer.round = number
+            response = client.run(agent=agent, messages=messages, context_variables=context_variables, max_turns=max_turns)
+            messages.extend(response.messages)
+            agent = response.agent
+            context_variables = response.context_variables
+            content = messages[-1].get("content") or ""
+            if TERMINATION_MARKER in content:
+                break
+            messages.append({"role": "user", "content": "Continue. NO USER INPUT NEEDED"})
+        instance_span.attributes["success"] = SUCCESS_MARKER in content
+
+    result = {
+        "instance_id": row["instance_id"],
+        "agent": agent.name,
+        "success": SUCCESS_MARKER in content,
+        "messages": len(messages),
+        "last_message": content,
+    }
+    try:
+        checkpointer.save(agent.name, messages, context_variables, result=result)
+    except Exception as e:
+        logging.warning("Final checkpoint of %s failed: %s", row["instance_id"], e)
+    return result
+
+
+def _print_message(message: dict):
+    if message.get("role") != "assistant":
+        return
+    if message.get("content"):
+        print(f"\033[94m{message.get('sender', 'Assistant')}\033[0m: {message['content']}")
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call["function"]
+        print(f"\033[95m{function['name']}\033[0m({function['arguments']})")
+
+
+def run_interactive(row: dict):
+    """Runs the agents on a SWE-Bench row in the console REPL. Turns are checkpointed, see resume_interactive."""
+    import swarm_checkpoint
+    from swarm.repl import run_demo_loop
+
+    print(row["repo"])
+    print(int(re.search(r'\d+', row["instance_id"]).group()))
+    # Paste the console Output to the Chat (Semi-Implement SWE...)
+    print(build_task_message(row))
+    with swarm_checkpoint.recording(swarm_checkpoint.Checkpointer(row)):
+        run_demo_loop(get_client(), get_agents()["Issue Analyzer"], stream=True)
+
+
+def resume_interactive(instance_id: str):
+    """Continues a checkpointed run on the console. An empty input lets the active agent continue."""
+    import swarm_checkpoint
+
+    state = swarm_checkpoint.load(instance_id)
+    if state is None:
+        print(f"No checkpoint for {instance_id}.")
+        return
+    client = get_client()
+    checkpointer = swarm_checkpoint.Checkpointer(state["row"], state["repository"])
+    checkpointer.restore(state)
+    messages = state["messages"]
+    agent = get_agents()[state["agent"]]
+    context_variables = state["context_variables"]
+    print(f"Resuming {instance_id} with {agent.name} after {len(messages)} messages. Ctrl-D to quit.")
+    with swarm_checkpoint.recording(checkpointer):
+        while True:
+            try:
+                user_input = input("\033[90mUser\033[0m: ")
+            except EOFError:
+                break
+            if user_input.strip():
+                messages.append({"role": "user", "content": user_input})
+            response = client.run(agent=agent, messages=messages, context_variables=context_variables)
+            for message in response.messages:
+                _print_message(message)
+            messages.extend(response.messages)
+            agent = response.agent
+            context_variables = response.context_variables
+
+
+if __name__ == "__main__":
+    import sys
+
+    from swarm_cli import main
 
-issue_analyzer_agent = create_issue_analyzer_agent()
-triage_agent = Agent(
-    name="Triage",
-    instructions=TRIAGE_PROMPT,
-    model="gpt-4o-mini",
-    functions=[transfer_to_file_agent, transfer_to_coder, transfer_to_tester]
-)
-coder_agent = Agent(
-    name="Coder",
-    instructions=PROMPT_CODE_GEN + "When done transfer to File Agent. NO USER INPUT NEEDED",
-    model="gpt-4o-mini",
-    functions=[transfer_to_file_agent]
-)
-
-file_agent = Agent(
-    name="File",
-    instructions=PROMPT_FILE_MANIPULATOR + "When all files are manipulated transfer to Triage and claim TERMINATE. NO USER INPUT NEEDED",
-    model="gpt-4o-mini",
-    functions=[write_file, modify_function, find_and_replace, read_file, list_files_in_repository, list_functions, extract_function, transfer_to_triage]
-)
-
-tester_agent = Agent(
-    name= "Tester",
-    instructions=CODE_PREP + "When execution was not sucessful. Transfer back to triage. When successfull terminate.",
-    model="gpt-4o-mini",
-    functions=[write_file, run_code_execution, transfer_to_triage]
-)
-
-table = pq.read_table('.\\swebench\\test-00000-of-00001.parquet')
-
-data_dict = table.to_pydict()
-columns = data_dict.keys()
-rows = [{col: data_dict[col][i] for col in columns} for i in range(len(next(iter(data_dict.values()))))]
-
-random.seed(30)
-random.shuffle(rows)
-
-# Enter a number to get any row of SWE-Bench
-row = rows[42]
-repo = row["repo"]
-print(repo)
-issue = int(re.search(r'\d+', row["instance_id"]).group())
-print(issue)
-commit = row["base_commit"]
-issue_detail = row["problem_statement"]
-
-# print(response.messages[-1]["content"])
-
-# Paste the console Output to the Chat (Semi-Implement SWE...)
-print(f"{repo}/{issue} with base commit {commit} \n ISSUE Description:\n {issue_detail}".replace("\n", " "))
-
-run_demo_loop(client, issue_analyzer_agent, stream=True)
+    # Kept for `python swarm_agents.py [--resume INSTANCE_ID]`: the interactive demo run.
+    main(["run", "--interactive", *sys.argv[1:]])
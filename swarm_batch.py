@@ -0,0 +1,368 @@
+"""
+Headless batch runner for SWE-Bench instances.
+
+Jobs live in a SQLite queue so that a run survives worker crashes and can be
+scaled by starting more workers against the same queue file:
+
+    python swarm_batch.py enqueue --queue runs/nightly.sqlite --repo django/django --slice 0:100
+    python swarm_batch.py work --queue runs/nightly.sqlite --workers 4
+    python swarm_batch.py work --queue runs/nightly.sqlite --workers 2 --best-of 4
+    python swarm_batch.py status --queue runs/nightly.sqlite
+    python swarm_batch.py envs --repo django/django
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import socket
+import sqlite3
+import time
+import traceback
+
+from swarm_dataset import DATASET_PATH, DatasetStore
+
+INSTANCE_WORKSPACES = os.path.join("coding", "instances")
+# Extra seconds a worker gets on top of the job timeout before its lease is considered dead.
+LEASE_GRACE = 60
+
+
+class JobQueue:
+    """SQLite backed job queue with per-instance status, retries and leases."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    instance_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    timeout REAL NOT NULL,
+                    worker TEXT,
+                    lease_expires REAL,
+                    error TEXT,
+                    result TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, rows, max_attempts: int = 3, timeout: float = 3600) -> int:
+        """Adds rows to the queue. Instances that are already queued are left untouched."""
+        now = time.time()
+        added = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (instance_id, payload, max_attempts, timeout, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (row["instance_id"], json.dumps(row), max_attempts, timeout, now, now),
+                )
+                added += cursor.rowcount
+            conn.execute("COMMIT")
+        return added
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float):
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+            "error = 'lease expired (worker died or timed out)', worker = NULL, lease_expires = NULL, updated = ? "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (now, now),
+        )
+
+    def claim(self, worker: str):
+        """Leases the oldest pending job to a worker. Returns the job row or None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire_leases(conn, now)
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' ORDER BY created, instance_id LIMIT 1"
+            ).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                    "lease_expires = ?, updated = ? WHERE instance_id = ?",
+                    (worker, now + job["timeout"] + LEASE_GRACE, now, job["instance_id"]),
+                )
+            conn.execute("COMMIT")
+        return job
+
+    # Results are only accepted from the worker still holding the lease of the attempt, never from one
+    # whose lease expired and whose job may have been handed to another worker in the meantime.
+    _LEASE_HELD = "instance_id = ? AND status = 'running' AND worker = ? AND attempts = ? AND lease_expires >= ?"
+
+    def complete(self, instance_id: str, result: dict, worker: str, attempt: int) -> bool:
+        """Stores the result of an attempt. Returns False (and stores nothing) if the worker lost its lease."""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_expires = NULL, updated = ? "
+                f"WHERE {self._LEASE_HELD}",
+                (json.dumps(result), now, instance_id, worker, attempt, now),
+            ).rowcount == 1
+
+    def fail(self, instance_id: str, error: str, worker: str, attempt: int) -> bool:
+        """
+        Marks a job as failed, or puts it back into the queue while it has attempts left.
+        Returns False (and changes nothing) if the worker lost its lease.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+                f"error = ?, worker = NULL, lease_expires = NULL, updated = ? WHERE {self._LEASE_HELD}",
+                (error, now, instance_id, worker, attempt, now),
+            ).rowcount == 1
+
+    def retry_failed(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, updated = ? WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+
+    def counts(self) -> dict:
+        with self._connect() as conn:
+            self._expire_leases(conn, time.time())
+            return {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    def jobs(self, status: str = None) -> list:
+        query = "SELECT instance_id, status, attempts, worker, error, result FROM jobs"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query + " ORDER BY instance_id", params)]
+
+
+def select_rows(dataset_path: str = DATASET_PATH, instance_ids: list = None, row_slice: str = None,
+                repo: str = None, pattern: str = None) -> list:
+    """
+    Selects SWE-Bench rows by instance ids, repository, instance id regex and/or a python style slice.
+
+    Args:
+        dataset_path (str): Path to the SWE-Bench parquet file.
+        instance_ids (list): Explicit instance ids to select.
+        row_slice (str): Slice of the (filtered) rows, e.g. "0:50" or "::10".
+        repo (str): Only rows of this repository, e.g. "django/django".
+        pattern (str): Regex the instance id has to match.
+
+    Returns:
+        list: Selected rows as dicts.
+    """
+    dataset = DatasetStore(dataset_path)
+    ids = dataset.instance_ids()
+    positions = range(len(ids))
+
+    if instance_ids:
+        wanted = set(instance_ids)
+        positions = [i for i in positions if ids[i] in wanted]
+    if repo:
+        repos = dataset.column("repo")
+        positions = [i for i in positions if repos[i] == repo]
+    if pattern:
+        regex = re.compile(pattern)
+        positions = [i for i in positions if regex.search(ids[i])]
+    if row_slice:
+        positions = list(positions)[slice(*[int(part) if part else None for part in row_slice.split(":")])]
+    return list(dataset.iter_rows(positions))
+
+
+def _execute_instance(row: dict, conn, resume: bool = False):
+    try:
+        # Each instance gets its own workspace, so instances of the same repository never share a checkout.
+        os.environ["SWARM_WORKSPACE"] = os.path.join(INSTANCE_WORKSPACES, row["instance_id"])
+        candidates = int(os.getenv("SWARM_BEST_OF", "1"))
+        if candidates > 1:
+            import swarm_best_of_n
+
+            conn.send(("ok", swarm_best_of_n.run_best_of_n(row, candidates)))
+        else:
+            import swarm_agents
+
+            conn.send(("ok", swarm_agents.run_instance(row, resume=resume)))
+    except BaseException:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def _run_job(queue: JobQueue, job, worker: str):
+    """Runs one job in its own process so that crashes and hangs cannot take the worker down."""
+    row = json.loads(job["payload"])
+    # The job row is read before the claim counted the attempt.
+    attempt = job["attempts"] + 1
+    ctx = multiprocessing.get_context("spawn")
+    receiver, sender = ctx.Pipe(duplex=False)
+    # Retries continue from the checkpoint of the failed attempt instead of starting over.
+    process = ctx.Process(target=_execute_instance, args=(row, sender, job["attempts"] > 0), daemon=False)
+    process.start()
+    sender.close()
+
+    outcome = None
+    # poll also returns when the process died and closed its end of the pipe; recv then raises EOFError.
+    timed_out = not receiver.poll(job["timeout"])
+    if not timed_out:
+        try:
+            outcome = receiver.recv()
+        except EOFError:
+            pass
+    process.join(0 if timed_out else 10)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+    if outcome is None:
+        if timed_out:
+            error = f"timeout after {job['timeout']}s"
+        elif process.exitcode < 0:
+            error = f"instance process killed by signal {-process.exitcode}"
+        else:
+            error = f"instance process crashed with exit code {process.exitcode}"
+        recorded = queue.fail(row["instance_id"], error, worker, attempt)
+    elif outcome[0] == "ok":
+        recorded = queue.complete(row["instance_id"], outcome[1], worker, attempt)
+    else:
+        recorded = queue.fail(row["instance_id"], outcome[1], worker, attempt)
+    if not recorded:
+        print(f"[{worker}] {row['instance_id']}: lease of attempt {attempt} lost, its outcome was discarded")
+
+
+def worker_loop(queue_path: str, worker_name: str, poll_interval: float = 5, exit_when_idle: bool = True):
+    """Claims and runs jobs until the queue is drained (or forever if exit_when_idle is False)."""
+    queue = JobQueue(queue_path)
+    while True:
+        job = queue.claim(worker_name)
+        if job is None:
+            if exit_when_idle and not queue.counts().get("running"):
+                return
+            time.sleep(poll_interval)
+            continue
+        print(f"[{worker_name}] {job['instance_id']} (attempt {job['attempts'] + 1}/{job['max_attempts']})")
+        _run_job(queue, job, worker_name)
+
+
+def run_workers(queue_path: str, workers: int, exit_when_idle: bool = True):
+    """Starts a pool of worker processes on the queue and waits for them."""
+    host = socket.gethostname()
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=worker_loop, args=(queue_path, f"{host}-{os.getpid()}-{i}"),
+                    kwargs={"exit_when_idle": exit_when_idle})
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch runner for SWE-Bench instances")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue", help="Add instances to the queue")
+    enqueue.add_argument("--queue", required=True)
+    enqueue.add_argument("--dataset", default=DATASET_PATH)
+    enqueue.add_argument("--ids", nargs="*", help="Instance ids to run")
+    enqueue.add_argument("--ids-file", help="File with one instance id per line")
+    enqueue.add_argument("--slice", dest="row_slice", help='Slice of the selected rows, e.g. "0:50"')
+    enqueue.add_argument("--repo", help='Only instances of this repository, e.g. "django/django"')
+    enqueue.add_argument("--filter", dest="pattern", help="Regex the instance id has to match")
+    enqueue.add_argument("--retries", type=int, default=2)
+    enqueue.add_argument("--timeout", type=float, default=3600, help="Seconds per attempt")
+
+    work = subparsers.add_parser("work", help="Start workers on a queue")
+    work.add_argument("--queue", required=True)
+    work.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    work.add_argument("--forever", action="store_true", help="Keep polling when the queue is empty")
+    work.add_argument("--llm-cache", choices=["passthrough", "record", "replay"],
+                      help="Completion cache mode of the workers (default: $SWARM_LLM_CACHE or passthrough)")
+    work.add_argument("--best-of", type=int,
+                      help="Run every instance with this many parallel candidate branches (default: $SWARM_BEST_OF or 1)")
+
+    status = subparsers.add_parser("status", help="Show queue status")
+    status.add_argument("--queue", required=True)
+    status.add_argument("--failed", action="store_true", help="List failed instances with their errors")
+
+    retry = subparsers.add_parser("retry-failed", help="Put failed instances back into the queue")
+    retry.add_argument("--queue", required=True)
+
+    gc = subparsers.add_parser("gc", help="Remove instance worktrees that have not been used recently")
+    gc.add_argument("--max-age-hours", type=float, default=24)
+
+    envs = subparsers.add_parser("envs", help="Build the cached test environments of the selected instances")
+    envs.add_argument("--dataset", default=DATASET_PATH)
+    envs.add_argument("--ids", nargs="*", help="Instance ids")
+    envs.add_argument("--slice", dest="row_slice", help='Slice of the selected rows, e.g. "0:50"')
+    envs.add_argument("--repo", help='Only instances of this repository, e.g. "django/django"')
+    envs.add_argument("--filter", dest="pattern", help="Regex the instance id has to match")
+    envs.add_argument("--workers", type=int, default=4, help="Environments built at the same time")
+
+    args = parser.parse_args(argv)
+    if args.command == "envs":
+        from concurrent.futures import ThreadPoolExecutor
+
+        from tools.env_manager import ensure_env, env_key
+
+        # One row per environment; instances of the same repository version share it.
+        rows = {}
+        for row in select_rows(args.dataset, args.ids or None, args.row_slice, args.repo, args.pattern):
+            rows.setdefault(env_key(row), row)
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            for key, python in zip(rows, pool.map(ensure_env, rows.values())):
+                print(f"{key}: {python}")
+        return
+    if args.command == "gc":
+        from tools.git_cache import prune_worktrees
+
+        for path in prune_worktrees(args.max_age_hours):
+            print(f"Removed {path}")
+        return
+    queue = JobQueue(args.queue)
+
+    if args.command == "enqueue":
+        ids = list(args.ids or [])
+        if args.ids_file:
+            with open(args.ids_file, "r") as file:
+                ids += [line.strip() for line in file if line.strip()]
+        rows = select_rows(args.dataset, ids or None, args.row_slice, args.repo, args.pattern)
+        added = queue.enqueue(rows, max_attempts=args.retries + 1, timeout=args.timeout)
+        print(f"Queued {added} of {len(rows)} selected instances.")
+    elif args.command == "work":
+        if args.llm_cache:
+            # Read by swarm_llm_cache in the spawned worker processes.
+            os.environ["SWARM_LLM_CACHE"] = args.llm_cache
+        if args.best_of:
+            # Read by _execute_instance in the spawned instance processes.
+            os.environ["SWARM_BEST_OF"] = str(args.best_of)
+        run_workers(args.queue, args.workers, exit_when_idle=not args.forever)
+        print(json.dumps(queue.counts()))
+    elif args.command == "status":
+        print(json.dumps(queue.counts()))
+        if args.failed:
+            for job in queue.jobs("failed"):
+                print(f"{job['instance_id']}: {job['error']}")
+    elif args.command == "retry-failed":
+        print(f"Requeued {queue.retry_failed()} instances.")
+
+
+if __name__ == "__main__":
+    main()
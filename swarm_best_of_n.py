@@ -0,0 +1,264 @@
+"""
+Best-of-N runs of one SWE-Bench instance.
+
+The Issue Analyzer runs once and prepares the instance checkout. Triage then
+fans out N Coder/File/Tester branches that run concurrently (asyncio plus a
+thread per branch, the agents are synchronous). Every branch works in its own
+worktree `<repository>__cand<i>` of the checkout: the repository name the
+agents use is redirected to it, so branches never see each other's edits.
+
+A finished branch is verified by running the impacted tests on its worktree.
+The first verified passing branch stops the others at their next check point.
+All candidates are ranked by test result, then by the size of their diff, and
+the patch of the best one is applied to the instance checkout.
+
+Usage:
+    python swarm_best_of_n.py --instance django__django-11099 -n 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import threading
+import traceback
+
+from swarm_agents import SUCCESS_MARKER, TERMINATION_MARKER, build_task_message, create_agents, get_agents, get_client
+from swarm_tracing import span
+from tools import edit_session, env_manager, read_tracker
+from tools.executor_toolkit import run_impacted_tests
+from tools.git_cache import add_worktree, diff_worktree, remove_worktree
+from tools.workspace import redirect_repositories, repo_path
+
+DEFAULT_CANDIDATES = 3
+# Branches look for a stop request after this many new messages.
+MESSAGES_PER_CHECK = 6
+# Verified test results, best first. Everything else ranks after these.
+TEST_RANKS = {"passed": 0, "no impacted tests found": 1}
+
+
+def _git(repo_dir: str, *args, check: bool = True, input: str = None) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", "-C", repo_dir, *args], check=check, capture_output=True, text=True, input=input)
+
+
+def candidate_name(repository: str, index: int) -> str:
+    return f"{repository}__cand{index}"
+
+
+def create_candidates(repository: str, count: int) -> list:
+    """Creates `count` fresh worktrees of the checkout of `repository` at its current commit. Returns their names."""
+    repo_dir = repo_path(repository)
+    git_dir = os.path.join(repo_dir, _git(repo_dir, "rev-parse", "--git-common-dir").stdout.strip())
+    commit = _git(repo_dir, "rev-parse", "HEAD").stdout.strip()
+    names = []
+    for index in range(count):
+        name = candidate_name(repository, index)
+        path = repo_path(name)
+        if os.path.exists(path):
+            # Left over by an earlier run: start from a clean tree.
+            remove_worktree(path)
+        add_worktree(os.path.normpath(git_dir), path, commit)
+        names.append(name)
+    return names
+
+
+def diff_size(patch: str) -> int:
+    """Number of added and removed lines of a patch."""
+    return sum(1 for line in patch.splitlines()
+               if line[:1] in "+-" and not line.startswith(("+++ ", "--- ")))
+
+
+def analyze(row: dict, max_turns: int = 30) -> list:
+    """Runs the Issue Analyzer, which clones and checks out the repository. Returns the conversation so far."""
+    messages = [{"role": "user", "content": build_task_message(row)}]
+    response = get_client().run(agent=create_agents(hand_off=False)["Issue Analyzer"], messages=messages,
+                          context_variables={"session_id": row["instance_id"]}, max_turns=max_turns)
+    return messages + response.messages
+
+
+def run_branch(row: dict, repository: str, index: int, total: int, analysis: list, stop: threading.Event,
+               max_messages: int = 120) -> dict:
+    """
+    Runs one Triage -> Coder/File/Tester branch in its own worktree and verifies its result.
+
+    Args:
+        row (dict): SWE-Bench row.
+        repository (str): Repository name used by the agents; redirected to the branch's worktree.
+        index (int): Number of the branch.
+        total (int): Number of branches.
+        analysis (list): Messages of the Issue Analyzer run shared by all branches.
+        stop (threading.Event): Set when another branch already produced a verified solution.
+        max_messages (int): Maximum number of new messages of the branch.
+
+    Returns:
+        dict: candidate, claimed_success, tests (verified status), diff_lines, patch, messages, stopped, last_message,
+              error (why pending edits were dropped, or None).
+    """
+    name = candidate_name(repository, index)
+    session_id = f"{row['instance_id']}#cand{index}"
+    messages = analysis + [{
+        "role": "user",
+        "content": f"You are candidate {index + 1} of {total} solving this issue independently. NO USER INPUT NEEDED",
+    }]
+    agent = get_agents()["Triage"]
+    context_variables = {"session_id": session_id}
+    content = ""
+    used = 0
+    stopped = False
+    with redirect_repositories({repository: name}), span("candidate", name, index=index) as candidate_span:
+        while used < max_messages:
+            if stop.is_set():
+                stopped = True
+                break
+            response = get_client().run(agent=agent, messages=messages, context_variables=context_variables,
+                                  max_turns=min(MESSAGES_PER_CHECK, max_messages - used))
+            if not response.messages:
+                break
+            used += len(response.messages)
+            messages.extend(response.messages)
+            agent = response.agent
+            context_variables = response.context_variables
+            last = messages[-1]
+            content = last.get("content") or ""
+            if TERMINATION_MARKER in content:
+                break
+            # The agent answered without calling a tool (and not only ran out of messages for this check).
+            if last.get("role") == "assistant" and not last.get("tool_calls"):
+                messages.append({"role": "user", "content": "Continue. NO USER INPUT NEEDED"})
+        read_tracker.reset(session_id)
+
+        work_dir = repo_path(repository)
+        error = None
+        try:
+            edit_session.commit(work_dir)
+        except Exception as e:
+            # The branch is over: its unwritten edits are dropped, the files on disk are its result.
+            edit_session.rollback(work_dir)
+            error = f"Pending edits were dropped: {e}"
+        if stopped:
+            tests = "stopped"
+        elif error:
+            tests = "edit conflict"
+        else:
+            tests = json.loads(run_impacted_tests(repository))["status"]
+        # All changes including new files, without the Tester's test files.
+        patch = diff_worktree(work_dir)
+        if not patch:
+            tests = "no changes"
+        candidate_span.attributes.update(tests=tests, diff_lines=diff_size(patch))
+
+    return {
+        "candidate": name,
+        "claimed_success": SUCCESS_MARKER in content,
+        "tests": tests,
+        "diff_lines": diff_size(patch),
+        "patch": patch,
+        "messages": used,
+        "stopped": stopped,
+        "last_message": content,
+        "error": error,
+    }
+
+
+def rank(result: dict) -> tuple:
+    """Sort key of candidates: verified tests first, then the agent's own verdict, then the smallest diff."""
+    return (not result.get("patch"), TEST_RANKS.get(result.get("tests"), len(TEST_RANKS)),
+            not result.get("claimed_success"), result.get("diff_lines", 0), result["candidate"])
+
+
+async def run_candidates(row: dict, repository: str, count: int, analysis: list, max_messages: int = 120) -> list:
+    """Runs `count` branches concurrently and stops the remaining ones once a branch passes its tests."""
+    stop = threading.Event()
+
+    async def branch(index: int) -> dict:
+        try:
+            return await asyncio.to_thread(run_branch, row, repository, index, count, analysis, stop, max_messages)
+        except Exception:
+            return {"candidate": candidate_name(repository, index), "tests": "error", "error": traceback.format_exc()}
+
+    results = []
+    for finished in asyncio.as_completed([branch(index) for index in range(count)]):
+        result = await finished
+        results.append(result)
+        if result["tests"] == "passed":
+            stop.set()
+    return results
+
+
+def run_best_of_n(row: dict, candidates: int = DEFAULT_CANDIDATES, max_turns: int = 30, max_messages: int = 120,
+                  keep_candidates: bool = False) -> dict:
+    """
+    Runs one SWE-Bench row with `candidates` parallel branches and applies the best patch to the instance checkout.
+
+    Args:
+        row (dict): SWE-Bench row with repo, instance_id, base_commit and problem_statement.
+        candidates (int): Number of parallel Coder/File/Tester branches.
+        max_turns (int): Maximum number of messages of the Issue Analyzer run.
+        max_messages (int): Maximum number of new messages per branch.
+        keep_candidates (bool): Keep the candidate worktrees for inspection.
+
+    Returns:
+        dict: Summary of the run like swarm_agents.run_instance, plus the winner and all candidates without patches.
+    """
+    instance_id = row["instance_id"]
+    repository = row["repo"].split("/")[-1]
+    winner = None
+    results = []
+    apply_error = None
+    with span("instance", instance_id, instance_id=instance_id, candidates=candidates) as instance_span:
+        analysis = analyze(row, max_turns)
+        repo_dir = repo_path(repository)
+        if not os.path.isdir(repo_dir):
+            raise RuntimeError(f"The Issue Analyzer did not check out {repository} to {repo_dir}.")
+        for name in create_candidates(repository, candidates):
+            env_manager.bind(repo_path(name), row)
+        try:
+            results = asyncio.run(run_candidates(row, repository, candidates, analysis, max_messages))
+            ranked = sorted(results, key=rank)
+            if ranked and ranked[0].get("patch"):
+                winner = ranked[0]
+                applied = _git(repo_dir, "apply", "--whitespace=nowarn", "-", input=winner["patch"], check=False)
+                if applied.returncode != 0:
+                    # E.g. the checkout had uncommitted changes; the patch is returned so nothing is lost.
+                    apply_error = f"The patch of {winner['candidate']} did not apply to {repo_dir}: {applied.stderr.strip()}"
+        finally:
+            if not keep_candidates:
+                for index in range(candidates):
+                    remove_worktree(repo_path(candidate_name(repository, index)))
+        success = winner is not None and winner["tests"] == "passed" and apply_error is None
+        instance_span.attributes.update(success=success, winner=winner["candidate"] if winner else None)
+
+    summary = {
+        "instance_id": instance_id,
+        "agent": "best-of-n",
+        "success": success,
+        "winner": winner["candidate"] if winner else None,
+        "messages": len(analysis) + sum(result.get("messages", 0) for result in results),
+        "last_message": winner["last_message"] if winner else "",
+        "candidates": [{key: value for key, value in result.items() if key not in ("patch", "last_message")}
+                       for result in sorted(results, key=rank)],
+    }
+    if apply_error:
+        summary.update(error=apply_error, patch=winner["patch"])
+    return summary
+
+
+def main(argv=None):
+    from swarm_batch import select_rows
+    from swarm_dataset import DATASET_PATH
+
+    parser = argparse.ArgumentParser(description="Best-of-N run of one SWE-Bench instance")
+    parser.add_argument("--instance", required=True, help="Instance id")
+    parser.add_argument("-n", "--candidates", type=int, default=DEFAULT_CANDIDATES)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--keep-candidates", action="store_true", help="Keep the candidate worktrees")
+    args = parser.parse_args(argv)
+
+    rows = select_rows(args.dataset, instance_ids=[args.instance])
+    if not rows:
+        parser.error(f"Unknown instance {args.instance}")
+    print(json.dumps(run_best_of_n(rows[0], args.candidates, keep_candidates=args.keep_candidates), indent=2))
+
+
+if __name__ == "__main__":
+    main()
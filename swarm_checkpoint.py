@@ -0,0 +1,169 @@
+"""
+Checkpoints of instance runs.
+
+While a Checkpointer is recording, CheckpointSwarm saves the state of the
+run before every LLM call, i.e. after every turn:
+
+    messages     the whole history, including tool results
+    agent        name of the active agent
+    context      the context variables
+    pending      buffers of an open edit session
+    snapshot     a commit of the instance checkout
+
+The snapshot commit holds the whole worktree (tracked and untracked files,
+written with a temporary index so the real index is not touched) on top of
+HEAD and is kept alive by the ref refs/swarm-checkpoints/<instance_id> in
+the repository, so it survives a removed worktree. Only the latest
+checkpoint of an instance is kept, as JSON below .swarm_cache/checkpoints.
+
+Resuming restores the checkout and the edit session and continues the
+conversation where it stopped:
+
+    python swarm_cli.py run django__django-11099 --resume
+    python swarm_cli.py run django__django-11099 --resume --interactive
+"""
+import contextvars
+import json
+import logging
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+
+from swarm_parallel import ParallelToolSwarm
+from tools import edit_session
+from tools.git_cache import add_worktree, find_mirror, worktree_tree
+from tools.workspace import cache_dir, repo_path
+
+REF_PREFIX = "refs/swarm-checkpoints"
+# Identity of snapshot commits when none is configured in the environment.
+SNAPSHOT_IDENTITY = {"GIT_AUTHOR_NAME": "swarm", "GIT_AUTHOR_EMAIL": "swarm@localhost",
+                     "GIT_COMMITTER_NAME": "swarm", "GIT_COMMITTER_EMAIL": "swarm@localhost"}
+
+logger = logging.getLogger(__name__)
+_recording = contextvars.ContextVar("swarm_checkpointer", default=None)
+
+
+def _git(repo_dir: str, *args, env: dict = None) -> str:
+    return subprocess.run(["git", "-C", repo_dir, *args], check=True, capture_output=True, text=True,
+                          env=dict(os.environ, **(env or {}))).stdout.strip()
+
+
+def snapshot(repo_dir: str, instance_id: str) -> dict:
+    """
+    Commits the current worktree (including untracked files) without touching HEAD, the index or the files.
+
+    Returns:
+        dict: head (the checked out commit) and commit (the snapshot on top of it).
+    """
+    head = _git(repo_dir, "rev-parse", "HEAD")
+    tree = worktree_tree(repo_dir)
+    identity = {key: os.environ.get(key, value) for key, value in SNAPSHOT_IDENTITY.items()}
+    commit = _git(repo_dir, "commit-tree", tree, "-p", head, "-m", f"swarm checkpoint {instance_id}", env=identity)
+    _git(repo_dir, "update-ref", f"{REF_PREFIX}/{instance_id}", commit)
+    return {"head": head, "commit": commit}
+
+
+def restore(repo_dir: str, repository: str, state: dict):
+    """Brings a checkout back to a snapshot: HEAD at the snapshot's head, the files as they were, nothing staged."""
+    if not os.path.isdir(repo_dir):
+        mirror = find_mirror(repository)
+        if mirror is None:
+            raise RuntimeError(f"No checkout or mirror of {repository} to restore the checkpoint into.")
+        add_worktree(mirror, repo_dir, state["head"])
+    _git(repo_dir, "checkout", "--detach", "--force", state["head"])
+    # Files created after the checkpoint would otherwise survive the restore.
+    _git(repo_dir, "clean", "-fd")
+    _git(repo_dir, "read-tree", "-u", "--reset", state["commit"])
+    _git(repo_dir, "reset", "-q", state["head"])
+
+
+class Checkpointer:
+    """Latest checkpoint of one instance run."""
+
+    def __init__(self, row: dict, repository: str = None):
+        self.row = row
+        self.instance_id = row["instance_id"]
+        self.repository = repository or row["repo"].split("/")[-1]
+        self.round = 0
+        self.turns = 0
+        self.path = os.path.join(cache_dir("checkpoints"), f"{self.instance_id}.json")
+
+    def load(self):
+        """The saved state, or None."""
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def save(self, agent_name: str, messages: list, context_variables: dict, result: dict = None):
+        repo_dir = repo_path(self.repository)
+        state = {
+            "instance_id": self.instance_id,
+            "row": self.row,
+            "repository": self.repository,
+            "agent": agent_name,
+            "messages": messages,
+            "context_variables": context_variables,
+            "round": self.round,
+            "turns": self.turns,
+            "saved": time.time(),
+            "result": result,
+            "snapshot": None,
+            "pending": {},
+        }
+        # Worktrees have a .git file, clones a .git directory.
+        if os.path.exists(os.path.join(repo_dir, ".git")):
+            state["snapshot"] = snapshot(repo_dir, self.instance_id)
+            session = edit_session.active(repo_dir)
+            if session is not None:
+                state["pending"] = {path: session.buffers[path] for path in session.changes()}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(state, file, default=str)
+        os.replace(tmp_path, self.path)
+        self.turns += 1
+
+    def restore(self, state: dict):
+        """Restores the checkout and the open edit session of a saved state."""
+        self.round = state["round"]
+        self.turns = state["turns"]
+        if state["snapshot"] is None:
+            return
+        repo_dir = repo_path(self.repository)
+        edit_session.rollback(repo_dir)
+        restore(repo_dir, self.repository, state["snapshot"])
+        if state["pending"]:
+            edit_session.begin(repo_dir)
+            for path, content in state["pending"].items():
+                edit_session.write(repo_dir, path, content)
+
+
+def load(instance_id: str):
+    """The saved state of an instance, or None."""
+    return Checkpointer({"instance_id": instance_id, "repo": ""}).load()
+
+
+@contextmanager
+def recording(checkpointer: Checkpointer):
+    """Saves a checkpoint after every turn of the runs in this context."""
+    token = _recording.set(checkpointer)
+    try:
+        yield checkpointer
+    finally:
+        _recording.reset(token)
+
+
+class CheckpointSwarm(ParallelToolSwarm):
+    """Swarm that saves a checkpoint before every LLM call while a Checkpointer is recording."""
+
+    def get_chat_completion(self, agent, history, context_variables, model_override, stream, debug):
+        checkpointer = _recording.get()
+        if checkpointer is not None:
+            try:
+                checkpointer.save(agent.name, history, context_variables)
+            except Exception as e:
+                # A failed checkpoint must not stop the run.
+                logger.warning("Checkpoint of %s failed: %s", checkpointer.instance_id, e)
+        return super().get_chat_completion(agent, history, context_variables, model_override, stream, debug)
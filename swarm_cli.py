@@ -0,0 +1,150 @@
+"""
+Command line of the swarm.
+
+    python swarm_cli.py run django__django-11099                 headless run, prints the summary as JSON
+    python swarm_cli.py run django__django-11099 --best-of 4     best-of-N run, see swarm_best_of_n.py
+    python swarm_cli.py run django__django-11099 --resume        continue from the last checkpoint
+    python swarm_cli.py run --interactive [INSTANCE_ID]          console REPL (default: the demo instance)
+    python swarm_cli.py batch work --queue runs/nightly.sqlite   see swarm_batch.py
+    python swarm_cli.py replay django__django-11099              rerun answering only from recorded completions
+    python swarm_cli.py list-instances --repo django/django
+
+Every command imports what it needs when it runs, so `--help` and
+list-instances start without loading the agents, the OpenAI client or
+pyarrow. benchmarks/import_time.py keeps it that way.
+"""
+import argparse
+import json
+import os
+
+# Position of the demo instance in the seeded shuffle of the dataset, as used by the interactive run.
+DEMO_SEED = 30
+DEMO_POSITION = 42
+
+
+def _rows(dataset: str, instance_ids: list) -> list:
+    from swarm_batch import select_rows
+
+    rows = select_rows(dataset, instance_ids=instance_ids)
+    unknown = set(instance_ids) - {row["instance_id"] for row in rows}
+    if unknown:
+        raise SystemExit(f"Unknown instances: {', '.join(sorted(unknown))}")
+    # In the order they were given.
+    return sorted(rows, key=lambda row: instance_ids.index(row["instance_id"]))
+
+
+def demo_row(dataset: str) -> dict:
+    """The row the interactive run uses without an instance id."""
+    import random
+
+    from swarm_dataset import DatasetStore
+
+    store = DatasetStore(dataset)
+    # Shuffling the positions gives the same order as shuffling the rows themselves.
+    positions = list(range(len(store)))
+    random.Random(DEMO_SEED).shuffle(positions)
+    return store.row(positions[DEMO_POSITION])
+
+
+def run(args):
+    import swarm_agents
+
+    if args.interactive:
+        if len(args.instance_ids) > 1:
+            raise SystemExit("The interactive run takes at most one instance.")
+        if args.resume:
+            if not args.instance_ids:
+                raise SystemExit("--resume needs an instance id.")
+            swarm_agents.resume_interactive(args.instance_ids[0])
+            return
+        row = _rows(args.dataset, args.instance_ids)[0] if args.instance_ids else demo_row(args.dataset)
+        swarm_agents.run_interactive(row)
+        return
+
+    if not args.instance_ids:
+        raise SystemExit("Give the instances to run, or --interactive.")
+    for row in _rows(args.dataset, args.instance_ids):
+        if args.best_of > 1:
+            import swarm_best_of_n
+
+            result = swarm_best_of_n.run_best_of_n(row, args.best_of, max_turns=args.max_turns)
+        else:
+            result = swarm_agents.run_instance(row, args.max_turns, args.max_rounds, resume=args.resume)
+        print(json.dumps(result, indent=2))
+
+
+def replay(args):
+    # Read when the completion cache is created, i.e. on first use of the client.
+    os.environ["SWARM_LLM_CACHE"] = "replay"
+    import swarm_agents
+    from swarm_llm_cache import CacheMiss
+
+    cache = swarm_agents.get_client().client
+    for row in _rows(args.dataset, args.instance_ids):
+        hits, misses = cache.hits, cache.misses
+        try:
+            result = swarm_agents.run_instance(row, args.max_turns, args.max_rounds)
+        except CacheMiss as e:
+            result = {"instance_id": row["instance_id"], "error": f"cache miss: {e}"}
+        print(json.dumps(dict(result, cache_hits=cache.hits - hits, cache_misses=cache.misses - misses), indent=2))
+
+
+def list_instances(args):
+    from swarm_batch import select_rows
+
+    rows = select_rows(args.dataset, args.ids or None, args.row_slice, args.repo, args.pattern)
+    for row in rows:
+        if args.json:
+            print(json.dumps({column: row.get(column) for column in ("instance_id", "repo", "version", "base_commit")}))
+        else:
+            print(row["instance_id"])
+
+
+def main(argv=None):
+    from swarm_dataset import DATASET_PATH
+
+    parser = argparse.ArgumentParser(description="Swarm agents for SWE-Bench instances")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run instances")
+    run_parser.add_argument("instance_ids", nargs="*", metavar="INSTANCE_ID")
+    run_parser.add_argument("--dataset", default=DATASET_PATH)
+    run_parser.add_argument("--interactive", action="store_true", help="Console REPL instead of a headless run")
+    run_parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint of the instance")
+    run_parser.add_argument("--best-of", type=int, default=1, help="Parallel candidate branches per instance")
+    run_parser.add_argument("--max-turns", type=int, default=30)
+    run_parser.add_argument("--max-rounds", type=int, default=10)
+
+    batch_parser = subparsers.add_parser("batch", help="Queue based batch runs, arguments as for swarm_batch.py",
+                                         add_help=False)
+    batch_parser.add_argument("batch_args", nargs=argparse.REMAINDER)
+
+    replay_parser = subparsers.add_parser("replay", help="Rerun instances from recorded completions only")
+    replay_parser.add_argument("instance_ids", nargs="+", metavar="INSTANCE_ID")
+    replay_parser.add_argument("--dataset", default=DATASET_PATH)
+    replay_parser.add_argument("--max-turns", type=int, default=30)
+    replay_parser.add_argument("--max-rounds", type=int, default=10)
+
+    list_parser = subparsers.add_parser("list-instances", help="List instance ids of the dataset")
+    list_parser.add_argument("--dataset", default=DATASET_PATH)
+    list_parser.add_argument("--ids", nargs="*", help="Instance ids")
+    list_parser.add_argument("--slice", dest="row_slice", help='Slice of the selected rows, e.g. "0:50"')
+    list_parser.add_argument("--repo", help='Only instances of this repository, e.g. "django/django"')
+    list_parser.add_argument("--filter", dest="pattern", help="Regex the instance id has to match")
+    list_parser.add_argument("--json", action="store_true", help="One JSON object with repo, version and commit per line")
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        import swarm_batch
+
+        swarm_batch.main(args.batch_args)
+    elif args.command == "run":
+        run(args)
+    elif args.command == "replay":
+        replay(args)
+    elif args.command == "list-instances":
+        list_instances(args)
+
+
+if __name__ == "__main__":
+    main()
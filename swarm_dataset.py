@@ -0,0 +1,126 @@
+"""
+Memory-mapped access to the SWE-Bench parquet.
+
+The parquet is converted once into an Arrow IPC file that only holds the
+projected columns, together with an instance_id -> row index. Later runs
+memory-map that file, so opening the dataset costs neither parsing nor
+building Python strings for rows that are never used.
+"""
+import hashlib
+import json
+import os
+
+from tools.workspace import CACHE_DIR
+
+DATASET_PATH = os.path.join("swebench", "test-00000-of-00001.parquet")
+# version and environment_setup_commit select the cached test environment (tools/env_manager.py).
+DEFAULT_COLUMNS = ("repo", "instance_id", "base_commit", "problem_statement", "version", "environment_setup_commit")
+
+
+class DatasetStore:
+    """Indexed, memory-mapped view of a SWE-Bench parquet file."""
+
+    def __init__(self, parquet_path: str = DATASET_PATH, columns=DEFAULT_COLUMNS, cache_dir: str = None):
+        self.parquet_path = parquet_path
+        self.columns = list(columns)
+        if "instance_id" not in self.columns:
+            self.columns.insert(0, "instance_id")
+
+        column_key = hashlib.sha1(",".join(self.columns).encode()).hexdigest()[:8]
+        stem = os.path.splitext(os.path.basename(parquet_path))[0]
+        directory = os.path.join(cache_dir or CACHE_DIR, "datasets")
+        self.arrow_path = os.path.join(directory, f"{stem}-{column_key}.arrow")
+        self.index_path = os.path.join(directory, f"{stem}-{column_key}.index.json")
+
+        self._table = None
+        self._index = None
+
+    def _source_signature(self) -> list:
+        stat = os.stat(self.parquet_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if index.get("source") != self._source_signature() or not os.path.exists(self.arrow_path):
+            return None
+        return index
+
+    def build(self) -> dict:
+        """Converts the parquet into the Arrow IPC cache. Reads the projected columns batch by batch."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(self.arrow_path), exist_ok=True)
+        parquet = pq.ParquetFile(self.parquet_path)
+        schema = pa.schema([parquet.schema_arrow.field(name) for name in self.columns])
+
+        positions = {}
+        tmp_path = f"{self.arrow_path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in parquet.iter_batches(columns=self.columns, batch_size=1024):
+                for instance_id in batch.column(batch.schema.get_field_index("instance_id")).to_pylist():
+                    positions[instance_id] = len(positions)
+                writer.write_batch(batch)
+        os.replace(tmp_path, self.arrow_path)
+
+        index = {"source": self._source_signature(), "columns": self.columns, "rows": positions}
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(index, file)
+        os.replace(tmp_path, self.index_path)
+        return index
+
+    def _open(self):
+        if self._table is not None:
+            return
+        import pyarrow as pa
+
+        index = self._load_index() or self.build()
+        self._index = index["rows"]
+        self._table = pa.ipc.open_file(pa.memory_map(self.arrow_path, "r")).read_all()
+
+    def __len__(self) -> int:
+        self._open()
+        return self._table.num_rows
+
+    def __contains__(self, instance_id: str) -> bool:
+        self._open()
+        return instance_id in self._index
+
+    def column(self, name: str) -> list:
+        """Returns a single column as a Python list."""
+        self._open()
+        return self._table.column(name).to_pylist()
+
+    def instance_ids(self) -> list:
+        return self.column("instance_id")
+
+    def row(self, position: int) -> dict:
+        """Returns the row at the given position as a dict."""
+        self._open()
+        return {name: self._table.column(name)[position].as_py() for name in self.columns}
+
+    def get(self, instance_id: str) -> dict:
+        """Returns the row of an instance. Raises KeyError for unknown instance ids."""
+        self._open()
+        return self.row(self._index[instance_id])
+
+    def iter_rows(self, positions=None, batch_size: int = 64):
+        """
+        Lazily yields rows as dicts.
+
+        Args:
+            positions (iterable): Row positions to yield, in the given order. All rows if omitted.
+            batch_size (int): Number of rows converted to Python objects at a time.
+        """
+        self._open()
+        if positions is None:
+            for batch in self._table.to_batches(max_chunksize=batch_size):
+                yield from batch.to_pylist()
+        else:
+            for position in positions:
+                yield self.row(position)
@@ -0,0 +1,404 @@
+"""
+SWE-Bench prediction export and local evaluation.
+
+export collects the changes of every finished instance checkout against the
+instance's base_commit (new files included, the Tester's temp_test_* files
+excluded) and streams them as SWE-Bench predictions, one JSON line per
+instance: {"instance_id", "model_name_or_path", "model_patch"}. Checkouts
+that are not at base_commit are ignored; without one the instance's last
+checkpoint is used, else the instance is reported as missing.
+
+evaluate applies every prediction in a fresh worktree of the repository at
+base_commit, applies the instance's test_patch and runs its FAIL_TO_PASS and
+PASS_TO_PASS tests, one instance per process of a pool. Tests run in the
+cached environment of the instance's repository version (tools/env_manager.py)
+unless an interpreter is given with --python. An instance is resolved when
+all of those tests pass. Results are streamed to a JSON lines report with
+per-instance timings, followed by a summary.
+
+    python swarm_eval.py export --queue runs/nightly.sqlite --output runs/predictions.jsonl
+    python swarm_eval.py evaluate --predictions runs/predictions.jsonl --workers 8 --report runs/report.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from swarm_batch import INSTANCE_WORKSPACES, JobQueue
+from swarm_dataset import DATASET_PATH, DatasetStore
+from tools import env_manager
+from tools.git_cache import EXCLUDE_AGENT_TESTS, add_worktree, diff_worktree, ensure_mirror, find_mirror, remove_worktree
+from tools.workspace import workspace_root
+
+MODEL_NAME = "swe-mas-swarm"
+EVAL_COLUMNS = ("repo", "instance_id", "base_commit", "version", "environment_setup_commit", "test_patch", "FAIL_TO_PASS",
+                "PASS_TO_PASS")
+EVAL_WORKSPACES = os.path.join("coding", "eval")
+DEFAULT_TEST_TIMEOUT = 1800
+
+# "test_name (module.Class)" as used by Django's test runner.
+DJANGO_TEST = re.compile(r"^(\w+) \(([\w.]+)\)$")
+DJANGO_RESULT = re.compile(r"^(\w+) \(([\w.]+)\)")
+DJANGO_OUTCOMES = {"ok": "PASSED", "FAIL": "FAILED", "ERROR": "ERROR", "skipped": "SKIPPED",
+                   "expected failure": "XFAIL", "unexpected success": "FAILED"}
+# "FAILED path::test[param] - message"; parameters may contain spaces and " - ".
+PYTEST_RESULT = re.compile(r"^(PASSED|FAILED|ERROR|SKIPPED|XFAIL|XPASS) ([^\s\[]+(?:\[[^\]]*\])?)(?: - .*)?$")
+PASSING = {"PASSED", "XFAIL"}
+
+
+def find_checkout(instance_id: str, repository: str, base_commit: str):
+    """
+    Checkout of a finished instance: its batch workspace, else the interactive workspace. A checkout only counts if
+    it is still at `base_commit`, the interactive one may belong to another instance of the repository.
+    """
+    for path in (os.path.join(INSTANCE_WORKSPACES, instance_id, repository), os.path.join(workspace_root(), repository)):
+        if not os.path.exists(os.path.join(path, ".git")):
+            continue
+        head = subprocess.run(["git", "-C", path, "rev-parse", "HEAD"], capture_output=True, text=True)
+        if head.returncode == 0 and head.stdout.strip() == base_commit:
+            return path
+    return None
+
+
+def checkpoint_patch(row: dict):
+    """The patch of the last checkpoint of an instance taken at its base_commit (e.g. after its worktree was removed), or None."""
+    import swarm_checkpoint
+
+    state = swarm_checkpoint.load(row["instance_id"])
+    snapshot = state and state.get("snapshot")
+    mirror = find_mirror(row["repo"].split("/")[-1])
+    if not snapshot or snapshot["head"] != row["base_commit"] or mirror is None:
+        return None
+    result = subprocess.run(["git", "--git-dir", mirror, "diff", "--binary", row["base_commit"], snapshot["commit"],
+                             "--", ".", EXCLUDE_AGENT_TESTS], capture_output=True, text=True)
+    # The snapshot ref lives in the mirror; it is gone if the mirror was recreated.
+    return result.stdout if result.returncode == 0 else None
+
+
+def collect_prediction(row: dict, model_name: str = MODEL_NAME) -> dict:
+    """The SWE-Bench prediction of one instance, from the changes of its checkout (or last checkpoint) against base_commit."""
+    checkout = find_checkout(row["instance_id"], row["repo"].split("/")[-1], row["base_commit"])
+    if checkout is not None:
+        patch = diff_worktree(checkout, row["base_commit"])
+    else:
+        patch = checkpoint_patch(row)
+    if patch is None:
+        raise FileNotFoundError(f"No checkout or checkpoint of {row['instance_id']} at {row['base_commit']} found.")
+    return {
+        "instance_id": row["instance_id"],
+        "model_name_or_path": model_name,
+        "model_patch": patch,
+    }
+
+
+def export_predictions(rows, output: str, model_name: str = MODEL_NAME, workers: int = 8) -> dict:
+    """
+    Streams the predictions of `rows` to a JSON lines file, in the order their diffs are ready.
+
+    Returns:
+        dict: Number of exported, empty and missing predictions.
+    """
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    counts = {"exported": 0, "empty": 0, "missing": 0}
+    with open(output, "w") as file, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(collect_prediction, row, model_name): row["instance_id"] for row in rows}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except (FileNotFoundError, subprocess.CalledProcessError) as e:
+                counts["missing"] += 1
+                print(f"{futures[future]}: {e}", file=sys.stderr)
+                continue
+            counts["exported"] += 1
+            counts["empty"] += not result["model_patch"]
+            file.write(json.dumps(result) + "\n")
+            file.flush()
+    return counts
+
+
+def _test_list(value) -> list:
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return list(value or [])
+
+
+def _patch_files(patch: str) -> list:
+    return sorted({match for match in re.findall(r"^diff --git a/(\S+) b/", patch, re.MULTILINE)})
+
+
+def _apply(repo_dir: str, patch: str) -> str:
+    """Applies a patch, returns an error message or None."""
+    if not patch.strip():
+        return None
+    for args in (["apply", "--whitespace=nowarn"], ["apply", "--whitespace=nowarn", "--3way"]):
+        result = subprocess.run(["git", "-C", repo_dir, *args, "-"], input=patch, capture_output=True, text=True)
+        if result.returncode == 0:
+            return None
+    return result.stderr.strip()[-2000:]
+
+
+def parse_pytest(output: str) -> dict:
+    """Test id -> outcome from the short test summary of `pytest -rA`."""
+    outcomes = {}
+    for line in output.splitlines():
+        match = PYTEST_RESULT.match(line.strip())
+        if match:
+            outcomes[match.group(2)] = match.group(1)
+    return outcomes
+
+
+def parse_django(output: str) -> dict:
+    """
+    Test id -> outcome from the verbose output of Django's runtests.py. Tests are identified by "name (module.Class)"
+    and, for tests with a docstring, also by the docstring line printed after that header (as SWE-Bench does).
+    """
+    outcomes = {}
+    current = None
+    for line in output.splitlines():
+        match = DJANGO_RESULT.match(line)
+        if match:
+            # Newer Python versions print "name (module.Class.name)".
+            name, owner = match.groups()
+            if owner.endswith(f".{name}"):
+                owner = owner[:-len(name) - 1]
+            current = f"{name} ({owner})"
+        # The outcome follows " ... " on the same line or, after a docstring line, on a later one.
+        if current is None or (" ... " not in line and not line.startswith(tuple(DJANGO_OUTCOMES))):
+            continue
+        docstring, _, status = line.rpartition(" ... ")
+        status = status.strip()
+        for prefix, outcome in DJANGO_OUTCOMES.items():
+            if status.startswith(prefix):
+                outcomes[current] = outcome
+                if not match and docstring.strip():
+                    outcomes[docstring.strip()] = outcome
+                current = None
+                break
+    return outcomes
+
+
+def django_labels(tests: list, test_files: list) -> list:
+    """
+    runtests.py labels of the given tests. Docstring ids name no test, so with any of them the whole modules of the
+    other tests and of the test patch's files are run.
+    """
+    matches = [DJANGO_TEST.match(test) for test in tests]
+    if all(matches):
+        return sorted({f"{owner}.{name}" for name, owner in (match.groups() for match in matches)})
+    modules = {match.group(2).rpartition(".")[0] for match in matches if match}
+    for path in test_files:
+        if path.startswith("tests/") and path.endswith(".py"):
+            modules.add(path[len("tests/"):-len(".py")].replace("/", "."))
+    return sorted(module for module in modules if module)
+
+
+def run_tests(repo_dir: str, tests: list, test_files: list, python: str = None,
+              timeout: float = DEFAULT_TEST_TIMEOUT, repo: str = None) -> tuple:
+    """
+    Runs the given tests of an instance.
+
+    Tests of django/django run through tests/runtests.py. Otherwise pytest ids and bare test names run as the test
+    files they belong to (and the files of the test patch) with `pytest -rA`.
+
+    Returns:
+        tuple: (test id -> outcome, runner output).
+    """
+    python = python or sys.executable
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(repo_dir))
+    if repo == "django/django":
+        labels = django_labels(tests, test_files)
+        if not labels:
+            # Without labels runtests.py would run the whole suite.
+            return {}, "No test labels to run."
+        command = [python, "runtests.py", "--verbosity", "2", "--parallel", "1", *labels]
+        cwd = os.path.join(repo_dir, "tests")
+        parse = parse_django
+    else:
+        files = {test.split("::")[0] for test in tests if "::" in test} | set(test_files)
+        if not files:
+            # Without files pytest would run the whole suite.
+            return {}, "No test files to run."
+        command = [python, "-m", "pytest", "-rA", "-p", "no:cacheprovider", "--no-header", *sorted(files)]
+        cwd = repo_dir
+        parse = parse_pytest
+    try:
+        result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True, timeout=timeout)
+        output = result.stdout + result.stderr
+    except subprocess.TimeoutExpired as e:
+        output = f"{e.stdout or ''}\nTimed out after {timeout}s"
+    outcomes = parse(output)
+    if parse is parse_pytest:
+        # Bare test names (e.g. "test_foo") match the last part of the pytest id.
+        for test_id, outcome in list(outcomes.items()):
+            outcomes.setdefault(test_id.rpartition("::")[2], outcome)
+    return outcomes, output
+
+
+def evaluate_instance(prediction: dict, row: dict, workspace: str = EVAL_WORKSPACES, python: str = None,
+                      timeout: float = DEFAULT_TEST_TIMEOUT, keep: bool = False) -> dict:
+    """
+    Evaluates one prediction in a fresh worktree at the instance's base commit.
+
+    Returns:
+        dict: instance_id, status (resolved, unresolved, empty_patch, patch_failed or error), the failing
+              FAIL_TO_PASS/PASS_TO_PASS tests and timings in seconds.
+    """
+    started = time.perf_counter()
+    timings = {}
+    result = {"instance_id": row["instance_id"], "status": "error", "timings": timings}
+    owner, repository = row["repo"].split("/")
+    path = os.path.join(workspace, row["instance_id"], repository)
+    try:
+        if not prediction.get("model_patch", "").strip():
+            result["status"] = "empty_patch"
+            return result
+
+        clock = time.perf_counter()
+        mirror = ensure_mirror(owner, repository, row["base_commit"])
+        if os.path.exists(path):
+            remove_worktree(path)
+        add_worktree(mirror, path, row["base_commit"])
+        timings["setup"] = round(time.perf_counter() - clock, 3)
+
+        clock = time.perf_counter()
+        error = _apply(path, prediction["model_patch"])
+        if error:
+            result.update(status="patch_failed", error=error)
+            return result
+        error = _apply(path, row["test_patch"] or "")
+        if error:
+            result.update(status="error", error=f"test_patch did not apply: {error}")
+            return result
+        timings["apply"] = round(time.perf_counter() - clock, 3)
+
+        if python is None:
+            clock = time.perf_counter()
+            python = env_manager.ensure_env(row)
+            timings["environment"] = round(time.perf_counter() - clock, 3)
+
+        clock = time.perf_counter()
+        fail_to_pass = _test_list(row["FAIL_TO_PASS"])
+        pass_to_pass = _test_list(row["PASS_TO_PASS"])
+        test_files = [name for name in _patch_files(row["test_patch"] or "") if name.endswith(".py")]
+        outcomes, output = run_tests(path, fail_to_pass + pass_to_pass, test_files, python, timeout, row["repo"])
+        timings["tests"] = round(time.perf_counter() - clock, 3)
+
+        failing_f2p = [test for test in fail_to_pass if outcomes.get(test) not in PASSING]
+        failing_p2p = [test for test in pass_to_pass if outcomes.get(test) not in PASSING]
+        result.update(
+            status="unresolved" if failing_f2p or failing_p2p else "resolved",
+            fail_to_pass=f"{len(fail_to_pass) - len(failing_f2p)}/{len(fail_to_pass)}",
+            pass_to_pass=f"{len(pass_to_pass) - len(failing_p2p)}/{len(pass_to_pass)}",
+            failing=(failing_f2p + failing_p2p)[:50],
+        )
+        if not outcomes:
+            result["output_tail"] = output[-2000:]
+        return result
+    except Exception:
+        result["error"] = traceback.format_exc()[-3000:]
+        return result
+    finally:
+        timings["total"] = round(time.perf_counter() - started, 3)
+        if not keep and os.path.exists(path):
+            remove_worktree(path)
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+
+
+def load_predictions(path: str) -> list:
+    with open(path, "r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def evaluate_predictions(predictions: list, report: str, dataset_path: str = DATASET_PATH, workers: int = None,
+                         python: str = None, timeout: float = DEFAULT_TEST_TIMEOUT, keep: bool = False) -> dict:
+    """
+    Evaluates predictions in a process pool and streams one result line per instance to `report`.
+
+    Returns:
+        dict: Counts per status, the resolved instance ids and the wall time.
+    """
+    dataset = DatasetStore(dataset_path, columns=EVAL_COLUMNS)
+    started = time.perf_counter()
+    directory = os.path.dirname(report)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    summary = {"total": len(predictions), "counts": {}, "resolved": []}
+    with open(report, "w") as file, ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = []
+        for item in predictions:
+            if item["instance_id"] not in dataset:
+                result = {"instance_id": item["instance_id"], "status": "error", "error": "unknown instance"}
+                file.write(json.dumps(result) + "\n")
+                summary["counts"]["error"] = summary["counts"].get("error", 0) + 1
+                continue
+            row = dataset.get(item["instance_id"])
+            futures.append(pool.submit(evaluate_instance, item, row, EVAL_WORKSPACES, python, timeout, keep))
+        for future in as_completed(futures):
+            result = future.result()
+            file.write(json.dumps(result) + "\n")
+            file.flush()
+            summary["counts"][result["status"]] = summary["counts"].get(result["status"], 0) + 1
+            if result["status"] == "resolved":
+                summary["resolved"].append(result["instance_id"])
+            print(f"{result['instance_id']}: {result['status']} ({result['timings'].get('total', 0)}s)")
+
+    summary["resolved"].sort()
+    summary["wall_time"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SWE-Bench prediction export and local evaluation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Write the predictions of finished instances")
+    export.add_argument("--output", required=True, help="Predictions JSON lines file")
+    export.add_argument("--dataset", default=DATASET_PATH)
+    export.add_argument("--queue", help="Export the finished instances of a batch queue")
+    export.add_argument("--ids", nargs="*", help="Instance ids to export")
+    export.add_argument("--model-name", default=MODEL_NAME)
+    export.add_argument("--workers", type=int, default=8)
+
+    evaluate = subparsers.add_parser("evaluate", help="Evaluate predictions with the instances' tests")
+    evaluate.add_argument("--predictions", required=True)
+    evaluate.add_argument("--report", required=True, help="Per-instance results as JSON lines")
+    evaluate.add_argument("--summary", help="Summary JSON (default: <report>.summary.json)")
+    evaluate.add_argument("--dataset", default=DATASET_PATH)
+    evaluate.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    evaluate.add_argument("--python", help="Interpreter with the repositories' dependencies (default: cached environment per repository version)")
+    evaluate.add_argument("--timeout", type=float, default=DEFAULT_TEST_TIMEOUT, help="Seconds per test run")
+    evaluate.add_argument("--keep", action="store_true", help="Keep the evaluation worktrees")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        ids = list(args.ids or [])
+        if args.queue:
+            ids += [job["instance_id"] for job in JobQueue(args.queue).jobs("done")]
+        if not ids and os.path.isdir(INSTANCE_WORKSPACES):
+            ids = sorted(os.listdir(INSTANCE_WORKSPACES))
+        dataset = DatasetStore(args.dataset)
+        rows = [dataset.get(instance_id) for instance_id in ids if instance_id in dataset]
+        counts = export_predictions(rows, args.output, args.model_name, args.workers)
+        print(json.dumps(counts))
+    elif args.command == "evaluate":
+        summary = evaluate_predictions(load_predictions(args.predictions), args.report, args.dataset, args.workers,
+                                       args.python, args.timeout, args.keep)
+        summary_path = args.summary or f"{os.path.splitext(args.report)[0]}.summary.json"
+        with open(summary_path, "w") as file:
+            json.dump(summary, file, indent=2)
+        print(json.dumps(summary["counts"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Record/replay cache for chat completions.
+
+CachingClient wraps an OpenAI client and exposes the same
+`client.chat.completions.create(...)` call that Swarm uses. Requests are
+keyed by a canonical hash of model, messages, tools and the remaining
+parameters. Values in tool results that change from run to run (job ids,
+test durations, temporary directories) are masked in the key, so a replay
+still matches after the tools ran again; responses (including streamed chunks) are stored as JSON
+below the swarm cache directory and evicted least recently used first
+once the cache grows beyond SWARM_LLM_CACHE_BYTES.
+
+Modes (SWARM_LLM_CACHE):
+    passthrough  always call the API, never touch the cache (default)
+    record       answer from the cache when possible, call the API and store otherwise
+    replay       answer only from the cache, a miss raises CacheMiss
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from tools.workspace import cache_dir
+
+MODES = ("passthrough", "record", "replay")
+DEFAULT_MODE = os.getenv("SWARM_LLM_CACHE", "passthrough")
+MAX_CACHE_BYTES = int(os.getenv("SWARM_LLM_CACHE_BYTES", 2 * 1024 ** 3))
+
+
+# Parts of tool results that differ between otherwise identical runs, and what they are replaced by in the key.
+_VOLATILE = [
+    (re.compile(r"\b[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}\b"), "<id>"),
+    (re.compile(r"\b(in|took) \d+(\.\d+)?s\b"), r"\1 <t>s"),
+    (re.compile(r"(\"duration\": )\d+(\.\d+)?"), r"\1<t>"),
+    (re.compile(re.escape(os.path.realpath(tempfile.gettempdir())) + r"/[^/\s'\"]+"), "<tmp>"),
+    (re.compile(re.escape(tempfile.gettempdir()) + r"/[^/\s'\"]+"), "<tmp>"),
+    (re.compile(r"\bpytest-\d+\b"), "pytest-<n>"),
+]
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode for requests that were never recorded."""
+
+
+def _plain(value):
+    """Converts pydantic objects (as found in Swarm's message history) into plain JSON values."""
+    if hasattr(value, "model_dump"):
+        return _plain(value.model_dump(exclude_none=True))
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _mask_volatile(text: str) -> str:
+    for pattern, replacement in _VOLATILE:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def request_key(params: dict) -> str:
+    """
+    Canonical hash of a completion request. Key order and None values do not matter,
+    neither do run specific values in tool results (see _VOLATILE).
+    """
+    params = _plain(params)
+    messages = params.get("messages")
+    if messages:
+        params["messages"] = [dict(message, content=_mask_volatile(message["content"]))
+                              if message.get("role") == "tool" and isinstance(message.get("content"), str) else message
+                              for message in messages]
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Completion responses on disk, one JSON file per request key, with LRU eviction by total size."""
+
+    def __init__(self, directory: str = None, max_bytes: int = MAX_CACHE_BYTES):
+        self.directory = directory or cache_dir("llm")
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        # The modification time doubles as last access time for the eviction.
+        os.utime(path)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """Deletes the least recently used entries until the cache is at 90% of its budget."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+
+class _Completions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, **params):
+        return self._owner.create(**params)
+
+
+class _Chat:
+    def __init__(self, owner):
+        self.completions = _Completions(owner)
+
+
+class CachingClient:
+    """Drop-in replacement for the OpenAI client passed to Swarm(client=...)."""
+
+    def __init__(self, client=None, mode: str = None, cache: ResponseCache = None):
+        mode = mode or DEFAULT_MODE
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode '{mode}', expected one of {', '.join(MODES)}.")
+        self.mode = mode
+        self._client = client
+        self.cache = cache or (ResponseCache() if mode != "passthrough" else None)
+        self.chat = _Chat(self)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def client(self):
+        # Created lazily so that replay runs need neither network access nor an API key.
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create(self, **params):
+        if self.mode == "passthrough":
+            return self.client.chat.completions.create(**params)
+
+        key = request_key(params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return _restore(entry)
+        self.misses += 1
+        if self.mode == "replay":
+            raise CacheMiss(f"No recorded completion for request {key} (model {params.get('model')}).")
+
+        response = self.client.chat.completions.create(**params)
+        if params.get("stream"):
+            return self._record_stream(key, response)
+        self.cache.put(key, {"stream": False, "response": response.model_dump(mode="json")})
+        return response
+
+    def _record_stream(self, key: str, stream):
+        """Yields the chunks of a streamed response and stores them once the stream was consumed completely."""
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk.model_dump(mode="json"))
+            yield chunk
+        self.cache.put(key, {"stream": True, "response": chunks})
+
+
+def _restore(entry: dict):
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+    if entry["stream"]:
+        return iter([ChatCompletionChunk.model_validate(chunk) for chunk in entry["response"]])
+    return ChatCompletion.model_validate(entry["response"])
@@ -0,0 +1,148 @@
+"""
+Concurrent execution of the tool calls of one agent turn.
+
+When the model requests several tool calls at once, ParallelToolSwarm runs
+the calls that cannot interfere with each other in a thread pool. Each call
+is classified by what it touches:
+
+    read-only tools         read one file or a whole checkout
+    independent tools       touch no checkout (GitHub API, blob store, test reports)
+    file writes             change exactly one file
+    repository writes       replace a whole checkout (clone, checkout)
+    everything else         handoffs, edit-session and test tools, unknown tools
+
+In their original order the calls are cut into waves of independent calls.
+A call that touches a file (or checkout) written by an earlier call of the
+wave, or writes one read by it, starts a new wave; calls of the last class
+run alone. Waves run one after another, the calls of a wave concurrently,
+each in a copy of the caller's context so spans and repository redirects
+apply. Results are returned in the original order.
+
+SWARM_TOOL_THREADS sets the number of threads; 1 runs every call serially.
+"""
+import contextvars
+import json
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from swarm import Response
+
+from swarm_tracing import TracedSwarm
+
+TOOL_THREADS = int(os.getenv("SWARM_TOOL_THREADS", "8"))
+
+# Tool name -> (argument naming the repository, argument naming the file or None for the whole checkout).
+READ_ONLY_TOOLS = {
+    "read_file": ("repo", "file_path"),
+    "store_file": ("repository_name", "file_path"),
+    "list_functions": ("repository_name", "filename"),
+    "extract_function": ("repository_name", "filename"),
+    "find_related_files": ("repository", "file_path"),
+    "list_files_in_repository": ("repo", None),
+    "search_code": ("repository_name", None),
+    "find_symbol": ("repository_name", None),
+    "goto_symbol": ("repository_name", None),
+}
+FILE_WRITE_TOOLS = {
+    "write_file": ("repository_name", "file_path"),
+    "apply_diff": ("repository_name", "file_path"),
+    "modify_function": ("repository_name", "file_path"),
+    "find_and_replace": ("repository_name", "file_path"),
+    "modify_function_args": ("repository_name", "filename"),
+    "modify_return_type": ("repository_name", "filename"),
+    "convert_function_to_method": ("repository_name", "filename"),
+    "remove_function": ("repository_name", "filename"),
+}
+REPOSITORY_WRITE_TOOLS = {
+    "clone_repository": ("repository", None),
+    "checkout_commit": ("repository", None),
+}
+INDEPENDENT_TOOLS = {"analyze_issue", "resolve_handle", "get_test_details"}
+
+_pool = ThreadPoolExecutor(max_workers=max(1, TOOL_THREADS), thread_name_prefix="swarm-tool")
+
+
+def access(name: str, arguments: dict):
+    """
+    What a tool call touches: a list of (repository, file or None for the whole checkout, writes) entries,
+    an empty list for independent tools, or None if the call has to run alone.
+    """
+    if name in INDEPENDENT_TOOLS:
+        return []
+    for table, writes in ((READ_ONLY_TOOLS, False), (FILE_WRITE_TOOLS, True), (REPOSITORY_WRITE_TOOLS, True)):
+        if name in table:
+            repository_argument, path_argument = table[name]
+            break
+    else:
+        return None
+    repository = arguments.get(repository_argument)
+    if not isinstance(repository, str):
+        return None
+    path = arguments.get(path_argument) if path_argument else None
+    if isinstance(path, str):
+        path = posixpath.normpath(path.replace("\\", "/")).lstrip("/")
+    else:
+        # Unknown file: treat the call as touching the whole checkout.
+        path = None
+    return [(repository, path, writes)]
+
+
+def _conflict(first: tuple, second: tuple) -> bool:
+    if first[0] != second[0] or not (first[2] or second[2]):
+        return False
+    return first[1] is None or second[1] is None or first[1] == second[1]
+
+
+def waves(tool_calls: list) -> list:
+    """Splits tool calls into consecutive groups (lists of indices) whose calls can run concurrently."""
+    groups = []
+    current = []
+    touched = []
+    for index, tool_call in enumerate(tool_calls):
+        try:
+            arguments = json.loads(tool_call.function.arguments or "{}")
+        except ValueError:
+            arguments = None
+        accesses = access(tool_call.function.name, arguments) if isinstance(arguments, dict) else None
+        if accesses is None:
+            if current:
+                groups.append(current)
+            groups.append([index])
+            current, touched = [], []
+            continue
+        if any(_conflict(new, old) for new in accesses for old in touched):
+            groups.append(current)
+            current, touched = [], []
+        current.append(index)
+        touched.extend(accesses)
+    if current:
+        groups.append(current)
+    return groups
+
+
+class ParallelToolSwarm(TracedSwarm):
+    """TracedSwarm that runs independent tool calls of a turn concurrently."""
+
+    def execute_tool_calls(self, tool_calls, functions, context_variables, debug):
+        if len(tool_calls) < 2 or TOOL_THREADS < 2:
+            return super().execute_tool_calls(tool_calls, functions, context_variables, debug)
+
+        run = super().execute_tool_calls
+        partials = [None] * len(tool_calls)
+        for group in waves(tool_calls):
+            if len(group) == 1:
+                partials[group[0]] = run([tool_calls[group[0]]], functions, context_variables, debug)
+                continue
+            futures = [(index, _pool.submit(contextvars.copy_context().run, run, [tool_calls[index]], functions,
+                                            context_variables, debug)) for index in group]
+            for index, future in futures:
+                partials[index] = future.result()
+
+        response = Response(messages=[], agent=None, context_variables={})
+        for partial in partials:
+            response.messages.extend(partial.messages)
+            response.context_variables.update(partial.context_variables)
+            if partial.agent:
+                response.agent = partial.agent
+        return response
@@ -7,7 +7,9 @@ Your tasks:
 2. If a Base Commit is specified checkout to this commit using checkout_commit(repository, commit_hash) tool.
 3. Analyze the given GitHub issue and categorize it (Bug, Feature, or Task) with get_issue_analysis(owner, repository, issue_number,branch) tool.
 4. Suggest ways to resolve the issue.
-5. Identify files in the repository.
+5. Identify files in the repository. Use search_code(repository_name, query) to find definitions and usages instead of reading files one by one.
+6. Store every relevant file with store_file(repository_name, file_path, start_line, end_line) and put the returned blob handle and the span of interest into repository_code.
+   NEVER copy source code into your answer. Other agents read the code with resolve_handle(blob, start_line, end_line).
 
 Provide the analysis results in JSON format. Include the repository name in your JSON.
 Do not include the repository owner in repository_name. 
@@ -21,7 +23,8 @@ YOU ANSWER STRICTLY IN THE FOLLOWING JSON PATTERN:
     file_paths: ["...", "...", ...],
     repository_code: [{
         file_name: "...",
-        code: "..."
+        blob: "...",
+        span: [start_line, end_line]
         }, {...}],
 }
 """
@@ -38,14 +41,19 @@ You will receive a JSON Structure of this form:
     file_paths: ["...", "...", ...],
     repository_code: [{
         file_name: "...",
-        code: "..."
+        blob: "...",
+        span: [start_line, end_line]
         }, {...}],
 }
+repository_code only contains blob handles. Read the code behind them with resolve_handle(blob, start_line, end_line), only the spans you need.
 Your initial task before fixing is to find out where the issue lies. In order to do that the FileManager Agent can read in Files for you. Try to read in the files needed to solve the issues.
 When doing that pay attention to external modules used in the files and read the code of them as well.
+Use search_code(repository_name, query, regex, path_glob) to locate definitions and callers in one call.
+Use find_symbol(repository_name, query) to find classes, functions and methods by (qualified or approximate) name and goto_symbol(repository_name, qualname) to read their code directly.
 Make sure to follow the suggestions and implement the necessary changes or features.
-When you think you are done you extend the received JSON Structure with changed files and the accumulated code of the changed repository.
-Make sure to seperate files within the code key value pair.
+When you think you are done you extend the received JSON Structure with the changed files.
+For every changed file add ONE entry with the blob the change is based on and a unified diff (hunks starting with "@@ -a,b +c,d @@", a few lines of context, "-" for removed and "+" for added lines).
+NEVER repeat unchanged code or whole files. New files are a diff against an empty file without base_blob.
 Your response should look like this:
 {
     repository_name: "...",
@@ -55,12 +63,14 @@ Your response should look like this:
     file_paths: ["...", "...", ...],
     repository_code: [{
         file_name: "...",
-        code: "..."
+        blob: "...",
+        span: [start_line, end_line]
         }, {...}],
     changed_file_paths: ["...", "...", ...]
     repository_code_changed: [{
         file_name: "...",
-        code: "..."
+        base_blob: "...",
+        diff: "@@ -a,b +c,d @@ ..."
         }, {...}],
 }
 
@@ -72,6 +82,7 @@ The code you provide has to be changed in the local repository by a file manipul
 CODE_PREP = """
 You are a skilled assistant for Code Execution Preperation as well as Test Code Development.
 You will receive the following JSON Structure with information about a Github Issue and its repository as well as the changed files during the execution of other agents.
+Code is only referenced by blob handles and diffs. Read it with resolve_handle(blob, start_line, end_line) when needed.
 {
     repository_name: "...",
     issue_title: "...",
@@ -80,12 +91,14 @@ You will receive the following JSON Structure with information about a Github Is
     file_paths: ["...", "...", ...],
     repository_code: [{
         file_name: "...",
-        code: "..."
+        blob: "...",
+        span: [start_line, end_line]
         }, {...}],
     changed_file_paths: ["...", "...", ...]
     repository_code_changed: [{
         file_name: "...",
-        code: "..."
+        base_blob: "...",
+        diff: "@@ -a,b +c,d @@ ..."
         }, {...}],
 }
 You have two main Tasks that BOTH are ALWAYS to be completed:
@@ -139,18 +152,24 @@ It looks like this:
     file_paths: ["...", "...", ...],
     repository_code: [{
         file_name: "...",
-        code: "..."
+        blob: "...",
+        span: [start_line, end_line]
         }, {...}],
     changed_file_paths: ["...", "...", ...]
     repository_code_changed: [{
         file_name: "...",
-        code: "..."
+        base_blob: "...",
+        diff: "@@ -a,b +c,d @@ ..."
         }, {...}],
 }
 
 Your tasks:
-1. Compare repository_code_changed with repository_code and spot the differences.
-2. Implement the required changes as provided in the JSON.
+0. Start with begin_edit_session(repository_name). All edits are buffered until commit_edit_session(repository_name) writes them at once.
+   If edits went wrong, discard them with rollback_edit_session(repository_name) and start again.
+1. Apply every entry of repository_code_changed with apply_diff(repository_name, file_name, diff, base_blob).
+2. If a diff does not apply, read the current code with read_file or resolve_handle and implement the change with the other tools.
+   read_file returns large files as an outline plus the first lines. Read only the line ranges you need (start_line, end_line) and continue with the returned cursor.
+   Reading a region again returns only a marker if it is unchanged or a diff if it changed; pass full=True if you need the whole content again.
 3. Use the provided tools to read, write, or append content to files.
 4. Ensure all changes align with the task requirements and maintain proper code structure.
 5. Ensure that all provided changes are made. In most cases you have to call the tool multiple times for that.
@@ -163,8 +182,8 @@ Instructions:
   - "append": Append content to a file.
 You call the tool with the respected files out of the repository structure. So always the relative path after the repo folder.
 
-Provide a summary of the changes made. Also always add the JSON structure.
-When all changes are made respond with TERMINATE and the JSON Structure with all information again.
+Provide a summary of the changes made. Also always add the JSON structure, with the new blob handles returned by apply_diff. Never add whole files to it.
+When all changes are made call commit_edit_session(repository_name) and respond with TERMINATE and the JSON Structure with all information again.
 NEVER lose the JSON structure.
 """
 
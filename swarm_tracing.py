@@ -0,0 +1,305 @@
+"""
+Lightweight tracing of swarm runs.
+
+Spans are nested through a context variable and written as one JSON line
+each to SWARM_TRACE (default: .swarm_cache/traces.jsonl, "off" disables
+the sink). Every span records wall time, payload sizes, errors and, for
+LLM calls, tokens in/out.
+
+Span kinds:
+    run       one Swarm.run call
+    turn      one agent turn: the completion plus the tool calls it requested
+    llm       one chat completion
+    tool      one toolkit function call
+    handoff   one transfer_* call
+    instance  one SWE-Bench instance (swarm_agents.run_instance)
+    candidate one best-of-N branch (swarm_best_of_n.py)
+
+TracedSwarm records run, turn, llm, tool and handoff spans without any
+change to the agents. `traced` wraps other functions.
+
+Usage:
+    python swarm_tracing.py summary [--trace PATH] [--instance ID]
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+from swarm import Swarm
+
+from tools.workspace import CACHE_DIR
+
+TRACE_PATH = os.getenv("SWARM_TRACE", os.path.join(CACHE_DIR, "traces.jsonl"))
+
+_current_span = contextvars.ContextVar("swarm_current_span", default=None)
+_open_turn = contextvars.ContextVar("swarm_open_turn", default=None)
+_sink_lock = threading.Lock()
+_MISSING = object()
+
+
+def _write(record: dict):
+    if TRACE_PATH.lower() in ("", "0", "off", "none"):
+        return
+    line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+    with _sink_lock:
+        directory = os.path.dirname(TRACE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One write per record on an O_APPEND descriptor keeps lines of parallel workers intact.
+        fd = os.open(TRACE_PATH, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def _size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class Span:
+    """A timed unit of work. Use as context manager or call start()/finish() explicitly."""
+
+    def __init__(self, kind: str, name: str, **attributes):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+        self._token = None
+
+    def start(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        if parent and "agent" in parent.attributes:
+            self.attributes.setdefault("agent", parent.attributes["agent"])
+        if parent and "instance_id" in parent.attributes:
+            self.attributes.setdefault("instance_id", parent.attributes["instance_id"])
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def finish(self):
+        duration = time.perf_counter() - self._clock
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Finished from another context (e.g. a stream consumed elsewhere).
+                pass
+            self._token = None
+        _write({
+            "trace": self.trace_id, "span": self.span_id, "parent": self.parent_id, "kind": self.kind, "name": self.name,
+            "start": round(self.started, 6), "duration": round(duration, 6), "error": self.error, **self.attributes,
+        })
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.finish()
+        return False
+
+
+def span(kind: str, name: str, **attributes) -> Span:
+    return Span(kind, name, **attributes)
+
+
+def traced(func=None, *, kind: str = None, name: str = None):
+    """
+    Records a span for every call of `func`. Handoffs (transfer_*) get kind "handoff", everything else "tool".
+    Tool results starting with "Error" are recorded as errors.
+
+    Swarm only passes context_variables to functions that name it, so the wrapper does so exactly when `func` does.
+    """
+    if func is None:
+        return lambda f: traced(f, kind=kind, name=name)
+    if getattr(func, "__traced__", False):
+        return func
+    label = name or func.__name__
+    span_kind = kind or ("handoff" if label.startswith("transfer_") else "tool")
+
+    def call(args, kwargs):
+        with Span(span_kind, label, in_bytes=_size(args) + _size(kwargs)) as current:
+            result = func(*args, **kwargs)
+            if span_kind == "handoff" and hasattr(result, "name"):
+                current.attributes["target"] = result.name
+            else:
+                current.attributes["out_bytes"] = _size(getattr(result, "value", result))
+            if isinstance(result, str) and result.startswith("Error"):
+                current.error = result[:300]
+            return result
+
+    code = getattr(func, "__code__", None)
+    if code is not None and "context_variables" in code.co_varnames:
+        @functools.wraps(func)
+        def wrapper(*args, context_variables=_MISSING, **kwargs):
+            if context_variables is not _MISSING:
+                kwargs["context_variables"] = context_variables
+            return call(args, kwargs)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return call(args, kwargs)
+    wrapper.__traced__ = True
+    return wrapper
+
+
+_traced_functions = {}
+
+
+def _traced_function(func):
+    # Wrappers are cached so that each function is wrapped once, not once per turn.
+    wrapper = _traced_functions.get(func)
+    if wrapper is None:
+        wrapper = _traced_functions[func] = traced(func)
+    return wrapper
+
+
+class TracedSwarm(Swarm):
+    """Swarm that records run, turn, llm, tool and handoff spans."""
+
+    def _finish_turn(self):
+        turn = _open_turn.get()
+        if turn is not None:
+            _open_turn.set(None)
+            turn.finish()
+
+    def get_chat_completion(self, agent, history, context_variables, model_override, stream, debug):
+        self._finish_turn()
+        _open_turn.set(Span("turn", agent.name, agent=agent.name).start())
+        llm = Span("llm", agent.name, model=model_override or agent.model, messages=len(history),
+                   in_bytes=_size(history)).start()
+        try:
+            completion = super().get_chat_completion(agent=agent, history=history, context_variables=context_variables,
+                                                     model_override=model_override, stream=stream, debug=debug)
+        except Exception as e:
+            llm.error = f"{type(e).__name__}: {e}"
+            llm.finish()
+            raise
+        if stream:
+            return self._traced_stream(completion, llm)
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            llm.attributes["tokens_in"] = usage.prompt_tokens
+            llm.attributes["tokens_out"] = usage.completion_tokens
+        message = completion.choices[0].message
+        llm.attributes["out_bytes"] = _size(message.content)
+        llm.attributes["tool_calls"] = len(message.tool_calls or [])
+        llm.finish()
+        return completion
+
+    def _traced_stream(self, completion, llm):
+        out_bytes = 0
+        try:
+            for chunk in completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    out_bytes += len(chunk.choices[0].delta.content)
+                yield chunk
+        finally:
+            llm.attributes["out_bytes"] = out_bytes
+            llm.finish()
+
+    def handle_tool_calls(self, tool_calls, functions, context_variables, debug):
+        functions = [_traced_function(function) for function in functions]
+        try:
+            return self.execute_tool_calls(tool_calls, functions, context_variables, debug)
+        finally:
+            self._finish_turn()
+
+    def execute_tool_calls(self, tool_calls, functions, context_variables, debug):
+        """Runs the (already traced) tool calls of one turn. Subclasses may change how, see swarm_parallel.py."""
+        return super().handle_tool_calls(tool_calls, functions, context_variables, debug)
+
+    def run(self, agent, messages, context_variables={}, model_override=None, stream=False, debug=False,
+            max_turns=float("inf"), execute_tools=True):
+        if stream:
+            return self._run_stream(agent, messages, context_variables, model_override, debug, max_turns, execute_tools)
+        with Span("run", agent.name, agent=agent.name):
+            try:
+                return super().run(agent, messages, context_variables, model_override, stream, debug, max_turns, execute_tools)
+            finally:
+                self._finish_turn()
+
+    def _run_stream(self, agent, messages, context_variables, model_override, debug, max_turns, execute_tools):
+        with Span("run", agent.name, agent=agent.name):
+            try:
+                yield from super().run(agent, messages, context_variables, model_override, True, debug, max_turns, execute_tools)
+            finally:
+                self._finish_turn()
+
+
+def load_spans(path: str = TRACE_PATH, instance_id: str = None) -> list:
+    spans = []
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if instance_id is None or record.get("instance_id") == instance_id:
+                spans.append(record)
+    return spans
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def summarize(spans: list) -> list:
+    """Aggregates spans per (kind, name): count, total, p50, p95, errors and tokens."""
+    groups = {}
+    for record in spans:
+        groups.setdefault((record["kind"], record["name"]), []).append(record)
+    rows = []
+    for (kind, name), records in groups.items():
+        durations = [record["duration"] for record in records]
+        rows.append({
+            "kind": kind, "name": name, "count": len(records), "total": sum(durations),
+            "p50": _percentile(durations, 0.5), "p95": _percentile(durations, 0.95),
+            "errors": sum(1 for record in records if record.get("error")),
+            "tokens_in": sum(record.get("tokens_in") or 0 for record in records),
+            "tokens_out": sum(record.get("tokens_out") or 0 for record in records),
+        })
+    return sorted(rows, key=lambda row: (row["kind"], -row["total"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize swarm traces")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="p50/p95 per agent, tool and LLM call")
+    summary.add_argument("--trace", default=TRACE_PATH)
+    summary.add_argument("--instance", help="Only spans of this instance id")
+    summary.add_argument("--kind", help="Only spans of this kind (run, turn, llm, tool, handoff, instance)")
+    args = parser.parse_args(argv)
+
+    rows = summarize(load_spans(args.trace, args.instance))
+    if args.kind:
+        rows = [row for row in rows if row["kind"] == args.kind]
+    header = f"{'kind':<9} {'name':<32} {'count':>6} {'total s':>9} {'p50 s':>8} {'p95 s':>8} {'errors':>6} {'tok in':>9} {'tok out':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['kind']:<9} {row['name'][:32]:<32} {row['count']:>6} {row['total']:>9.2f} {row['p50']:>8.3f} "
+              f"{row['p95']:>8.3f} {row['errors']:>6} {row['tokens_in']:>9} {row['tokens_out']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Leases of swarm_batch.JobQueue."""
+import json
+
+import pytest
+
+from swarm_batch import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"))
+    queue.enqueue([{"instance_id": "acme__proj-1"}], max_attempts=3, timeout=60)
+    return queue
+
+
+def _expire(queue: JobQueue):
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET lease_expires = 0")
+
+
+def test_holder_of_the_lease_completes_the_job(queue):
+    job = queue.claim("w1")
+    assert queue.complete(job["instance_id"], {"success": True}, "w1", job["attempts"] + 1)
+    assert queue.jobs("done")[0]["result"] == json.dumps({"success": True})
+
+
+def test_worker_that_lost_its_lease_cannot_overwrite_the_next_attempt(queue):
+    first = queue.claim("w1")
+    _expire(queue)
+    second = queue.claim("w2")
+    assert second["instance_id"] == first["instance_id"]
+
+    assert not queue.complete(first["instance_id"], {"from": "w1"}, "w1", first["attempts"] + 1)
+    assert not queue.fail(first["instance_id"], "late failure", "w1", first["attempts"] + 1)
+    assert queue.complete(second["instance_id"], {"from": "w2"}, "w2", second["attempts"] + 1)
+    job = queue.jobs()[0]
+    assert (job["status"], job["result"]) == ("done", json.dumps({"from": "w2"}))
+
+
+def test_expired_lease_is_lost_even_before_the_job_is_claimed_again(queue):
+    job = queue.claim("w1")
+    _expire(queue)
+    assert not queue.fail(job["instance_id"], "too late", "w1", job["attempts"] + 1)
+    assert queue.jobs()[0]["status"] == "running"
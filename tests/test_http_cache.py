@@ -0,0 +1,144 @@
+"""Conditional requests and cache hits of tools.http_cache.github_get against a local http.server."""
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools import http_cache, workspace
+
+ETAG = '"v1"'
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+class GitHubStandIn(BaseHTTPRequestHandler):
+    """
+    Answers every GET with the same JSON body and ETag, or 304 when the client already has it.
+    Responses queued in `limited` (status, headers) are sent first, e.g. to exhaust the rate limit.
+    """
+    requests = []
+    limited = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.limited:
+            status, headers = self.limited.pop(0)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(http_cache, "_blocked_until", 0.0)
+    GitHubStandIn.requests = []
+    GitHubStandIn.limited = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), GitHubStandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_revalidates_with_etag_and_serves_304_from_cache(server):
+    url = f"{server}/repos/acme/proj/contents/setup.py"
+    first = http_cache.github_get(url, "main")
+    second = http_cache.github_get(url, "main")
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json() == first.json() == {"path": "/repos/acme/proj/contents/setup.py"}
+    assert second.headers["ETag"] == ETAG
+    assert GitHubStandIn.requests == [("/repos/acme/proj/contents/setup.py", None),
+                                      ("/repos/acme/proj/contents/setup.py", ETAG)]
+
+
+def test_full_commit_hash_is_served_without_a_request(server):
+    url = f"{server}/repos/acme/proj/git/trees/{COMMIT}"
+    first = http_cache.github_get(url, COMMIT)
+    second = http_cache.github_get(url, COMMIT)
+
+    assert second.json() == first.json()
+    assert len(GitHubStandIn.requests) == 1
+
+
+def test_cache_is_keyed_by_commit(server):
+    url = f"{server}/repos/acme/proj/contents/setup.py"
+    http_cache.github_get(url, "main")
+    http_cache.github_get(url, "dev")
+
+    # A response cached for one branch is no validator for another.
+    assert [etag for _, etag in GitHubStandIn.requests] == [None, None]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Waits of github_get, recorded instead of slept; the clock of http_cache moves on by them."""
+    waits = []
+
+    class Clock:
+        @staticmethod
+        def time():
+            return time.time() + sum(waits)
+
+        @staticmethod
+        def sleep(seconds):
+            waits.append(seconds)
+
+    monkeypatch.setattr(http_cache, "time", Clock)
+    return waits
+
+
+def test_waits_for_the_rate_limit_reset(server, sleeps):
+    reset = int(time.time()) + 30
+    GitHubStandIn.limited = [(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)})]
+    response = http_cache.github_get(f"{server}/repos/acme/proj", "main")
+
+    assert response.status_code == 200
+    assert len(GitHubStandIn.requests) == 2
+    # Until the reset plus a second of slack.
+    assert len(sleeps) == 1 and 29 <= sleeps[0] <= 32
+    assert http_cache._blocked_until == reset + 1
+
+
+def test_gives_up_when_the_reset_is_too_far_away(server, sleeps):
+    reset = int(time.time()) + http_cache.MAX_RATE_LIMIT_WAIT + 60
+    GitHubStandIn.limited = [(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)})]
+    response = http_cache.github_get(f"{server}/repos/acme/proj", "main")
+
+    assert response.status_code == 403
+    assert sleeps == [] and len(GitHubStandIn.requests) == 1
+
+
+@pytest.mark.parametrize("http_date", [False, True])
+def test_honours_retry_after_in_seconds_and_as_http_date(server, sleeps, http_date):
+    retry_after = formatdate(time.time() + 12, usegmt=True) if http_date else "12"
+    GitHubStandIn.limited = [(429, {"Retry-After": retry_after})]
+    response = http_cache.github_get(f"{server}/repos/acme/proj", "main")
+
+    assert response.status_code == 200
+    # HTTP dates have whole seconds.
+    assert len(sleeps) == 1 and 10 <= sleeps[0] <= 12
@@ -0,0 +1,99 @@
+"""Record/replay of swarm_llm_cache.CachingClient over a conversation with real run_impacted_tests results."""
+import json
+import os
+import subprocess
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+import swarm_llm_cache
+from swarm_llm_cache import CacheMiss, CachingClient, ResponseCache
+from tools import workspace
+from tools.executor_toolkit import run_impacted_tests
+
+GIT_ENV = {"GIT_AUTHOR_NAME": "t", "GIT_AUTHOR_EMAIL": "t@t", "GIT_COMMITTER_NAME": "t", "GIT_COMMITTER_EMAIL": "t@t"}
+
+
+class FakeOpenAI:
+    """Answers every request with the same completion and counts the calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, **params):
+        self.calls += 1
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-{self.calls}", "object": "chat.completion", "created": 0, "model": params["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"answer {self.calls}"}}],
+        })
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("SWARM_WORKSPACE", str(tmp_path / "coding"))
+    repo_dir = tmp_path / "coding" / "proj"
+    repo_dir.mkdir(parents=True)
+    (repo_dir / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+    (repo_dir / "test_calc.py").write_text("from calc import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+    env = dict(os.environ, **GIT_ENV)
+    for command in (["init", "-q"], ["add", "-A"], ["commit", "-qm", "base"]):
+        subprocess.run(["git", *command], cwd=repo_dir, env=env, check=True)
+    # An uncommitted bug, so the impacted test fails.
+    (repo_dir / "calc.py").write_text("def add(a, b):\n    return a - b\n")
+    return "proj"
+
+
+def _conversation(tool_result: str) -> dict:
+    tool_call = {"id": "call_1", "type": "function", "function": {"name": "run_impacted_tests", "arguments": '{"repo_name": "proj"}'}}
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "user", "content": "Fix add."},
+            {"role": "assistant", "content": None, "tool_calls": [tool_call]},
+            {"role": "tool", "tool_call_id": "call_1", "tool_name": "run_impacted_tests", "content": tool_result},
+        ],
+    }
+
+
+def test_replay_matches_after_the_tests_ran_again(repo, tmp_path):
+    recorded = run_impacted_tests(repo)
+    replayed = run_impacted_tests(repo)
+    assert json.loads(recorded)["status"] == "failed"
+    # Job ids (and usually durations) differ between the runs.
+    assert recorded != replayed
+
+    cache = ResponseCache(str(tmp_path / "llm"))
+    openai_client = FakeOpenAI()
+    recording = CachingClient(openai_client, mode="record", cache=cache)
+    first = recording.chat.completions.create(**_conversation(recorded))
+
+    replay = CachingClient(mode="replay", cache=cache)
+    second = replay.chat.completions.create(**_conversation(replayed))
+    assert second.choices[0].message.content == first.choices[0].message.content
+    assert (replay.hits, replay.misses, openai_client.calls) == (1, 0, 1)
+
+
+def test_replay_misses_when_the_tool_result_really_changed(repo, tmp_path):
+    recorded = run_impacted_tests(repo)
+    cache = ResponseCache(str(tmp_path / "llm"))
+    CachingClient(FakeOpenAI(), mode="record", cache=cache).chat.completions.create(**_conversation(recorded))
+
+    repo_dir = os.path.join(workspace.workspace_root(), repo)
+    with open(os.path.join(repo_dir, "calc.py"), "w") as file:
+        file.write("def add(a, b):\n    return a + b\n")
+    with pytest.raises(CacheMiss):
+        CachingClient(mode="replay", cache=cache).chat.completions.create(**_conversation(run_impacted_tests(repo)))
+
+
+def test_volatile_values_are_masked_in_tool_results_only():
+    uuid = "0f3c2a9b8d7e4f6a9b1c2d3e4f5a6b7c"
+    tool = '{"summary": "1 failed in 0.48s", "details_handle": "%s"}'
+    assert swarm_llm_cache.request_key(_conversation(tool % uuid)) == \
+        swarm_llm_cache.request_key(_conversation(tool.replace("0.48", "1.02") % uuid[::-1]))
+    user = {"model": "m", "messages": [{"role": "user", "content": f"handle {uuid}"}]}
+    assert swarm_llm_cache.request_key(user) != \
+        swarm_llm_cache.request_key({"model": "m", "messages": [{"role": "user", "content": f"handle {uuid[::-1]}"}]})
@@ -0,0 +1,44 @@
+"""Grouping of failures in tools.test_digest against real pytest runs on the executor."""
+import pytest
+
+from tools import workspace
+from tools.executor_service import ExecutorService
+
+TESTS = '''
+def check_positive(value):
+    assert value > 0
+
+
+def test_bad1():
+    check_positive(-1)
+
+
+def test_bad2():
+    check_positive(-2)
+
+
+def test_direct1():
+    assert 1 == 2
+
+
+def test_direct2():
+    assert 3 == 4
+'''
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "CACHE_DIR", str(tmp_path / "cache"))
+    service = ExecutorService(workers_per_env=1)
+    yield service
+    service.shutdown()
+
+
+def test_failures_in_a_shared_helper_form_one_group(tmp_path, service):
+    (tmp_path / "test_helper.py").write_text(TESTS)
+    result = service.run(str(tmp_path), ["test_helper.py"])
+
+    groups = {tuple(group["tests"]) for group in result["failures"]["groups"]}
+    assert ("test_helper.py::test_bad1", "test_helper.py::test_bad2") in groups
+    # Asserts in the test functions themselves fail at different places.
+    assert ("test_helper.py::test_direct1",) in groups and ("test_helper.py::test_direct2",) in groups
@@ -0,0 +1,91 @@
+"""
+Cache of parsed Python modules shared by the toolkits.
+
+Entries are keyed by the real path of a file and validated against its
+mtime and size on every lookup. The least recently used entries are
+evicted once the estimated memory use exceeds the budget.
+"""
+import ast
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+AST_CACHE_BUDGET = int(os.getenv("SWARM_AST_CACHE_BYTES", 256 * 1024 * 1024))
+# A parsed module takes roughly this many times the size of its source in memory.
+AST_SIZE_FACTOR = 20
+
+_entries = OrderedDict()
+_used = 0
+_lock = threading.Lock()
+
+
+def _key(path: str) -> str:
+    return os.path.realpath(path)
+
+
+def _drop(key: str):
+    global _used
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _used -= entry["cost"]
+
+
+def get_source_and_tree(path: str):
+    """
+    Returns the source and the parsed module of a Python file.
+
+    The tree is shared with other callers and must not be modified. Use take_tree for that.
+
+    Args:
+        path (str): Path to the Python file.
+
+    Returns:
+        tuple: (source, ast.Module)
+    """
+    global _used
+    key = _key(path)
+    stat = os.stat(key)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            _entries.move_to_end(key)
+            return entry["source"], entry["tree"]
+
+    with open(key, "r", newline="") as file:
+        source = file.read()
+    tree = ast.parse(source)
+
+    cost = len(source) * AST_SIZE_FACTOR
+    with _lock:
+        _drop(key)
+        if cost <= AST_CACHE_BUDGET:
+            _entries[key] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "source": source, "tree": tree, "cost": cost}
+            _used += cost
+            while _used > AST_CACHE_BUDGET:
+                _drop(next(iter(_entries)))
+    return source, tree
+
+
+def get_tree(path: str) -> ast.Module:
+    """Returns the cached parsed module of a Python file (read-only)."""
+    return get_source_and_tree(path)[1]
+
+
+def take_tree(path: str) -> ast.Module:
+    """Returns a private copy of the parsed module that the caller may modify. The cached tree stays untouched."""
+    # Other readers (possibly on other threads) may hold the cached tree at this very moment.
+    return copy.deepcopy(get_tree(path))
+
+
+def invalidate(path: str):
+    """Removes a file from the cache. Called after the toolkit writes a file."""
+    with _lock:
+        _drop(_key(path))
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        global _used
+        _used = 0
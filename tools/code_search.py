@@ -0,0 +1,363 @@
+"""
+Trigram index and code search for a checkout.
+
+The index maps every (lower-cased) byte trigram to the sorted ids of the
+files containing it, packed into arrays. It is built in parallel, stored
+per commit and kept current by an overlay of files that changed since the
+build: files written by the toolkit (via the edit_session write hook) or
+whose mtime/size differ on disk. Queries intersect the postings of the
+trigrams every match must contain and verify the remaining candidates
+with the actual regular expression.
+"""
+import bisect
+import fnmatch
+import os
+import pickle
+import re
+import threading
+from array import array
+
+try:
+    import re._parser as sre_parse
+    from re._constants import LITERAL, SUBPATTERN
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import LITERAL, SUBPATTERN
+
+from tools import edit_session, repo_index
+from tools.test_selector import is_test_file
+from tools.workspace import cache_dir, checkout_key, head_commit, map_chunks, repo_path
+
+MAX_FILE_BYTES = 1024 * 1024
+# Rebuild instead of growing the overlay beyond this fraction of the indexed files.
+MAX_OVERLAY_FRACTION = 0.2
+MAX_SNIPPETS_PER_FILE = 3
+MAX_LINE_CHARS = 200
+MAX_RESULT_CHARS = 6000
+
+_indexes = {}
+_builders = {}
+_lock = threading.Lock()
+
+
+def _trigrams(data: bytes) -> set:
+    data = data.lower()
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+
+def _read_indexable(repo_dir: str, path: str):
+    """Returns (stat signature, bytes) of a file, or (signature, None) for binary and oversized files."""
+    full_path = os.path.join(repo_dir, path)
+    try:
+        stat = os.stat(full_path)
+        if stat.st_size > MAX_FILE_BYTES:
+            return [stat.st_mtime_ns, stat.st_size], None
+        with open(full_path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None, None
+    if b"\0" in data[:8192]:
+        return [stat.st_mtime_ns, stat.st_size], None
+    return [stat.st_mtime_ns, stat.st_size], data
+
+
+def _index_chunk(repo_dir: str, chunk: list):
+    """Indexes a contiguous range of (file id, path) pairs. Returns their stat signatures and partial postings."""
+    stats = []
+    postings = {}
+    for file_id, path in chunk:
+        signature, data = _read_indexable(repo_dir, path)
+        stats.append(signature)
+        if data is None:
+            continue
+        for trigram in _trigrams(data):
+            posting = postings.get(trigram)
+            if posting is None:
+                posting = postings[trigram] = array("I")
+            posting.append(file_id)
+    return stats, {trigram: posting.tobytes() for trigram, posting in postings.items()}
+
+
+def _cache_path(repo_dir: str, commit: str) -> str:
+    name = checkout_key(repo_dir)
+    return os.path.join(cache_dir("code_search"), f"{name}-{commit}.pickle")
+
+
+class TrigramIndex:
+    """Trigram postings of the files of one checkout plus an overlay of files changed since the build."""
+
+    def __init__(self, repo_dir: str, commit: str, files: list, stats: list, postings: dict):
+        self.repo_dir = repo_dir
+        self.commit = commit
+        self.files = files
+        self.ids = {path: file_id for file_id, path in enumerate(files)}
+        self.stats = stats
+        self.postings = postings
+        self.overlay = {}
+        self.overlay_stats = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, repo_dir: str, workers: int = None) -> "TrigramIndex":
+        commit = head_commit(repo_dir)
+        files = repo_index.get_files(repo_dir)
+        results = map_chunks(_index_chunk, repo_dir, list(enumerate(files)), workers)
+        stats = []
+        postings = {}
+        # Chunks cover increasing id ranges, so concatenating their postings keeps them sorted.
+        for chunk_stats, chunk_postings in results:
+            stats.extend(chunk_stats)
+            for trigram, posting in chunk_postings.items():
+                postings[trigram] = postings.get(trigram, b"") + posting
+        index = cls(repo_dir, commit, files, stats, postings)
+        index.save()
+        return index
+
+    def save(self):
+        path = _cache_path(self.repo_dir, self.commit)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump({"files": self.files, "stats": self.stats, "postings": self.postings}, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, repo_dir: str):
+        commit = head_commit(repo_dir)
+        try:
+            with open(_cache_path(repo_dir, commit), "rb") as file:
+                data = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return cls(repo_dir, commit, data["files"], data["stats"], data["postings"])
+
+    def mark_dirty(self, path: str):
+        with self.lock:
+            self.dirty.add(path)
+
+    def refresh(self) -> bool:
+        """
+        Brings the overlay up to date with the checkout. Returns False when so many files changed
+        (e.g. after a checkout of another commit) that the index should be rebuilt.
+        """
+        files = repo_index.get_files(self.repo_dir)
+        with self.lock:
+            changed = set(self.dirty)
+            self.dirty.clear()
+            current = set(files)
+            for path in files:
+                file_id = self.ids.get(path)
+                known = self.overlay_stats.get(path) if path in self.overlay else self.stats[file_id] if file_id is not None else None
+                try:
+                    stat = os.stat(os.path.join(self.repo_dir, path))
+                except FileNotFoundError:
+                    continue
+                if known != [stat.st_mtime_ns, stat.st_size]:
+                    changed.add(path)
+            changed.update(path for path in self.ids if path not in current and self.overlay.get(path, True) is not None)
+            changed.update(path for path, grams in self.overlay.items() if path not in current and grams is not None)
+
+            for path in changed:
+                signature, data = _read_indexable(self.repo_dir, path)
+                self.overlay[path] = _trigrams(data) if data is not None else None
+                # Later refreshes compare against the overlay version.
+                self.overlay_stats[path] = signature
+            return len(self.overlay) <= max(50, MAX_OVERLAY_FRACTION * len(self.files))
+
+    def candidates(self, trigrams: set) -> list:
+        """Paths of all files containing every trigram (all files for an empty set)."""
+        with self.lock:
+            overlay = dict(self.overlay)
+        if not trigrams:
+            ids = range(len(self.files))
+        else:
+            ids = None
+            for trigram in sorted(trigrams, key=lambda trigram: len(self.postings.get(trigram, b""))):
+                posting = array("I")
+                posting.frombytes(self.postings.get(trigram, b""))
+                ids = set(posting) if ids is None else ids.intersection(posting)
+                if not ids:
+                    break
+        paths = [self.files[file_id] for file_id in sorted(ids) if self.files[file_id] not in overlay]
+        paths.extend(path for path, grams in overlay.items() if grams is not None and trigrams <= grams)
+        return paths
+
+
+def _required_literals(pattern: str, flags: int) -> list:
+    """Literal strings every match of a regular expression has to contain (top-level sequences only)."""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    literals = []
+
+    def walk(items):
+        current = []
+        for op, value in items:
+            if op == LITERAL:
+                current.append(chr(value))
+                continue
+            if current:
+                literals.append("".join(current))
+                current = []
+            if op == SUBPATTERN:
+                walk(value[-1])
+        if current:
+            literals.append("".join(current))
+
+    walk(parsed)
+    return [literal for literal in literals if len(literal.encode("utf-8")) >= 3]
+
+
+def _query_trigrams(query: str, regex: bool, flags: int) -> set:
+    literals = _required_literals(query, flags) if regex else [query]
+    trigrams = set()
+    for literal in literals:
+        trigrams |= _trigrams(literal.encode("utf-8"))
+    return trigrams
+
+
+def get_index(repo_dir: str) -> TrigramIndex:
+    """Returns the current index of a checkout, waiting for a background build or building it when needed."""
+    key = os.path.realpath(repo_dir)
+    with _lock:
+        builder = _builders.get(key)
+    if builder is not None:
+        builder.join()
+
+    with _lock:
+        index = _indexes.get(key)
+    if index is None or index.commit != head_commit(repo_dir):
+        index = TrigramIndex.load(repo_dir) or TrigramIndex.build(repo_dir)
+    if not index.refresh():
+        index = TrigramIndex.build(repo_dir)
+    with _lock:
+        _indexes[key] = index
+    return index
+
+
+def build_in_background(repo_dir: str) -> threading.Thread:
+    """Starts building the index of a fresh checkout so that the first search does not have to wait for it."""
+    key = os.path.realpath(repo_dir)
+
+    def run():
+        try:
+            get_index(repo_dir)
+        except Exception:
+            pass
+        finally:
+            with _lock:
+                _builders.pop(key, None)
+
+    with _lock:
+        if key in _builders:
+            return _builders[key]
+        thread = threading.Thread(target=run, name=f"code-search-{os.path.basename(key)}", daemon=True)
+        _builders[key] = thread
+    thread.start()
+    return thread
+
+
+def note_write(repo_dir: str, rel_path: str):
+    """Write hook: the file is re-indexed on the next search."""
+    index = _indexes.get(os.path.realpath(repo_dir))
+    if index is not None:
+        index.mark_dirty(rel_path)
+
+
+edit_session.on_write(note_write)
+
+
+def _snippets(content: str, spans: list, context_lines: int) -> list:
+    line_starts = [0] + [match.end() for match in re.finditer("\n", content)]
+    lines = content.split("\n")
+    snippets = []
+    covered = -1
+    for start, _ in spans:
+        line = bisect.bisect_right(line_starts, start) - 1
+        if line <= covered:
+            continue
+        first, last = max(0, line - context_lines), min(len(lines) - 1, line + context_lines)
+        snippets.append({
+            "line": line + 1,
+            "text": "\n".join(f"{number + 1}{':' if number == line else '-'} {lines[number][:MAX_LINE_CHARS]}"
+                              for number in range(max(first, covered + 1), last + 1)),
+        })
+        covered = last
+        if len(snippets) >= MAX_SNIPPETS_PER_FILE:
+            break
+    return snippets
+
+
+_DEFINITION_RE = re.compile(r"^\s*(?:async\s+def|def|class)\s")
+
+
+def _line_at(content: str, offset: int) -> str:
+    end = content.find("\n", offset)
+    return content[content.rfind("\n", 0, offset) + 1:end if end != -1 else len(content)]
+
+
+def search_code(repository_name: str, query: str, regex: bool = False, path_glob: str = None,
+                case_sensitive: bool = True, context_lines: int = 1, max_results: int = 20) -> dict:
+    """
+    Searches the code of a repository with an index. Use it to find definitions, callers and usages instead of reading files one by one.
+
+    Args:
+        repository_name (str): The name of the repository.
+        query (str): Text to search for, or a Python regular expression if regex is True (e.g. "def get_.*_display").
+        regex (bool): Treat the query as regular expression.
+        path_glob (str): Only search files matching this glob on the relative path, e.g. "django/db/*" or "*.py".
+        case_sensitive (bool): Match case (default: True).
+        context_lines (int): Lines of context around every match (default: 1).
+        max_results (int): Maximum number of files returned (default: 20).
+
+    Returns:
+        dict: Matching files ranked by relevance (definitions first, tests last) with line numbered snippets,
+              plus the total number of matching files and matches.
+    """
+    repo_dir = repo_path(repository_name)
+    if not os.path.exists(repo_dir):
+        return {"error": f"Repository path '{repo_dir}' does not exist."}
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        pattern = re.compile(query if regex else re.escape(query), flags | re.MULTILINE)
+    except re.error as e:
+        return {"error": f"Invalid regular expression: {e}"}
+
+    index = get_index(repo_dir)
+    paths = index.candidates(_query_trigrams(query, regex, flags))
+    session = edit_session.active(repo_dir)
+    if session is not None:
+        # Pending edits are not in the index yet.
+        paths = sorted(set(paths) | set(session.buffers))
+    if path_glob:
+        paths = [path for path in paths if fnmatch.fnmatch(path, path_glob)]
+
+    results = []
+    total = 0
+    for path in paths:
+        try:
+            content = edit_session.read(repo_dir, path)
+        except (OSError, UnicodeDecodeError):
+            continue
+        spans = [match.span() for match in pattern.finditer(content)]
+        if not spans:
+            continue
+        total += len(spans)
+        definitions = sum(1 for start, _ in spans[:10] if _DEFINITION_RE.match(_line_at(content, start)))
+        score = min(len(spans), 10) + 10 * definitions - (5 if is_test_file(path) else 0)
+        result = {"file": path, "matches": len(spans), "snippets": _snippets(content, spans, max(0, context_lines))}
+        results.append((-score, path, result))
+
+    results = [result for _, _, result in sorted(results, key=lambda item: item[:2])]
+    response = {"query": query, "files_matched": len(results), "total_matches": total, "results": []}
+    size = 0
+    for result in results[:max_results]:
+        size += sum(len(snippet["text"]) for snippet in result["snippets"]) + len(result["file"])
+        if size > MAX_RESULT_CHARS and response["results"]:
+            break
+        response["results"].append(result)
+    if len(response["results"]) < len(results):
+        response["truncated"] = f"Showing {len(response['results'])} of {len(results)} files, narrow the query or path_glob."
+    return response
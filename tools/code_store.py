@@ -0,0 +1,192 @@
+"""
+Content-addressed store for source code passed between agents.
+
+Agents put file contents into the store and hand each other short blob
+handles, line spans and unified diffs instead of re-emitting whole files
+in their JSON replies. Blobs are addressed by their sha256 and stored once.
+"""
+import glob
+import hashlib
+import os
+import re
+
+from tools import edit_session
+from tools.workspace import cache_dir, repo_path
+
+# Number of hex digits of the sha256 used as handle.
+HANDLE_LENGTH = 12
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def put(content: str) -> str:
+    """Stores content and returns its full sha256."""
+    sha = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir("blobs", sha[:2]), sha[2:])
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    return sha
+
+
+def get(handle: str):
+    """Returns the content of a blob given its sha256 or a unique prefix of it, or None."""
+    handle = handle.strip().lower()
+    if len(handle) < 4 or not re.fullmatch(r"[0-9a-f]+", handle):
+        return None
+    matches = glob.glob(os.path.join(cache_dir("blobs", handle[:2]), f"{handle[2:]}*"))
+    matches = [match for match in matches if not match.endswith(".tmp")]
+    if len(matches) != 1:
+        return None
+    with open(matches[0], "r", encoding="utf-8", newline="") as file:
+        return file.read()
+
+
+def _span(content: str, start_line: int = None, end_line: int = None) -> str:
+    if start_line is None and end_line is None:
+        return content
+    lines = content.splitlines(keepends=True)
+    start = max((start_line or 1) - 1, 0)
+    end = end_line or len(lines)
+    return "".join(lines[start:end])
+
+
+def store_file(repository_name: str, file_path: str, start_line: int = None, end_line: int = None) -> dict:
+    """
+    Stores the current content of a repository file and returns a short handle for it.
+    Put handles into the JSON handoff instead of code.
+
+    Args:
+        repository_name (str): The name of the repository.
+        file_path (str): Path to the file relative to the repository root.
+        start_line (int): Optional first line (1-based) of the span of interest.
+        end_line (int): Optional last line of the span of interest.
+
+    Returns:
+        dict: file_name, blob handle, span and number of lines, or an error message.
+    """
+    full_path = f"{repo_path(repository_name)}/{file_path}"
+    try:
+        content = edit_session.read(repo_path(repository_name), file_path)
+    except FileNotFoundError:
+        return {"error": f"File '{full_path}' not found."}
+    sha = put(content)
+    lines = content.count("\n") + (0 if content.endswith("\n") or not content else 1)
+    return {
+        "file_name": file_path,
+        "blob": sha[:HANDLE_LENGTH],
+        "span": [start_line or 1, end_line or lines],
+        "lines": lines,
+    }
+
+
+def resolve_handle(blob: str, start_line: int = None, end_line: int = None) -> str:
+    """
+    Returns the code behind a blob handle, optionally only the given line span.
+
+    Args:
+        blob (str): The blob handle (e.g. from store_file or from the handoff JSON).
+        start_line (int): Optional first line (1-based).
+        end_line (int): Optional last line.
+
+    Returns:
+        str: The code or an error message.
+    """
+    content = get(blob)
+    if content is None:
+        return f"Error: Unknown or ambiguous blob handle '{blob}'."
+    return _span(content, start_line, end_line)
+
+
+def apply_unified_diff(content: str, diff: str) -> str:
+    """
+    Applies the hunks of a unified diff to content. Hunks are located by their context and
+    removed lines, preferring the position given in the hunk header. Raises ValueError if a hunk does not match.
+    """
+    lines = content.splitlines(keepends=True)
+    hunks = []
+    current = None
+    # Lines of the current hunk still expected by its header; file headers ("--- a/x") only appear outside hunks.
+    old_left = new_left = 0
+    diff_lines = diff.splitlines()
+    for index, line in enumerate(diff_lines):
+        match = _HUNK_RE.match(line)
+        if match:
+            current = {"start": int(match.group(1)), "old": [], "new": []}
+            hunks.append(current)
+            old_left = int(match.group(2) or 1)
+            new_left = int(match.group(4) or 1)
+        elif line.startswith("\\"):
+            continue
+        elif current is None or (old_left <= 0 and new_left <= 0):
+            following = diff_lines[index + 1] if index + 1 < len(diff_lines) else ""
+            header = (line.startswith("--- ") and following.startswith("+++ ")) or \
+                (line.startswith("+++ ") and index > 0 and diff_lines[index - 1].startswith("--- "))
+            if current is not None and line.startswith((" ", "+", "-")) and not header:
+                raise ValueError(f"Hunk at line {current['start']} has more lines than its header "
+                                 f"counts: {line!r}. Fix the counts in the @@ header.")
+        elif line.startswith("+"):
+            current["new"].append(line[1:])
+            new_left -= 1
+        elif line.startswith("-"):
+            current["old"].append(line[1:])
+            old_left -= 1
+        else:
+            text = line[1:] if line.startswith(" ") else line
+            current["old"].append(text)
+            current["new"].append(text)
+            old_left -= 1
+            new_left -= 1
+    if not hunks:
+        raise ValueError("The diff contains no hunks.")
+
+    stripped = [line.rstrip("\r\n") for line in lines]
+    offset = 0
+    for hunk in hunks:
+        old = hunk["old"]
+        expected = max(hunk["start"] - 1 + offset, 0)
+        candidates = sorted(range(len(stripped) - len(old) + 1), key=lambda index: abs(index - expected))
+        position = next((index for index in candidates if stripped[index:index + len(old)] == old), None)
+        if position is None:
+            raise ValueError(f"Hunk at line {hunk['start']} does not match the file:\n" + "\n".join(old[:5]))
+        newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+        new_lines = [text + newline for text in hunk["new"]]
+        if position + len(old) == len(lines) and lines and not lines[-1].endswith("\n") and new_lines:
+            new_lines[-1] = new_lines[-1].rstrip("\r\n")
+        lines[position:position + len(old)] = new_lines
+        stripped[position:position + len(old)] = hunk["new"]
+        offset += len(hunk["new"]) - len(old)
+    return "".join(lines)
+
+
+def apply_diff(repository_name: str, file_path: str, diff: str, base_blob: str = None) -> str:
+    """
+    Applies a unified diff from the handoff JSON to a repository file.
+
+    Args:
+        repository_name (str): The name of the repository.
+        file_path (str): Path to the file relative to the repository root.
+        diff (str): Unified diff (hunks starting with "@@ -a,b +c,d @@").
+        base_blob (str): Optional blob handle the diff was made against. The file has to be unchanged since then.
+
+    Returns:
+        str: Success message with the new blob handle, or an error message.
+    """
+    repo_dir = repo_path(repository_name)
+    full_path = f"{repo_dir}/{file_path}"
+    try:
+        content = edit_session.read(repo_dir, file_path)
+    except FileNotFoundError:
+        content = ""
+    if base_blob and not hashlib.sha256(content.encode("utf-8")).hexdigest().startswith(base_blob.lower()):
+        return f"Error: {file_path} changed since blob {base_blob}. Call store_file for the current version and rebase the diff."
+    try:
+        new_content = apply_unified_diff(content, diff)
+    except ValueError as e:
+        return f"Error: {e}"
+    if edit_session.active(repo_dir) is None:
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    edit_session.write(repo_dir, file_path, new_content)
+    return f"APPLY DIFF to {full_path} successful! New blob: {put(new_content)[:HANDLE_LENGTH]}"
@@ -0,0 +1,260 @@
+"""
+Copy-on-write edit sessions for the file toolkit.
+
+While a session is open for a checkout, toolkit writes only update
+in-memory buffers and toolkit reads see those buffers, so a sequence of
+edits to one module costs no disk round-trips. commit() writes every
+touched file once, atomically (temporary file + os.replace), after
+checking that nobody else changed the files on disk in the meantime;
+rollback() drops the buffers. Without an open session reads and writes
+go straight to disk.
+
+All toolkit I/O goes through read(), write() and tree() of this module,
+and after_write() is the single place that updates the caches once a
+file has changed on disk.
+"""
+import ast
+import difflib
+import os
+import threading
+
+from tools import ast_cache, repo_index
+from tools.workspace import repo_path
+
+_sessions = {}
+_write_hooks = []
+_lock = threading.Lock()
+
+
+class EditConflict(RuntimeError):
+    """Raised by commit() when files of a session changed on disk after they were first edited in it."""
+
+    def __init__(self, paths: list):
+        super().__init__(f"Files changed on disk since they were edited in the session: {', '.join(paths)}")
+        self.paths = paths
+
+
+class EditSession:
+    """Pending edits of one checkout, by repository relative path."""
+
+    def __init__(self, repo_dir: str):
+        self.repo_dir = repo_dir
+        self.buffers = {}
+        self.originals = {}
+        self.base = {}
+        self.trees = {}
+
+    def _stat(self, rel_path: str):
+        try:
+            stat = os.stat(os.path.join(self.repo_dir, rel_path))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def read(self, rel_path: str) -> str:
+        if rel_path not in self.buffers:
+            return _read_disk(self.repo_dir, rel_path)
+        return self.buffers[rel_path]
+
+    def write(self, rel_path: str, content: str):
+        if rel_path not in self.originals:
+            self.originals[rel_path] = self._stat(rel_path)
+            try:
+                self.base[rel_path] = _read_disk(self.repo_dir, rel_path)
+            except FileNotFoundError:
+                self.base[rel_path] = None
+        self.buffers[rel_path] = content
+        self.trees.pop(rel_path, None)
+
+    def tree(self, rel_path: str, take: bool = False) -> ast.Module:
+        content = self.buffers[rel_path]
+        cached = self.trees.pop(rel_path, None) if take else self.trees.get(rel_path)
+        if cached is not None and cached[0] is content:
+            return cached[1]
+        tree = ast.parse(content)
+        if not take:
+            self.trees[rel_path] = (content, tree)
+        return tree
+
+    def changes(self) -> dict:
+        """Maps touched files to their changed line counts."""
+        result = {}
+        for rel_path, content in self.buffers.items():
+            base = self.base[rel_path]
+            if content == base:
+                continue
+            added = removed = 0
+            for line in difflib.unified_diff((base or "").splitlines(), content.splitlines(), lineterm="", n=0):
+                if line.startswith("+") and not line.startswith("+++"):
+                    added += 1
+                elif line.startswith("-") and not line.startswith("---"):
+                    removed += 1
+            result[rel_path] = {"added": added, "removed": removed, "new": base is None}
+        return result
+
+    def commit(self) -> list:
+        """Writes all changed files atomically. Raises EditConflict on conflicts, nothing is written then."""
+        changed = [rel_path for rel_path, content in self.buffers.items() if content != self.base[rel_path]]
+        conflicts = [rel_path for rel_path in changed if self._stat(rel_path) != self.originals[rel_path]]
+        if conflicts:
+            raise EditConflict(conflicts)
+
+        staged = []
+        try:
+            for rel_path in changed:
+                full_path = os.path.join(self.repo_dir, rel_path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                tmp_path = f"{full_path}.{os.getpid()}.swarm-tmp"
+                with open(tmp_path, "w", newline="") as file:
+                    file.write(self.buffers[rel_path])
+                staged.append((tmp_path, full_path))
+        except Exception:
+            for tmp_path, _ in staged:
+                os.remove(tmp_path)
+            raise
+        for tmp_path, full_path in staged:
+            os.replace(tmp_path, full_path)
+        for rel_path in changed:
+            after_write(self.repo_dir, rel_path)
+        return changed
+
+
+def _key(repo_dir: str) -> str:
+    return os.path.realpath(repo_dir)
+
+
+def _read_disk(repo_dir: str, rel_path: str) -> str:
+    with open(os.path.join(repo_dir, rel_path), "r", newline="") as file:
+        return file.read()
+
+
+def active(repo_dir: str):
+    """Returns the open session of a checkout, or None."""
+    return _sessions.get(_key(repo_dir))
+
+
+def begin(repo_dir: str) -> EditSession:
+    with _lock:
+        return _sessions.setdefault(_key(repo_dir), EditSession(repo_dir))
+
+
+def commit(repo_dir: str) -> list:
+    """Commits and closes the open session of a checkout. Returns the written files."""
+    session = active(repo_dir)
+    if session is None:
+        return []
+    written = session.commit()
+    with _lock:
+        _sessions.pop(_key(repo_dir), None)
+    return written
+
+
+def rollback(repo_dir: str) -> list:
+    """Discards the open session of a checkout. Returns the files whose edits were dropped."""
+    with _lock:
+        session = _sessions.pop(_key(repo_dir), None)
+    return sorted(session.changes()) if session else []
+
+
+def on_write(hook):
+    """Registers hook(repo_dir, rel_path), called by after_write. Used by indexes of modules imported later."""
+    if hook not in _write_hooks:
+        _write_hooks.append(hook)
+
+
+def after_write(repo_dir: str, rel_path: str):
+    """Updates the caches after a file of a checkout changed on disk."""
+    ast_cache.invalidate(os.path.join(repo_dir, rel_path))
+    repo_index.note_write(repo_dir, rel_path)
+    for hook in _write_hooks:
+        hook(repo_dir, rel_path)
+
+
+def _normalize(rel_path: str) -> str:
+    return os.path.normpath(rel_path).replace(os.sep, "/")
+
+
+def read(repo_dir: str, rel_path: str) -> str:
+    """Content of a file as seen by the toolkit, including pending edits. Raises FileNotFoundError."""
+    rel_path = _normalize(rel_path)
+    session = active(repo_dir)
+    if session is not None:
+        return session.read(rel_path)
+    return _read_disk(repo_dir, rel_path)
+
+
+def write(repo_dir: str, rel_path: str, content: str):
+    """Writes a file, into the open session if there is one."""
+    rel_path = _normalize(rel_path)
+    session = active(repo_dir)
+    if session is not None:
+        session.write(rel_path, content)
+        return
+    with open(os.path.join(repo_dir, rel_path), "w", newline="") as file:
+        file.write(content)
+    after_write(repo_dir, rel_path)
+
+
+def tree(repo_dir: str, rel_path: str, take: bool = False) -> ast.Module:
+    """
+    Parsed module of a Python file, including pending edits.
+
+    Args:
+        take (bool): The caller wants to modify the tree. Otherwise the tree is shared and read-only.
+    """
+    rel_path = _normalize(rel_path)
+    session = active(repo_dir)
+    if session is not None and rel_path in session.buffers:
+        return session.tree(rel_path, take)
+    full_path = os.path.join(repo_dir, rel_path)
+    return ast_cache.take_tree(full_path) if take else ast_cache.get_tree(full_path)
+
+
+def begin_edit_session(repository_name: str) -> str:
+    """
+    Starts buffering all file edits of a repository in memory. Reads see the pending edits.
+    Finish with commit_edit_session (writes all files at once) or rollback_edit_session (discards the edits).
+
+    Args:
+        repository_name (str): The name of the repository.
+
+    Returns:
+        str: Success message.
+    """
+    session = begin(repo_path(repository_name))
+    pending = len(session.changes())
+    return f"Edit session for {repository_name} open" + (f" with {pending} pending files." if pending else ".")
+
+
+def commit_edit_session(repository_name: str) -> str:
+    """
+    Writes all edits of the open edit session of a repository to disk in one atomic step.
+
+    Args:
+        repository_name (str): The name of the repository.
+
+    Returns:
+        str: The written files or an error message.
+    """
+    repo_dir = repo_path(repository_name)
+    if active(repo_dir) is None:
+        return f"Error: No open edit session for {repository_name}."
+    try:
+        written = commit(repo_dir)
+    except Exception as e:
+        return f"Error: Commit failed, nothing was written and the session is still open: {e}"
+    return f"COMMIT successful! Written files: {', '.join(written) or 'none'}"
+
+
+def rollback_edit_session(repository_name: str) -> str:
+    """
+    Discards all edits of the open edit session of a repository.
+
+    Args:
+        repository_name (str): The name of the repository.
+
+    Returns:
+        str: The files whose edits were discarded.
+    """
+    dropped = rollback(repo_path(repository_name))
+    return f"ROLLBACK successful! Discarded edits of: {', '.join(dropped) or 'none'}"
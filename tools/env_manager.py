@@ -0,0 +1,283 @@
+"""
+Cached test environments, one virtualenv per (repository, version).
+
+Environments are built from the SWE-Bench metadata of an instance: the
+requirement files of the repository at its environment_setup_commit (or
+base_commit) and the project itself are installed into a fresh venv below
+.swarm_cache/envs. With SWARM_WHEELHOUSE set, pip installs only from that
+directory (--no-index), so builds work fully offline; otherwise the package
+index is used. Downloads and built wheels are shared through one pip cache.
+Requirements that cannot be installed are skipped and recorded in the
+environment's metadata instead of failing the build. An environment whose
+project itself did not install is built again on its next use in a
+process, if that can help: the package index is used, or the wheelhouse
+changed since.
+
+All environments are created from one interpreter, SWARM_ENV_PYTHON (by
+default the one running the swarm). Repository versions that need another
+Python version are not handled; their builds or tests fail, so run them
+with SWARM_ENV_PYTHON pointing to a suitable interpreter.
+
+After a build, files of the environment's site-packages that are identical
+to files of other environments are replaced by hardlinks into a shared
+content store, so many versions of a repository cost little extra disk.
+
+Checkouts are bound to an environment (bind) when an instance starts; the
+environment itself is only built on the first test run (python_for) and
+then reused by every instance of the same repository version. Tests run
+with the checkout on PYTHONPATH, so its sources win over the installed
+copy of the project.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from tools.git_cache import add_worktree, ensure_mirror, file_lock, remove_worktree
+from tools.workspace import cache_dir, checkout_key
+
+WHEELHOUSE = os.getenv("SWARM_WHEELHOUSE")
+# Interpreter the environments are created from.
+BASE_PYTHON = os.getenv("SWARM_ENV_PYTHON", sys.executable)
+METADATA_FILE = ".swarm-env.json"
+# Requirement files looked for in a checkout, relative to its root.
+REQUIREMENT_FILES = (
+    "requirements.txt", "requirements-dev.txt", "requirements_dev.txt", "requirements-test.txt",
+    "requirements_test.txt", "test-requirements.txt", "requirements/test.txt", "requirements/tests.txt",
+    "requirements/testing.txt", "tests/requirements/py3.txt",
+)
+# Always installed, the executor runs the tests with pytest.
+BASE_PACKAGES = ["pytest"]
+# How long to wait for another process building the same environment.
+BUILD_WAIT_SECONDS = float(os.getenv("SWARM_ENV_BUILD_WAIT", 6 * 3600))
+# Files below this size are not worth a hardlink.
+MIN_DEDUPE_BYTES = 1024
+
+_locks = {}
+# Environments this process already rebuilt after their project failed to install.
+_retried = set()
+_lock = threading.Lock()
+
+
+def env_key(row: dict) -> str:
+    """Name of the environment of a SWE-Bench row: owner__repo-version (or the setup commit without a version)."""
+    version = row.get("version") or (row.get("environment_setup_commit") or row["base_commit"])[:12]
+    return re.sub(r"[^\w.-]", "_", f"{row['repo'].replace('/', '__')}-{version}")
+
+
+def env_path(key: str) -> str:
+    return os.path.join(cache_dir("envs"), key)
+
+
+def env_python(path: str) -> str:
+    if os.name == "nt":
+        return os.path.join(path, "Scripts", "python.exe")
+    return os.path.join(path, "bin", "python")
+
+
+def load_metadata(path: str):
+    try:
+        with open(os.path.join(path, METADATA_FILE), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _wheelhouse_mtime():
+    try:
+        return os.path.getmtime(WHEELHOUSE) if WHEELHOUSE else None
+    except OSError:
+        return None
+
+
+def _worth_rebuilding(metadata: dict) -> bool:
+    """Whether a finished environment whose project did not install may install it now."""
+    if metadata.get("project_installed", True):
+        return False
+    # Offline builds only change with the wheelhouse; the package index may have what was missing.
+    return not WHEELHOUSE or metadata.get("wheelhouse_mtime") != _wheelhouse_mtime()
+
+
+def _pip(python: str, *args) -> subprocess.CompletedProcess:
+    command = [python, "-m", "pip", "install", "--disable-pip-version-check", "--no-input"]
+    if WHEELHOUSE:
+        command += ["--no-index", "--find-links", WHEELHOUSE]
+    env = dict(os.environ, PIP_CACHE_DIR=cache_dir("pip"))
+    return subprocess.run(command + list(args), capture_output=True, text=True, env=env)
+
+
+def _requirement_lines(path: str) -> list:
+    lines = []
+    with open(path, "r", errors="replace") as file:
+        for line in file:
+            line = line.split(" #", 1)[0].strip()
+            # Nested files and pip options are left to the combined install of the file.
+            if line and not line.startswith(("#", "-")):
+                lines.append(line)
+    return lines
+
+
+def _install_requirements(python: str, checkout: str) -> dict:
+    """Installs the requirement files of a checkout, one requirement at a time if a file fails as a whole."""
+    installed, skipped = [], []
+    for name in REQUIREMENT_FILES:
+        path = os.path.join(checkout, name)
+        if not os.path.isfile(path):
+            continue
+        if _pip(python, "-r", path).returncode == 0:
+            installed.append(name)
+            continue
+        for requirement in _requirement_lines(path):
+            if _pip(python, requirement).returncode == 0:
+                installed.append(requirement)
+            else:
+                skipped.append(requirement)
+    return {"installed": installed, "skipped": skipped}
+
+
+def dedupe(root: str) -> int:
+    """
+    Replaces files below `root` by hardlinks to identical files in the shared content store.
+
+    Returns:
+        int: Number of bytes shared with other environments.
+    """
+    store = cache_dir("envs", ".store")
+    shared = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.lstat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path) or os.path.islink(path) or stat.st_size < MIN_DEDUPE_BYTES:
+                continue
+            digest = hashlib.sha256()
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(chunk)
+            stored = os.path.join(store, f"{digest.hexdigest()}-{stat.st_mode & 0o777:o}")
+            try:
+                if not os.path.exists(stored):
+                    os.link(path, stored)
+                    continue
+                if os.path.samefile(path, stored):
+                    continue
+                tmp_path = f"{path}.{os.getpid()}.swarm-tmp"
+                os.link(stored, tmp_path)
+                os.replace(tmp_path, path)
+                shared += stat.st_size
+            except OSError:
+                # E.g. the cache is on another file system; the file simply stays a copy.
+                continue
+    return shared
+
+
+def _site_packages(path: str) -> list:
+    python = env_python(path)
+    result = subprocess.run([python, "-c", "import json, site; print(json.dumps(site.getsitepackages()))"],
+                            capture_output=True, text=True, check=True)
+    return [directory for directory in json.loads(result.stdout) if os.path.isdir(directory)]
+
+
+def build_env(row: dict, path: str) -> dict:
+    """
+    Creates the environment of a row at `path`. The metadata file is written last and marks it as complete.
+
+    Returns:
+        dict: Metadata of the environment, including skipped requirements and whether the project installed.
+    """
+    started = time.time()
+    owner, repository = row["repo"].split("/")
+    setup_commit = row.get("environment_setup_commit") or row["base_commit"]
+    # Built in place: venvs record absolute paths and cannot be moved afterwards.
+    shutil.rmtree(path, ignore_errors=True)
+    subprocess.run([BASE_PYTHON, "-m", "venv", path], check=True, capture_output=True)
+    python = env_python(path)
+
+    metadata = {"key": os.path.basename(path), "repo": row["repo"], "version": row.get("version"),
+                "setup_commit": setup_commit, "base_python": BASE_PYTHON, "offline": bool(WHEELHOUSE),
+                "wheelhouse_mtime": _wheelhouse_mtime()}
+    base = _pip(python, *BASE_PACKAGES)
+    if base.returncode != 0:
+        shutil.rmtree(path, ignore_errors=True)
+        raise RuntimeError(f"Could not install {', '.join(BASE_PACKAGES)} into {path}: {base.stderr[-2000:]}")
+
+    checkout = os.path.join(cache_dir("envs", ".checkouts"), f"{os.path.basename(path)}-{os.getpid()}")
+    try:
+        add_worktree(ensure_mirror(owner, repository, setup_commit), checkout, setup_commit)
+        metadata["requirements"] = _install_requirements(python, checkout)
+        # The project itself pulls in its declared dependencies (and builds its extensions, if any).
+        project = _pip(python, checkout)
+        if project.returncode != 0:
+            # Offline, isolated builds often miss their build requirements; the venv's own setuptools may do.
+            project = _pip(python, "--no-build-isolation", checkout)
+        metadata["project_installed"] = project.returncode == 0
+        if project.returncode != 0:
+            metadata["project_error"] = project.stderr[-2000:]
+    finally:
+        remove_worktree(checkout)
+
+    metadata["shared_bytes"] = sum(dedupe(directory) for directory in _site_packages(path))
+    metadata["build_seconds"] = round(time.time() - started, 1)
+    tmp_path = os.path.join(path, f"{METADATA_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(metadata, file, indent=2)
+    os.replace(tmp_path, os.path.join(path, METADATA_FILE))
+    return metadata
+
+
+def ensure_env(row: dict) -> str:
+    """Returns the interpreter of the environment of a row, building the environment on first use."""
+    path = env_path(env_key(row))
+    with _lock:
+        lock = _locks.setdefault(path, threading.Lock())
+    # Threads of this process wait on the lock, other processes (e.g. evaluation workers) on the lock file,
+    # which the builder keeps fresh however long the build takes.
+    with lock, file_lock(path, timeout=BUILD_WAIT_SECONDS):
+        metadata = load_metadata(path)
+        # Without metadata an environment was never finished and is built again.
+        if metadata is None:
+            build_env(row, path)
+        elif path not in _retried and _worth_rebuilding(metadata):
+            _retried.add(path)
+            build_env(row, path)
+    return env_python(path)
+
+
+def _binding_path(repo_dir: str) -> str:
+    name = checkout_key(repo_dir)
+    return os.path.join(cache_dir("envs", ".bindings"), f"{name}.json")
+
+
+def bind(repo_dir: str, row: dict):
+    """Binds a checkout to the environment of a SWE-Bench row. Nothing is built until the first test run."""
+    fields = ("repo", "instance_id", "base_commit", "version", "environment_setup_commit")
+    binding = {field: row.get(field) for field in fields}
+    tmp_path = f"{_binding_path(repo_dir)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(binding, file)
+    os.replace(tmp_path, _binding_path(repo_dir))
+
+
+def binding(repo_dir: str):
+    """The row fields a checkout is bound to, or None."""
+    try:
+        with open(_binding_path(repo_dir), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def python_for(repo_dir: str):
+    """Interpreter of the environment a checkout is bound to (built if needed), or None for unbound checkouts."""
+    row = binding(repo_dir)
+    if row is None:
+        return None
+    return ensure_env(row)
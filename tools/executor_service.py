@@ -0,0 +1,234 @@
+"""
+Pool of pre-warmed pytest workers.
+
+For every repository environment (checkout + interpreter) up to
+SWARM_EXECUTOR_WORKERS zygote processes (tools/pytest_zygote.py) are kept
+alive. Each one has pytest and the project's heavy dependencies imported
+and forks a fresh child per test run, with a hard wall-clock limit, an
+address-space limit and its own process group so that runs can be
+cancelled. Results come back as structured dicts instead of raw output.
+"""
+import atexit
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import uuid
+
+from tools.test_digest import digest
+from tools.workspace import cache_dir
+
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pytest_zygote.py")
+WORKERS_PER_ENV = int(os.getenv("SWARM_EXECUTOR_WORKERS", 2))
+DEFAULT_TIMEOUT = float(os.getenv("SWARM_TEST_TIMEOUT", 900))
+DEFAULT_MEMORY_MB = int(os.getenv("SWARM_TEST_MEMORY_MB", 8192))
+MAX_TRACEBACK_CHARS = 3000
+
+# Heavy third party packages worth importing once per environment, by repository name.
+PRELOAD = {
+    "astropy": ["numpy"],
+    "matplotlib": ["numpy", "PIL"],
+    "scikit-learn": ["numpy", "scipy"],
+    "seaborn": ["numpy", "pandas", "matplotlib"],
+    "sympy": ["mpmath"],
+    "xarray": ["numpy", "pandas"],
+    "pylint": ["astroid"],
+    "sphinx": ["docutils", "jinja2", "pygments"],
+    "django": ["asgiref", "sqlparse"],
+}
+
+
+def preload_modules(repo_dir: str) -> list:
+    """Modules to preload for a checkout. Modules that live inside the checkout are never preloaded."""
+    names = PRELOAD.get(os.path.basename(os.path.normpath(repo_dir)), [])
+    names = names + [name for name in os.getenv("SWARM_PRELOAD", "").split(",") if name]
+    return [name for name in names
+            if not os.path.exists(os.path.join(repo_dir, name)) and not os.path.exists(os.path.join(repo_dir, f"{name}.py"))]
+
+
+class Zygote:
+    """One pre-warmed worker process speaking the JSON lines protocol of pytest_zygote.py."""
+
+    def __init__(self, root: str, python: str, preload: list):
+        log_path = os.path.join(cache_dir("executor"), f"zygote-{uuid.uuid4().hex[:8]}.log")
+        self.log = open(log_path, "w")
+        self.process = subprocess.Popen(
+            [python, ZYGOTE_SCRIPT, "--root", root, "--preload", ",".join(preload)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log, text=True, bufsize=1,
+        )
+        self.ready = self._read()
+
+    def _read(self) -> dict:
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"pytest worker exited with code {self.process.wait()}, see {self.log.name}")
+        return json.loads(line)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, job: dict, on_started) -> dict:
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+        while True:
+            event = self._read()
+            if event.get("id") != job["id"]:
+                continue
+            if event["event"] == "started":
+                on_started(event["pid"])
+            elif event["event"] == "finished":
+                return event["result"]
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.log.close()
+
+
+def summarize(raw: dict, output: str, repo_dir: str, handle: str) -> dict:
+    """Turns a raw zygote result into the compact result returned to callers (see tools/test_digest.py)."""
+    counts = raw.get("counts", {})
+    status = raw.get("status")
+    if status is None:
+        exit_code = raw.get("exit_code")
+        if exit_code == 0:
+            status = "passed"
+        elif exit_code == 5:
+            status = "no tests collected"
+        elif counts.get("failed") or counts.get("errors"):
+            status = "failed"
+        else:
+            status = "error"
+
+    parts = [f"{counts[name]} {name}" for name in ("failed", "errors", "passed", "skipped", "xfailed", "xpassed")
+             if counts.get(name)]
+    duration = raw.get("duration")
+    summary = ", ".join(parts) or status
+    if duration is not None:
+        summary += f" in {duration}s"
+
+    result = {"status": status, "summary": summary, "counts": {name: n for name, n in counts.items() if n}, "output_log": output}
+    if raw.get("error"):
+        result["error"] = raw["error"][-MAX_TRACEBACK_CHARS:]
+    if raw.get("failures"):
+        result["failures"] = digest(raw, repo_dir, handle)
+    return result
+
+
+class ExecutorService:
+    """Runs pytest jobs on pools of pre-warmed workers, one pool per (checkout, interpreter)."""
+
+    def __init__(self, workers_per_env: int = WORKERS_PER_ENV):
+        self.workers_per_env = workers_per_env
+        self._idle = {}
+        self._counts = {}
+        self._running = {}
+        self._cancelled = set()
+        self._cond = threading.Condition()
+
+    def _acquire(self, key: tuple) -> Zygote:
+        with self._cond:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                while idle:
+                    zygote = idle.pop()
+                    if zygote.alive():
+                        return zygote
+                    self._counts[key] -= 1
+                if self._counts.get(key, 0) < self.workers_per_env:
+                    self._counts[key] = self._counts.get(key, 0) + 1
+                    break
+                self._cond.wait()
+        root, python = key
+        try:
+            return Zygote(root, python, preload_modules(root))
+        except Exception:
+            with self._cond:
+                self._counts[key] -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, key: tuple, zygote: Zygote):
+        with self._cond:
+            if zygote.alive():
+                self._idle[key].append(zygote)
+            else:
+                self._counts[key] -= 1
+            self._cond.notify()
+
+    def run(self, repo_dir: str, args: list, timeout: float = DEFAULT_TIMEOUT, memory_mb: int = DEFAULT_MEMORY_MB,
+            python: str = None, job_id: str = None) -> dict:
+        """
+        Runs pytest with `args` inside `repo_dir` and returns a structured result.
+
+        Args:
+            repo_dir (str): Checkout to run the tests in.
+            args (list): pytest arguments, e.g. test files or test ids relative to repo_dir.
+            timeout (float): Wall-clock limit in seconds.
+            memory_mb (int): Address-space limit of the test process in MB (0 for none).
+            python (str): Interpreter of the environment. Defaults to the current interpreter.
+            job_id (str): Id that can be passed to cancel().
+
+        Returns:
+            dict: status, summary, counts, a digest of the failures and the path of the full output.
+        """
+        key = (os.path.abspath(repo_dir), python or sys.executable)
+        job_id = job_id or uuid.uuid4().hex
+        output = os.path.abspath(os.path.join(cache_dir("executor"), f"{job_id}.log"))
+        job = {"id": job_id, "args": list(args), "timeout": timeout, "memory_mb": memory_mb, "output": output}
+
+        zygote = self._acquire(key)
+        try:
+            raw = zygote.run(job, lambda pid: self._running.__setitem__(job_id, pid))
+        except Exception as e:
+            raw = {"status": "error", "error": repr(e)}
+        finally:
+            self._running.pop(job_id, None)
+            self._release(key, zygote)
+
+        if job_id in self._cancelled:
+            self._cancelled.discard(job_id)
+            raw = dict(raw, status="cancelled")
+        return summarize(raw, output, repo_dir, job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Kills the test process of a running job. Returns False if the job is not running."""
+        pid = self._running.get(job_id)
+        if pid is None:
+            return False
+        self._cancelled.add(job_id)
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            return False
+        return True
+
+    def shutdown(self):
+        with self._cond:
+            for zygotes in self._idle.values():
+                for zygote in zygotes:
+                    zygote.close()
+            self._idle.clear()
+            self._counts.clear()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> ExecutorService:
+    """Returns the process wide executor service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ExecutorService()
+            atexit.register(_service.shutdown)
+        return _service
@@ -1,30 +1,96 @@
-import subprocess
-from pathlib import Path
+import json
+
+from tools import edit_session, env_manager
+from tools.executor_service import get_service
+from tools.test_selector import select_tests
+from tools.workspace import repo_path
+
+# Status of a run that collected no tests (pytest exit code 5), see executor_service.summarize.
+NO_TESTS = "no tests collected"
+
+
+def _run_tests(work_dir: str, args: list) -> dict:
+    # Checkouts bound to a SWE-Bench instance run in the cached environment of its repository version.
+    try:
+        python = env_manager.python_for(work_dir)
+    except Exception as e:
+        result = get_service().run(work_dir, args)
+        return dict(result, environment_error=f"Test environment could not be built, ran with the default interpreter: {e}")
+    return get_service().run(work_dir, args, python=python)
+
+
+def _commit_edits(work_dir: str):
+    """Writes pending edits of the File agent so tests see them. Returns an error JSON if that failed, else None."""
+    try:
+        edit_session.commit(work_dir)
+    except edit_session.EditConflict as e:
+        return json.dumps({
+            "status": "error",
+            "error": f"{e}. Nothing was run. Roll back the edit session or re-read these files and edit them again.",
+            "conflicts": e.paths,
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "error": f"Pending edits could not be written, nothing was run: {e}"}, indent=2)
+    return None
 
 
 def run_code_execution(repo_name: str, test_file_name: str) -> str:
     """
     Executes the provided code in the given Repo. Can be used to run created pytest files.
-    
+
     Args:
         repo_name (str): the name of the repository
-        test_file_name (str): full name of the test file
+        test_file_name (str): full name of the test file (or a pytest test id like "tests/test_x.py::test_y")
 
     Returns:
-        str: The result of the execution
+        str: JSON with status, summary (e.g. "1 failed, 3 passed in 0.52s"), counts and grouped failures.
+             Use get_test_details with the details_handle for full reports.
     """
-    work_dir=f".\\coding\\{repo_name}\\"
-    # Create a code executor agent that uses a Docker container to execute code.
-    try:
-        return subprocess.run(
-                ["pytest", work_dir + test_file_name],
-                check=True,
-                capture_output=True
-            )
-    except subprocess.CalledProcessError as e:
-        return e
-    
-    # Run the agent with a given code snippet.
-
-    # Stop the code executor.
-    
\ No newline at end of file
+    work_dir = repo_path(repo_name)
+    # Tests have to see pending edits of the File agent.
+    error = _commit_edits(work_dir)
+    if error:
+        return error
+    # Tests run on a pre-warmed worker with time and memory limits.
+    result = _run_tests(work_dir, [test_file_name])
+    return json.dumps(result, indent=2)
+
+
+def run_impacted_tests(repo_name: str, base_commit: str = "HEAD", full_suite: bool = False) -> str:
+    """
+    Runs only the tests affected by the current changes of the repository first and broader test runs only when those pass.
+    Stages: single impacted tests -> complete impacted test modules -> (optionally) the whole test suite.
+
+    Args:
+        repo_name (str): the name of the repository
+        base_commit (str): commit to compare the changes against (default: "HEAD", the uncommitted changes)
+        full_suite (bool): also run the whole test suite when all impacted tests pass
+
+    Returns:
+        str: JSON with the selection and the result of every stage that was run
+    """
+    work_dir = repo_path(repo_name)
+    error = _commit_edits(work_dir)
+    if error:
+        return error
+    selection = select_tests(work_dir, base_commit)
+    stages = [("impacted tests", selection["test_ids"]), ("impacted modules", selection["test_modules"])]
+    if full_suite:
+        stages.append(("full suite", []))
+
+    results = []
+    previous = None
+    for name, args in stages:
+        if (not args and name != "full suite") or args == previous:
+            continue
+        result = _run_tests(work_dir, args)
+        results.append(dict(result, stage=name, args=args))
+        previous = args
+        # A stage that collected nothing (e.g. ids of renamed tests) says nothing, so the broader stage runs.
+        if result["status"] not in ("passed", NO_TESTS):
+            break
+
+    if not results:
+        return json.dumps({"selection": selection, "status": "no impacted tests found"}, indent=2)
+    status = next((result["status"] for result in reversed(results) if result["status"] != NO_TESTS), NO_TESTS)
+    return json.dumps({"selection": selection, "status": status, "stages": results}, indent=2)
@@ -0,0 +1,166 @@
+"""
+Ranged reads of repository files.
+
+Files on disk are memory-mapped and a per-file index of line start
+offsets (cached per mtime/size) turns line ranges into byte ranges, so
+reading a region of a large module does not decode the whole file.
+Files with pending edit-session edits are read from their buffer.
+"""
+import ast
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+from tools import edit_session
+from tools.source_splice import definitions
+
+# Rough number of characters per token, used for budgets.
+CHARS_PER_TOKEN = 4
+DEFAULT_READ_TOKENS = 4000
+MAX_CACHED_INDEXES = 64
+
+_line_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _line_starts(data) -> array:
+    starts = array("Q", [0])
+    position = data.find(b"\n")
+    while position != -1:
+        starts.append(position + 1)
+        position = data.find(b"\n", position + 1)
+    if starts[-1] != len(data):
+        starts.append(len(data))
+    return starts
+
+
+def _line_index(path: str, data) -> array:
+    """Byte offsets of the line starts of a file (plus the end offset), cached per file version."""
+    stat = os.stat(path)
+    key = os.path.realpath(path)
+    with _lock:
+        entry = _line_indexes.get(key)
+        if entry is not None and entry[0] == (stat.st_mtime_ns, stat.st_size):
+            _line_indexes.move_to_end(key)
+            return entry[1]
+    starts = _line_starts(data)
+    with _lock:
+        _line_indexes[key] = ((stat.st_mtime_ns, stat.st_size), starts)
+        while len(_line_indexes) > MAX_CACHED_INDEXES:
+            _line_indexes.popitem(last=False)
+    return starts
+
+
+class FileView:
+    """Read-only view of one file, either memory-mapped from disk or on a pending edit-session buffer."""
+
+    def __init__(self, repo_dir: str, rel_path: str):
+        self.path = os.path.join(repo_dir, rel_path)
+        self.rel_path = rel_path
+        self._file = None
+        self._map = None
+        session = edit_session.active(repo_dir)
+        if session is not None and os.path.normpath(rel_path).replace(os.sep, "/") in session.buffers:
+            self.data = edit_session.read(repo_dir, rel_path).encode("utf-8")
+            self.starts = _line_starts(self.data)
+            return
+        self._file = open(self.path, "rb")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self.data = b""
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.data = self._map
+        self.starts = _line_index(self.path, self.data)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts) - 1
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def lines(self, start_line: int, end_line: int) -> list:
+        """Lines start_line..end_line (1-based, inclusive) without line breaks."""
+        start_line = max(1, start_line)
+        end_line = min(self.line_count, end_line)
+        if start_line > end_line:
+            return []
+        chunk = self.data[self.starts[start_line - 1]:self.starts[end_line]]
+        return chunk.decode("utf-8", errors="replace").splitlines()
+
+    def text(self) -> str:
+        # Same newline handling as reading the file in text mode.
+        return self.data[:].decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+    def byte_range(self, offset: int, length: int) -> str:
+        return self.data[offset:offset + length].decode("utf-8", errors="replace")
+
+    def line_at_byte(self, offset: int) -> int:
+        """1-based line containing a byte offset."""
+        low, high = 0, self.line_count
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.starts[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low + 1
+
+
+def numbered(lines: list, first_line: int) -> str:
+    return "\n".join(f"{first_line + i}: {line}" for i, line in enumerate(lines))
+
+
+def lines_within_budget(view: FileView, start_line: int, end_line: int, max_chars: int) -> int:
+    """Last line from start_line on (at most end_line) whose numbered text still fits max_chars."""
+    used = 0
+    line = start_line
+    end_line = min(end_line, view.line_count)
+    while line <= end_line:
+        # Numbered lines cost the length of the line plus the "NNN: " prefix and the line break.
+        used += view.starts[line] - view.starts[line - 1] + len(str(line)) + 2
+        if used > max_chars and line > start_line:
+            return line - 1
+        line += 1
+    return end_line
+
+
+def outline(repo_dir: str, rel_path: str, max_chars: int) -> str:
+    """Classes and functions of a Python file with their line spans, cut to max_chars."""
+    if not rel_path.endswith(".py"):
+        return ""
+    try:
+        tree = edit_session.tree(repo_dir, rel_path)
+    except (SyntaxError, ValueError, OSError):
+        return ""
+    entries = []
+    for name, node in definitions(tree):
+        depth = name.count(".")
+        kind = "class" if isinstance(node, ast.ClassDef) else "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        entries.append(f"{'  ' * depth}{kind} {node.name}  L{node.lineno}-{node.end_lineno}")
+    text = ""
+    for index, entry in enumerate(entries):
+        if len(text) + len(entry) + 1 > max_chars:
+            text += f"... {len(entries) - index} more definitions\n"
+            break
+        text += entry + "\n"
+    return text
@@ -1,8 +1,10 @@
 import os
-import ast
 import re
 from typing import Annotated, List, Optional
 
+from tools import edit_session, file_reader, read_tracker, repo_index, source_splice
+from tools.workspace import repo_path
+
 def write_file(repository_name: str, file_path: str, content: str = "") -> str:
     """
     Create a new File with content or Overwrite an existing file with new content.
@@ -15,10 +17,11 @@ def write_file(repository_name: str, file_path: str, content: str = "") -> str:
     Returns:
         str: Result of the operation or the content of the file.
     """
-    file_path = f"./coding/{repository_name}/{file_path}"
+    repo_dir = repo_path(repository_name)
+    relative_path = file_path
+    file_path = f"{repo_dir}/{file_path}"
     try:
-        with open(file_path, "w") as file:
-            file.write(content)
+        edit_session.write(repo_dir, relative_path, content)
         return f"File {file_path} written successfully."
     except FileNotFoundError:
         return f"File {file_path} not found."
@@ -26,82 +29,145 @@ def write_file(repository_name: str, file_path: str, content: str = "") -> str:
         return f"An error occurred: {e}"
 
 
-def read_file(file_path: str, repo: str) -> str:
+def _parse_cursor(cursor: str):
+    """Cursors look like "L120-400" (lines 120 to 400) or "B4096-8192" (bytes 4096 to 8192)."""
+    cursor = cursor.strip().strip('"')
+    first, _, last = cursor[1:].partition("-")
+    return cursor[:1].upper(), int(first), int(last) if last else None
+
+
+def read_file(file_path: str, repo: str, start_line: int = None, end_line: int = None, byte_offset: int = None,
+              byte_length: int = None, max_tokens: int = file_reader.DEFAULT_READ_TOKENS, cursor: str = None,
+              full: bool = False, context_variables: dict = None) -> str:
     """
     Reads the content of a file and returns it as a string.
+    Files within the token budget are returned completely. Line and byte ranges, and files above the budget, are returned
+    with line numbers and cut to the budget; the answer then ends with a cursor to read the next page. Large Python
+    files start with an outline of all classes and functions with their line spans, so the needed lines can be read directly.
+    Reading the same region again in the same conversation returns only a marker if it is unchanged, or a diff against the
+    version returned before.
 
     Args:
         file_path (str): Path to the file to be read.
         repo (str): Name of repository.
+        start_line (int): First line to read (1-based).
+        end_line (int): Last line to read (inclusive).
+        byte_offset (int): Read a byte range starting at this offset instead of lines.
+        byte_length (int): Length of the byte range (default: as much as fits the budget).
+        max_tokens (int): Token budget of the answer (default: 4000).
+        cursor (str): Cursor of a previous answer, e.g. "L241-900", to continue reading.
+        full (bool): Return the full content even if it was read before (e.g. when the earlier read is no longer visible).
 
     Returns:
-        str: Content of the file or an error message.
+        str: Content of the file (or of the requested region), a marker or diff for repeated reads, or an error message.
     """
-    file_path = f"./coding/{repo}/{file_path}"
+    result = _read_region(file_path, repo, start_line, end_line, byte_offset, byte_length, max_tokens, cursor)
+    if result.startswith("Error:"):
+        return result
+    region = (start_line, end_line, byte_offset, byte_length, max_tokens, cursor)
+    delivered = read_tracker.deliver(read_tracker.session_of(context_variables),
+                                     os.path.realpath(f"{repo_path(repo)}/{file_path}"), region, result, file_path)
+    return result if full else delivered
+
+
+def _read_region(file_path: str, repo: str, start_line: int, end_line: int, byte_offset: int, byte_length: int,
+                 max_tokens: int, cursor: str) -> str:
+    relative_path = file_path
+    file_path = f"{repo_path(repo)}/{file_path}"
     try:
-        with open(file_path, "r") as file:
-            return file.read()
+        if cursor:
+            kind, first, last = _parse_cursor(cursor)
+            if kind == "B":
+                byte_offset, byte_length = first, (last - first if last is not None else None)
+            else:
+                start_line, end_line = first, last
+        max_chars = max(1, max_tokens) * file_reader.CHARS_PER_TOKEN
+
+        with file_reader.FileView(repo_path(repo), relative_path) as view:
+            if byte_offset is not None:
+                end = view.size if byte_length is None else min(view.size, byte_offset + byte_length)
+                stop = min(end, byte_offset + max_chars)
+                text = view.byte_range(byte_offset, stop - byte_offset)
+                header = (f"[{relative_path} bytes {byte_offset}-{stop} of {view.size}, "
+                          f"lines {view.line_at_byte(byte_offset)}-{view.line_at_byte(max(byte_offset, stop - 1))}]")
+                more = f'\n[... more: cursor="B{stop}-{end}"]' if stop < end else ""
+                return f"{header}\n{text}{more}"
+
+            whole_file = start_line is None and end_line is None
+            if whole_file and view.size <= max_chars:
+                return view.text()
+
+            outline = ""
+            if whole_file:
+                outline = file_reader.outline(repo_path(repo), relative_path, max_chars // 4)
+                if outline:
+                    outline = f"[outline of {relative_path}]\n{outline}\n"
+            first = max(1, start_line or 1)
+            last = min(view.line_count, end_line or view.line_count)
+            stop = file_reader.lines_within_budget(view, first, last, max_chars - len(outline))
+            header = f"[{relative_path} lines {first}-{stop} of {view.line_count}]"
+            more = f'\n[... more: cursor="L{stop + 1}-{last}"]' if stop < last else ""
+            return f"{outline}{header}\n{file_reader.numbered(view.lines(first, stop), first)}{more}"
     except FileNotFoundError:
         return f"Error: File '{file_path}' not found."
     except Exception as e:
         return f"Error: An error occurred while reading the file: {e}"
 
 
-def list_files_in_repository(repo: str) -> list:
+def list_files_in_repository(repo: str, pattern: str = None, max_depth: int = None, offset: int = 0,
+                             limit: int = 200, summary: bool = False) -> list:
     """
-    Lists all files in a given repository directory recursively.
+    Lists files in a given repository directory. Ignored files (.gitignore, .git, build outputs, ...) are skipped.
     
     Args:
         repo (str): Name of the repository.
+        pattern (str): Optional glob on the relative path, e.g. "django/db/*.py" or "*test_*.py".
+        max_depth (int): Optional maximum directory depth. 1 lists only files in the repository root.
+        offset (int): Index of the first file to return, used to page through results.
+        limit (int): Maximum number of files to return (default: 200).
+        summary (bool): Return directories with file counts instead of single files.
 
     Returns:
         list: A list of file paths relative to the repository root, or an error message.
     """
-    repo_path = f"./coding/{repo}"
+    repo_dir = repo_path(repo)
     try:
-        if not os.path.exists(repo_path):
-            return [f"Error: Repository path '{repo_path}' does not exist."]
-        
-        file_list = []
-        for root, _, files in os.walk(repo_path):
-            for file in files:
-                # Construct the relative file path
-                relative_path = os.path.relpath(os.path.join(root, file), repo_path)
-                file_list.append(relative_path)
-        
-        return file_list
+        if not os.path.exists(repo_dir):
+            return [f"Error: Repository path '{repo_dir}' does not exist."]
+
+        files = repo_index.get_files(repo_dir)
+        if summary:
+            return repo_index.summarize(repo_index.filter_files(files, pattern), max_depth or 1)
+
+        file_list = repo_index.filter_files(files, pattern, max_depth)
+        page = file_list[offset:offset + limit]
+        remaining = len(file_list) - offset - len(page)
+        if remaining > 0:
+            page.append(f"... {remaining} more files. Call again with offset={offset + limit} or narrow the pattern.")
+        return page
     except Exception as e:
         return [f"Error: An error occurred while listing files: {e}"]
     
 def modify_function(
                    repository_name: Annotated[str, "The name of the repository"], 
                    file_path: Annotated[str, "Path to the file."], 
-                   function_name: Annotated[str, "Name of the Python Function to Edit."],
-                   content: Annotated[str, "content to write to the function"]
-                ) -> Annotated[str, "Success/Error Message"]:
+                   function_name: Annotated[str, "Name of the Python Function to Edit. Use Class.method for methods."],
+                   content: Annotated[str, "New body of the function, or the complete new function starting with def/async def (and decorators)"]
+                ) -> Annotated[str, "Success/Error Message with the diff of the edit"]:
     
-    """This Function is able to modify a specific Python Method within a python file."""
+    """This Function is able to modify a specific Python Method within a python file. Only the function's lines are changed."""
     
-    file_path = f"./coding/{repository_name}/{file_path}"
+    repo_dir = repo_path(repository_name)
+    relative_path = file_path
+    file_path = f"{repo_dir}/{file_path}"
     try:
-        with open(file_path, "r") as file:
-            tree = ast.parse(file.read())
-            
-        class FunctionModifier(ast.NodeTransformer):
-            def visit_FunctionDef(self, node):
-                if node.name == function_name:
-                    node.body = [ast.parse(content).body[0]]
-                return node
-            
-        modified_tree = FunctionModifier().visit(tree)
-        modified_code = ast.unparse(modified_tree)
-
-        with open(file_path, "w") as file:
-            file.write(modified_code)
+        source = edit_session.read(repo_dir, relative_path)
+        modified_code = source_splice.replace_definition(source, function_name, content)
+        edit_session.write(repo_dir, relative_path, modified_code)
     except Exception as e:
         return str(e)
     
-    return f"MODIFY FUNCTION {function_name} in {file_path} successful!"
+    return f"MODIFY FUNCTION {function_name} in {file_path} successful!\n" + source_splice.unified_diff(source, modified_code, relative_path)
             
                 
 def find_and_replace(
@@ -113,79 +179,68 @@ def find_and_replace(
     
     """Allows to use search and replace writing operations via Regex expressions."""
     
-    file_path = f"./coding/{repository_name}/{file_path}"
+    repo_dir = repo_path(repository_name)
+    relative_path = file_path
+    file_path = f"{repo_dir}/{file_path}"
     
-    with open(file_path, "r") as file:
-        content = file.read()
+    content = edit_session.read(repo_dir, relative_path)
     
     modified_content = re.sub(pattern, replacement, content)
-    with open(file_path, "w") as file:
-        file.write(modified_content)
+    edit_session.write(repo_dir, relative_path, modified_content)
         
     return f"FIND AND REPLACE in {file_path} successful!"
     
 def list_functions(repository_name: Annotated[str, "Name of the Repository."], filename: Annotated[str, "Path to the Python file"]) -> List[str]:
-    """Returns a list of all function names in a Python file."""
-    filename = f"./coding/{repository_name}/{filename}"
-
-    with open(filename, "r") as file:
-        tree = ast.parse(file.read())
-    return [node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
+    """Returns a list of all function names in a Python file, including async functions. Methods are listed as Class.method."""
+    tree = edit_session.tree(repo_path(repository_name), filename)
+    return [name for name, node in source_splice.definitions(tree) if isinstance(node, source_splice.FUNCTIONS)]
 
 def extract_function(repository_name: Annotated[str, "Name of the Repository."], 
                         filename: Annotated[str, "Path to the Python file"], 
-                        function_name: Annotated[str, "Function name to extract"]) -> Optional[str]:
-    """Extracts the entire source code of a given function."""
+                        function_name: Annotated[str, "Function name to extract. Use Class.method for methods."]) -> Optional[str]:
+    """Extracts the entire source code of a given function (or async function), including decorators and comments."""
     
-    filename = f"./coding/{repository_name}/{filename}"
-    with open(filename, "r") as file:
-        tree = ast.parse(file.read())
-
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef) and node.name == function_name:
-            return ast.unparse(node)  # Returns function source code
-    return None
+    repo_dir = repo_path(repository_name)
+    source = edit_session.read(repo_dir, filename)
+    try:
+        _, node = source_splice.find_definition(edit_session.tree(repo_dir, filename), function_name)
+    except ValueError as e:
+        return str(e)
+    if node is None:
+        return None
+    lines = source.splitlines(keepends=True)
+    return "".join(lines[source_splice.first_line(node) - 1:node.end_lineno])
     
+def _splice(repository_name: str, filename: str, edit, *args) -> str:
+    """Applies a source_splice edit to a file and returns the diff."""
+    repo_dir = repo_path(repository_name)
+    source = edit_session.read(repo_dir, filename)
+    modified_code = edit(source, *args)
+    edit_session.write(repo_dir, filename, modified_code)
+    return source_splice.unified_diff(source, modified_code, filename)
+
+
 def modify_function_args(repository_name: Annotated[str, "Name of the Repository."], 
                         filename: Annotated[str, "Path to the Python file"], 
-                            function_name: Annotated[str, "Function to modify"], 
-                            new_args: Annotated[List[str], "List of new argument names"]):
+                            function_name: Annotated[str, "Function to modify. Use Class.method for methods."], 
+                            new_args: Annotated[List[str], "List of new parameters, e.g. [\"self\", \"value: int = 0\"]"]):
     """Replaces the arguments of a given function."""
-    
-    filename = f"./coding/{repository_name}/{filename}"
-
-    with open(filename, "r") as file:
-        tree = ast.parse(file.read())
-    
-    class ArgModifier(ast.NodeTransformer):
-        def visit_FunctionDef(self, node):
-            if node.name == function_name:
-                node.args.args = [ast.arg(arg=name) for name in new_args]
-            return node
-    
-    modified_tree = ArgModifier().visit(tree)
-    with open(filename, "w") as file:
-        file.write(ast.unparse(modified_tree))
+    try:
+        diff = _splice(repository_name, filename, source_splice.replace_parameters, function_name, new_args)
+    except Exception as e:
+        return str(e)
+    return f"MODIFY ARGS of {function_name} successful!\n{diff}"
 
 def modify_return_type(repository_name: Annotated[str, "Name of the Repository."], 
                         filename: Annotated[str, "Path to the Python file"], 
-                        function_name: Annotated[str, "Function to modify"], 
+                        function_name: Annotated[str, "Function to modify. Use Class.method for methods."], 
                         new_return_type: Annotated[str, "New return type annotation"]):
     """Changes the return type annotation of a function."""
-    filename = f"./coding/{repository_name}/{filename}"
-
-    with open(filename, "r") as file:
-        tree = ast.parse(file.read())
-    
-    class ReturnTypeModifier(ast.NodeTransformer):
-        def visit_FunctionDef(self, node):
-            if node.name == function_name:
-                node.returns = ast.Name(id=new_return_type)
-            return node
-    
-    modified_tree = ReturnTypeModifier().visit(tree)
-    with open(filename, "w") as file:
-        file.write(ast.unparse(modified_tree))
+    try:
+        diff = _splice(repository_name, filename, source_splice.replace_return_annotation, function_name, new_return_type)
+    except Exception as e:
+        return str(e)
+    return f"MODIFY RETURN TYPE of {function_name} successful!\n{diff}"
 
 
 def convert_function_to_method(repository_name: Annotated[str, "Name of the Repository."], 
@@ -193,39 +248,19 @@ def convert_function_to_method(repository_name: Annotated[str, "Name of the Repo
                                 function_name: Annotated[str, "Function to convert"], 
                                 class_name: Annotated[str, "Class name to place function in"]):
     """Converts a standalone function into a method inside a given class."""
-    filename = f"./coding/{repository_name}/{filename}"
-
-    with open(filename, "r") as file:
-        tree = ast.parse(file.read())
-    
-    class FunctionToMethodTransformer(ast.NodeTransformer):
-        def visit_ClassDef(self, node):
-            if node.name == class_name:
-                for func_node in ast.walk(tree):
-                    if isinstance(func_node, ast.FunctionDef) and func_node.name == function_name:
-                        func_node.args.args.insert(0, ast.arg(arg="self"))  # Add self argument
-                        node.body.append(func_node)
-                        return node
-            return node
-
-    modified_tree = FunctionToMethodTransformer().visit(tree)
-    with open(filename, "w") as file:
-        file.write(ast.unparse(modified_tree))
+    try:
+        diff = _splice(repository_name, filename, source_splice.move_function_into_class, function_name, class_name)
+    except Exception as e:
+        return str(e)
+    return f"CONVERT {function_name} to method of {class_name} successful!\n{diff}"
 
 
 def remove_function(repository_name: Annotated[str, "Name of the Repository."], 
                         filename: Annotated[str, "Path to the Python file"], 
-                    function_name: Annotated[str, "Function to remove"]):
+                    function_name: Annotated[str, "Function to remove. Use Class.method for methods."]):
     """Deletes a function from the Python file."""
-    filename = f"./coding/{repository_name}/{filename}"
-    with open(filename, "r") as file:
-        tree = ast.parse(file.read())
-
-    class FunctionRemover(ast.NodeTransformer):
-        def visit_Module(self, node):
-            node.body = [stmt for stmt in node.body if not (isinstance(stmt, ast.FunctionDef) and stmt.name == function_name)]
-            return node
-
-    modified_tree = FunctionRemover().visit(tree)
-    with open(filename, "w") as file:
-        file.write(ast.unparse(modified_tree))
\ No newline at end of file
+    try:
+        diff = _splice(repository_name, filename, source_splice.remove_definition, function_name)
+    except Exception as e:
+        return str(e)
+    return f"REMOVE FUNCTION {function_name} successful!\n{diff}"
@@ -0,0 +1,211 @@
+"""
+Shared bare mirrors of upstream repositories with cheap per-instance worktrees.
+
+Every upstream repository is cloned once as a bare mirror and only fetched
+again when a requested commit is missing. Checkouts are `git worktree`s of
+that mirror, so instances of the same repository at different commits get
+their own working trees in seconds and never mutate each other's files.
+"""
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+MIRROR_DIR = os.getenv("SWARM_MIRROR_DIR", os.path.join("coding", ".mirrors"))
+# A lock file not refreshed for this long is considered left over by a crashed process.
+STALE_LOCK_SECONDS = 3600
+# Holders refresh the mtime of their lock file at this interval, so long operations never look stale.
+LOCK_HEARTBEAT_SECONDS = 60
+# Pathspec leaving the Tester's temporary test files out of patches.
+EXCLUDE_AGENT_TESTS = ":(exclude,glob)**/temp_test_*"
+
+
+def _git(*args, cwd: str = None, check: bool = True) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, check=check, capture_output=True, text=True)
+
+
+@contextmanager
+def file_lock(path: str, timeout: float = STALE_LOCK_SECONDS):
+    """
+    Cross-process lock based on exclusive creation of a lock file.
+
+    Args:
+        path (str): Path of the locked resource; the lock file is `<path>.lock`.
+        timeout (float): Seconds to wait for the lock before raising TimeoutError.
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.2)
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(LOCK_HEARTBEAT_SECONDS):
+            try:
+                os.utime(lock_path)
+            except OSError:
+                pass
+
+    refresher = threading.Thread(target=heartbeat, name="swarm-lock-heartbeat", daemon=True)
+    refresher.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        refresher.join()
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def mirror_path(owner: str, repository: str) -> str:
+    return os.path.join(MIRROR_DIR, f"{owner}__{repository}.git")
+
+
+def find_mirror(repository: str):
+    """Returns the mirror of a repository given only its name, or None."""
+    matches = sorted(glob.glob(os.path.join(MIRROR_DIR, f"*__{repository}.git")))
+    return matches[0] if matches else None
+
+
+def has_commit(mirror: str, commit: str) -> bool:
+    return _git("--git-dir", mirror, "cat-file", "-e", f"{commit}^{{commit}}", check=False).returncode == 0
+
+
+def ensure_mirror(owner: str, repository: str, commit: str = None) -> str:
+    """
+    Creates the bare mirror of a repository or fetches it when `commit` is missing.
+
+    Args:
+        owner (str): GitHub owner.
+        repository (str): GitHub repository name.
+        commit (str): Commit that has to be present in the mirror.
+
+    Returns:
+        str: Path of the mirror.
+    """
+    mirror = mirror_path(owner, repository)
+    with file_lock(mirror):
+        if not os.path.exists(mirror):
+            tmp_path = f"{mirror}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            _git("clone", "--mirror", f"https://github.com/{owner}/{repository}.git", tmp_path)
+            os.replace(tmp_path, mirror)
+        elif commit and not has_commit(mirror, commit):
+            _git("--git-dir", mirror, "remote", "update", "--prune")
+    return mirror
+
+
+def update_mirror(mirror: str):
+    """Fetches new commits into an existing mirror."""
+    with file_lock(mirror):
+        _git("--git-dir", mirror, "remote", "update", "--prune")
+
+
+def add_worktree(mirror: str, path: str, commit: str = "HEAD") -> str:
+    """Creates a detached worktree of the mirror at `path`, or moves an existing one to `commit`."""
+    if os.path.exists(os.path.join(path, ".git")):
+        _git("-C", path, "checkout", "--detach", "--force", commit)
+        return path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Worktree metadata lives in the mirror, so adding worktrees must not race with fetches.
+    with file_lock(mirror):
+        _git("--git-dir", mirror, "worktree", "prune")
+        _git("--git-dir", mirror, "worktree", "add", "--detach", "--force", os.path.abspath(path), commit)
+    return path
+
+
+def remove_worktree(path: str):
+    """Removes a worktree and its metadata in the mirror."""
+    result = _git("-C", path, "rev-parse", "--git-common-dir", check=False)
+    if result.returncode == 0:
+        mirror = os.path.join(path, result.stdout.strip())
+        with file_lock(os.path.normpath(mirror)):
+            _git("--git-dir", mirror, "worktree", "remove", "--force", os.path.abspath(path), check=False)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def worktree_tree(path: str) -> str:
+    """
+    Writes all files of a worktree (tracked and untracked, not ignored) as a tree object and returns its id.
+    A temporary copy of the index is used, so the worktree's own index, HEAD and files are left untouched.
+    """
+    index = os.path.join(path, _git("-C", path, "rev-parse", "--git-path", "index").stdout.strip())
+    fd, tmp_index = tempfile.mkstemp(prefix="swarm-index-")
+    os.close(fd)
+    env = dict(os.environ, GIT_INDEX_FILE=tmp_index)
+    try:
+        # A copy of the real index keeps the stat data, so only changed files are hashed.
+        if os.path.exists(index):
+            shutil.copyfile(index, tmp_index)
+        else:
+            os.remove(tmp_index)
+        subprocess.run(["git", "-C", path, "add", "-A"], env=env, check=True, capture_output=True)
+        return subprocess.run(["git", "-C", path, "write-tree"], env=env, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    finally:
+        for leftover in (tmp_index, f"{tmp_index}.lock"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def diff_worktree(path: str, base: str = "HEAD", excludes: list = (EXCLUDE_AGENT_TESTS,)) -> str:
+    """Binary diff of all files of a worktree (tracked and untracked, not ignored) against `base`."""
+    return _git("-C", path, "diff", "--binary", base, worktree_tree(path), "--", ".", *excludes).stdout
+
+
+def _last_used(path: str) -> float:
+    times = [os.path.getmtime(path)]
+    result = _git("-C", path, "rev-parse", "--absolute-git-dir", check=False)
+    if result.returncode == 0:
+        for name in ("index", "HEAD"):
+            candidate = os.path.join(result.stdout.strip(), name)
+            if os.path.exists(candidate):
+                times.append(os.path.getmtime(candidate))
+    return max(times)
+
+
+def prune_worktrees(max_age_hours: float = 24) -> list:
+    """
+    Removes worktrees of all mirrors that have not been modified for `max_age_hours`.
+
+    Returns:
+        list: Paths of the removed worktrees.
+    """
+    cutoff = time.time() - max_age_hours * 3600
+    removed = []
+    for mirror in glob.glob(os.path.join(MIRROR_DIR, "*.git")):
+        listing = _git("--git-dir", mirror, "worktree", "list", "--porcelain", check=False).stdout
+        for line in listing.splitlines():
+            if not line.startswith("worktree "):
+                continue
+            path = line[len("worktree "):]
+            if os.path.abspath(path) == os.path.abspath(mirror):
+                continue
+            if not os.path.exists(path) or _last_used(path) < cutoff:
+                remove_worktree(path)
+                removed.append(path)
+        with file_lock(mirror):
+            _git("--git-dir", mirror, "worktree", "prune", check=False)
+    return removed
@@ -1,21 +1,21 @@
 import os
 import re
-import requests
 import base64
 import subprocess
 from pathlib import Path
 
+from tools import code_search
+from tools.git_cache import add_worktree, ensure_mirror, find_mirror, has_commit, update_mirror
+from tools.http_cache import GITHUB_API_URL, github_get
+from tools.import_graph import build_graph
+from tools.workspace import repo_path as workspace_repo_path
+
 def fetch_github_issue(owner: str, repository: str, issue_number: int) -> dict:
     """
     Fetches issue details from GitHub.
     """
-    token = os.getenv("GITHUB_TOKEN")
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    url = f"https://api.github.com/repos/{owner}/{repository}/issues/{issue_number}"
-    response = requests.get(url, headers=headers)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repository}/issues/{issue_number}"
+    response = github_get(url)
     response.raise_for_status()
     return response.json()
 
@@ -23,13 +23,8 @@ def list_repository_files(owner: str, repository: str, branch: str = "main") ->
     """
     Lists all files in a repository on the specified branch.
     """
-    token = os.getenv("GITHUB_TOKEN")
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    url = f"https://api.github.com/repos/{owner}/{repository}/git/trees/{branch}?recursive=1"
-    response = requests.get(url, headers=headers)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repository}/git/trees/{branch}?recursive=1"
+    response = github_get(url, commit=branch)
     if response.status_code == 200:
         tree = response.json().get("tree", [])
         return [item["path"] for item in tree if item["type"] == "blob"]
@@ -41,13 +36,8 @@ def fetch_code_from_github(owner: str, repository: str, file_path: str, branch:
     """
     Fetches the content of a file from GitHub.
     """
-    token = os.getenv("GITHUB_TOKEN")
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    url = f"https://api.github.com/repos/{owner}/{repository}/contents/{file_path}?ref={branch}"
-    response = requests.get(url, headers=headers)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repository}/contents/{file_path}?ref={branch}"
+    response = github_get(url, commit=branch)
     if response.status_code == 200:
         file_content: str = response.json().get("content", "")
         return base64.b64decode(file_content).decode("utf-8")  # Decode base64 file content
@@ -66,13 +56,19 @@ def get_imported_modules(file_content: str):
  
 def find_relevant_files(files: list, keywords: list, owner, repository, branch) -> list:
     """
-    Filters a list of files for relevance based on keywords.
+    Filters a list of files for relevance based on keywords and follows their imports.
+    Uses the import graph of the local clone when the repository was cloned, GitHub otherwise.
     """
     relevant_files = []
     for file_path in files:
         if any(keyword.lower() == file_path.lower().split(".")[0] for keyword in keywords):
             relevant_files.append(file_path)
-    
+
+    repo_path = Path(workspace_repo_path(repository))
+    if repo_path.exists():
+        graph = build_graph(str(repo_path))
+        return relevant_files + graph.dependencies(relevant_files)
+
     module_to_file = {path.split("/")[-1].replace(".py", ""): path for path in files}
     files_to_check = list(relevant_files)
     while files_to_check:
@@ -88,6 +84,31 @@ def find_relevant_files(files: list, keywords: list, owner, repository, branch)
     return relevant_files
 
 
+def find_related_files(repository: str, file_path: str, depth: int = 1) -> dict:
+    """
+    Finds the files a Python file imports and the files that import it, using the local clone.
+
+    Args:
+        repository (str): name of the repository.
+        file_path (str): Path of the Python file relative to the repository root.
+        depth (int): How many import levels to follow (default: 1).
+
+    Returns:
+        dict: "imports" and "imported_by" lists of file paths, or an error message.
+    """
+    repo_path = Path(workspace_repo_path(repository))
+    if not repo_path.exists():
+        return {"error": f"Repository '{repository}' has not been cloned."}
+    graph = build_graph(str(repo_path))
+    file_path = os.path.normpath(file_path).replace(os.sep, "/")
+    if file_path not in graph.imports:
+        return {"error": f"'{file_path}' is not a Python file of '{repository}'."}
+    return {
+        "imports": graph.dependencies([file_path], depth),
+        "imported_by": graph.dependents([file_path], depth),
+    }
+
+
 def analyze_issue(owner: str, repository: str, issue_number: int, branch: str = "main") -> dict:
     """
     Analyzes a GitHub issue, categorizes it, and dynamically fetches relevant code files.
@@ -115,6 +136,7 @@ def analyze_issue_async(owner, repository, issue_number, branch):
 def clone_repository(owner: str, repository: str) -> str:
     """
     Klont ein Git-Repository basierend auf Owner und Repository-Name in das angegebene Zielverzeichnis.
+    Das Repository wird einmal als Mirror geklont, jeder Workspace erhält einen eigenen Git-Worktree davon.
     
     Args:
         owner (str): GitHub-Owner (z. B. Benutzername oder Organisation).
@@ -124,28 +146,21 @@ def clone_repository(owner: str, repository: str) -> str:
         str: Pfad des geklonten Repositorys oder eine Fehlermeldung.
     """
     try:
-        # Erstelle die Repository-URL
-        repo_url = f"https://github.com/{owner}/{repository}.git"
-        
-        # Zielverzeichnis erstellen, falls es nicht existiert
-        destination_path = Path('./coding')
-        destination_path.mkdir(parents=True, exist_ok=True)
-        
-        # Repository-Pfad erstellen
-        repo_path = destination_path / repository
+        # Repository-Pfad im aktuellen Workspace
+        repo_path = Path(workspace_repo_path(repository))
 
         # Überprüfen, ob das Repository bereits existiert
         if repo_path.exists():
             return f"Repository '{repository}' wurde bereits geklont in {repo_path}."
 
-        # Git-Klon-Befehl ausführen
-        subprocess.run(
-            ["git", "clone", repo_url, str(repo_path)],
-            check=True,
-        )
+        # Mirror anlegen bzw. wiederverwenden und Worktree erstellen
+        mirror = ensure_mirror(owner, repository)
+        add_worktree(mirror, str(repo_path))
+        # Suchindex im Hintergrund aufbauen
+        code_search.build_in_background(str(repo_path))
         return f"Repository erfolgreich geklont: {repo_path}"
     except subprocess.CalledProcessError as e:
-        return f"Fehler beim Klonen des Repositorys: {e}"
+        return f"Fehler beim Klonen des Repositorys: {e} {e.stderr or ''}"
     
 def checkout_commit(repository: str, commit_hash: str):
     """
@@ -156,12 +171,15 @@ def checkout_commit(repository: str, commit_hash: str):
         commit_hash (str): The commit hash of the commit to check out to
     """
     try:
-        destination_path = Path('./coding')
-        destination_path.mkdir(parents=True, exist_ok=True)
-        
-        repo_path = destination_path / repository
-        
+        repo_path = workspace_repo_path(repository)
+
+        # Fetch the mirror only if the commit is not known yet.
+        mirror = find_mirror(repository)
+        if mirror and not has_commit(mirror, commit_hash):
+            update_mirror(mirror)
+
         subprocess.run(["git", "-C", repo_path, "checkout", commit_hash], check=True)
+        code_search.build_in_background(repo_path)
         print(f"Successfully checked out to commit: {commit_hash}")
     except subprocess.CalledProcessError as e:
-        print(f"Error during checkout: {e}")
\ No newline at end of file
+        print(f"Error during checkout: {e}")
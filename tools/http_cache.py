@@ -0,0 +1,160 @@
+"""
+Shared HTTP session for the GitHub toolkit.
+
+All requests go through one pooled `requests.Session`. Successful responses
+are cached on disk, keyed by URL and commit. Responses for a full commit
+hash never change and are served without a request; everything else is
+revalidated with If-None-Match / If-Modified-Since, which GitHub does not
+count against the rate limit when it answers 304. When the rate limit is
+exhausted, requests wait until X-RateLimit-Reset.
+
+Set GITHUB_API_URL to point the toolkit at a local stand-in server.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from tools.workspace import cache_dir
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# Longest time a request waits for the rate limit to reset before giving up.
+MAX_RATE_LIMIT_WAIT = float(os.getenv("SWARM_GITHUB_MAX_WAIT", 300))
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 30
+
+_COMMIT_RE = re.compile(r"^[0-9a-f]{40}$")
+_CACHED_HEADERS = ("ETag", "Last-Modified", "Content-Type")
+
+_session = None
+_session_lock = threading.Lock()
+# Time until which the rate limit is known to be exhausted.
+_blocked_until = 0.0
+
+
+def get_session() -> requests.Session:
+    """Returns the process wide session with connection pooling and the GitHub headers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept"] = "application/vnd.github.v3+json"
+            token = os.getenv("GITHUB_TOKEN")
+            if token:
+                session.headers["Authorization"] = f"Bearer {token}"
+            _session = session
+        return _session
+
+
+def _cache_path(url: str, commit: str = None) -> str:
+    key = hashlib.sha256(f"{commit or ''} {url}".encode()).hexdigest()
+    return os.path.join(cache_dir("http", key[:2]), f"{key}.json")
+
+
+def _load(path: str):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _store(path: str, response: requests.Response):
+    entry = {
+        "url": response.url,
+        "status": response.status_code,
+        "headers": {name: response.headers[name] for name in _CACHED_HEADERS if name in response.headers},
+        "body": response.text,
+    }
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(entry, file)
+    os.replace(tmp_path, path)
+
+
+def _to_response(entry: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.url = entry["url"]
+    response.encoding = "utf-8"
+    response._content = entry["body"].encode("utf-8")
+    return response
+
+
+def _rate_limit_wait(response: requests.Response, attempt: int):
+    """Seconds to wait before the next request, or None if the response is not rate limited."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        # Either seconds or an HTTP date; an unreadable value falls back to the rate limit headers.
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            pass
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = float(response.headers.get("X-RateLimit-Reset", time.time() + 2 ** attempt))
+        return max(reset - time.time(), 0) + 1
+    if response.status_code == 429:
+        return 2 ** attempt
+    return None
+
+
+def github_get(url: str, commit: str = None) -> requests.Response:
+    """
+    GET request through the shared session and response cache.
+
+    Args:
+        url (str): Full URL of the request.
+        commit (str): Branch or commit the response belongs to. Responses for full commit hashes are never revalidated.
+
+    Returns:
+        requests.Response: The (possibly cached) response.
+    """
+    global _blocked_until
+    path = _cache_path(url, commit)
+    entry = _load(path)
+    if entry is not None and commit and _COMMIT_RE.match(commit):
+        return _to_response(entry)
+
+    headers = {}
+    if entry is not None:
+        if "ETag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if "Last-Modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+    session = get_session()
+    for attempt in range(MAX_RETRIES):
+        blocked = _blocked_until - time.time()
+        if 0 < blocked <= MAX_RATE_LIMIT_WAIT:
+            time.sleep(blocked)
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in response.headers:
+            _blocked_until = float(response.headers["X-RateLimit-Reset"]) + 1
+        wait = _rate_limit_wait(response, attempt) if response.status_code in (403, 429) else None
+        if wait is None and response.status_code >= 500:
+            wait = 2 ** attempt
+        if wait is None or wait > MAX_RATE_LIMIT_WAIT or attempt == MAX_RETRIES - 1:
+            break
+        time.sleep(wait)
+
+    if response.status_code == 304 and entry is not None:
+        os.utime(path)
+        return _to_response(entry)
+    if response.status_code == 200:
+        _store(path, response)
+    return response
@@ -0,0 +1,178 @@
+"""
+Import graph of a local checkout.
+
+Every Python file is parsed with `ast`, absolute and relative imports are
+resolved against the modules that exist in the checkout and the result is
+cached per commit. Files whose mtime changed since the cache was written
+(e.g. edits by the File agent) are parsed again on load.
+"""
+import ast
+import json
+import os
+import threading
+
+from tools import repo_index
+from tools.workspace import cache_dir, checkout_key, head_commit, map_chunks
+
+_graphs = {}
+_lock = threading.Lock()
+
+
+def module_names(files: list) -> dict:
+    """Maps dotted module names to the repository relative paths of the Python files in `files`."""
+    file_set = set(files)
+    modules = {}
+    for path in files:
+        if not path.endswith(".py"):
+            continue
+        parts = path[:-3].split("/")
+        if parts[-1] == "__init__":
+            parts = parts[:-1]
+        # Walk up while the parent directory is a package to find the import root.
+        start = len(parts) - 1
+        while start > 0 and "/".join(parts[:start]) + "/__init__.py" in file_set:
+            start -= 1
+        name = ".".join(parts[start:])
+        if name:
+            modules.setdefault(name, path)
+    return modules
+
+
+def _imports_of(repo_path: str, path: str, module: str) -> list:
+    """Returns the fully qualified names imported by a file. Unresolvable relative imports are skipped."""
+    try:
+        with open(os.path.join(repo_path, path), "r", encoding="utf-8", errors="replace") as file:
+            tree = ast.parse(file.read())
+    except (SyntaxError, ValueError, OSError):
+        return []
+
+    package = module if path.endswith("__init__.py") else module.rpartition(".")[0]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base_parts = package.split(".") if package else []
+                if node.level - 1 > len(base_parts):
+                    continue
+                base = ".".join(base_parts[:len(base_parts) - (node.level - 1)])
+                if node.module:
+                    base = f"{base}.{node.module}" if base else node.module
+            else:
+                base = node.module or ""
+            if not base:
+                continue
+            names.append(base)
+            names.extend(f"{base}.{alias.name}" for alias in node.names if alias.name != "*")
+    return names
+
+
+def _parse_chunk(repo_path: str, chunk: list) -> dict:
+    return {path: _imports_of(repo_path, path, module) for path, module in chunk}
+
+
+def _resolve(name: str, modules: dict):
+    while name:
+        if name in modules:
+            return modules[name]
+        name = name.rpartition(".")[0]
+    return None
+
+
+class ImportGraph:
+    """Resolved import edges between the files of one checkout."""
+
+    def __init__(self, modules: dict, imports: dict):
+        self.modules = modules
+        self.imports = imports
+        self.imported_by = {}
+        for path, targets in imports.items():
+            for target in targets:
+                self.imported_by.setdefault(target, set()).add(path)
+
+    def _walk(self, edges: dict, paths: list, depth: int = None) -> list:
+        seen = set(paths)
+        frontier = list(paths)
+        level = 0
+        while frontier and (depth is None or level < depth):
+            next_frontier = []
+            for path in frontier:
+                for other in sorted(edges.get(path, ())):
+                    if other not in seen:
+                        seen.add(other)
+                        next_frontier.append(other)
+            frontier = next_frontier
+            level += 1
+        return sorted(seen - set(paths))
+
+    def dependencies(self, paths: list, depth: int = None) -> list:
+        """Files imported by `paths`, transitively up to `depth` levels."""
+        return self._walk(self.imports, paths, depth)
+
+    def dependents(self, paths: list, depth: int = None) -> list:
+        """Files importing `paths`, transitively up to `depth` levels."""
+        return self._walk(self.imported_by, paths, depth)
+
+
+def build_graph(repo_path: str, workers: int = None) -> ImportGraph:
+    """
+    Builds (or loads from the per-commit cache) the import graph of a checkout.
+
+    Args:
+        repo_path (str): Path to the checkout.
+        workers (int): Number of parser processes. Defaults to the number of CPUs.
+
+    Returns:
+        ImportGraph: The resolved graph.
+    """
+    commit = head_commit(repo_path)
+    key = (os.path.realpath(repo_path), commit)
+    name = checkout_key(repo_path)
+    cache_path = os.path.join(cache_dir("import_graph"), f"{name}-{commit}.json")
+
+    with _lock:
+        files = [path for path in repo_index.get_files(repo_path) if path.endswith(".py")]
+        modules = module_names(files)
+        module_of = {path: module for module, path in modules.items()}
+
+        cached = _graphs.get(key)
+        if cached is None:
+            try:
+                with open(cache_path, "r") as file:
+                    cached = json.load(file)
+            except (FileNotFoundError, ValueError):
+                cached = {}
+
+        entries = {}
+        stale = []
+        for path in files:
+            try:
+                stat = os.stat(os.path.join(repo_path, path))
+            except FileNotFoundError:
+                continue
+            signature = [stat.st_mtime_ns, stat.st_size]
+            entry = cached.get(path)
+            if entry is not None and entry["stat"] == signature:
+                entries[path] = entry
+            else:
+                entries[path] = {"stat": signature, "imports": []}
+                stale.append((path, module_of.get(path, "")))
+
+        if stale:
+            for parsed in map_chunks(_parse_chunk, repo_path, stale, workers):
+                for path, names in parsed.items():
+                    entries[path]["imports"] = names
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(entries, file)
+            os.replace(tmp_path, cache_path)
+        _graphs[key] = entries
+
+    imports = {}
+    for path, entry in entries.items():
+        targets = {_resolve(name, modules) for name in entry["imports"]}
+        targets.discard(None)
+        targets.discard(path)
+        imports[path] = targets
+    return ImportGraph(modules, imports)
@@ -0,0 +1,220 @@
+"""
+Pre-warmed pytest worker.
+
+Started once per repository environment with the interpreter of that
+environment. It imports pytest and the project's heavy dependencies, then
+reads jobs as JSON lines from stdin and forks a fresh child for every job,
+so test runs start with the imports already done but never see state left
+over by an earlier run. Events are written as JSON lines to stdout.
+
+Only depends on the standard library and pytest, because it runs inside
+the environment of the repository under test.
+"""
+import argparse
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import time
+
+# Maximum number of characters of a single failure report that is kept.
+MAX_REPORT_CHARS = 20000
+
+
+def describe_failure(nodeid: str, when: str, longrepr) -> dict:
+    """Failure report with the crash location and the traceback frames, if pytest provides them."""
+    failure = {"id": nodeid, "when": when, "report": str(longrepr)[-MAX_REPORT_CHARS:], "frames": []}
+    crash = getattr(longrepr, "reprcrash", None)
+    if crash is not None:
+        failure["crash"] = {"path": crash.path, "lineno": crash.lineno, "message": crash.message}
+    for entry in getattr(getattr(longrepr, "reprtraceback", None), "reprentries", []):
+        location = getattr(entry, "reprfileloc", None)
+        if location is None:
+            continue
+        source = [line[1:].strip() for line in getattr(entry, "lines", []) if line.startswith(">")]
+        failure["frames"].append({"path": location.path, "lineno": location.lineno, "source": source[-1] if source else ""})
+    return failure
+
+
+class ResultCollector:
+    """pytest plugin collecting outcomes and failure reports."""
+
+    def __init__(self):
+        self.counts = {"passed": 0, "failed": 0, "errors": 0, "skipped": 0, "xfailed": 0, "xpassed": 0}
+        self.failures = []
+        self.started = time.time()
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call" or (report.when in ("setup", "teardown") and report.outcome != "passed"):
+            if hasattr(report, "wasxfail"):
+                self.counts["xfailed" if report.skipped else "xpassed"] += 1
+            elif report.passed:
+                if report.when == "call":
+                    self.counts["passed"] += 1
+            elif report.skipped:
+                self.counts["skipped"] += 1
+            else:
+                self.counts["failed" if report.when == "call" else "errors"] += 1
+                self.failures.append(describe_failure(report.nodeid, report.when, report.longrepr))
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.counts["errors"] += 1
+            self.failures.append(describe_failure(report.nodeid, "collect", report.longrepr))
+
+    def result(self, exit_code: int) -> dict:
+        return {"exit_code": int(exit_code), "duration": round(time.time() - self.started, 3),
+                "counts": self.counts, "failures": self.failures}
+
+
+def _run_pytest(job: dict) -> dict:
+    import pytest
+
+    collector = ResultCollector()
+    exit_code = pytest.main(list(job["args"]) + ["-p", "no:cacheprovider"], plugins=[collector])
+    return collector.result(exit_code)
+
+
+def _child(job: dict, write_fd: int):
+    """Body of the forked child. Never returns."""
+    exit_code = 1
+    try:
+        os.setpgrp()
+        if job.get("memory_mb"):
+            import resource
+
+            limit = int(job["memory_mb"]) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        # The zygote's stdin carries the job protocol, tests must not read from it.
+        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+        output = os.open(job["output"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(output, 1)
+        os.dup2(output, 2)
+        result = _run_pytest(job)
+        exit_code = result["exit_code"]
+        data = json.dumps(result).encode()
+    except BaseException as e:
+        data = json.dumps({"exit_code": 3, "error": repr(e)}).encode()
+    try:
+        while data:
+            written = os.write(write_fd, data)
+            data = data[written:]
+    finally:
+        os._exit(exit_code)
+
+
+def _read_result(read_fd: int, deadline: float):
+    chunks = []
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None, True
+        ready, _, _ = select.select([read_fd], [], [], min(remaining, 1.0))
+        if ready:
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    data = b"".join(chunks)
+    return (json.loads(data) if data else None), False
+
+
+def _run_forked(job: dict, emit) -> dict:
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _child(job, write_fd)
+    os.close(write_fd)
+    emit({"id": job["id"], "event": "started", "pid": pid})
+
+    result, timed_out = _read_result(read_fd, time.time() + float(job.get("timeout") or 1e9))
+    os.close(read_fd)
+    if timed_out:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _, status = os.waitpid(pid, 0)
+
+    if timed_out:
+        return {"status": "timeout"}
+    if result is None:
+        if os.WIFSIGNALED(status):
+            return {"status": "killed", "signal": os.WTERMSIG(status)}
+        return {"status": "crashed", "exit_code": os.WEXITSTATUS(status)}
+    return result
+
+
+def _run_subprocess(job: dict, emit) -> dict:
+    """Fallback for platforms without fork: one fresh interpreter per job."""
+    with open(job["output"], "w") as output:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--once"],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=output, text=True)
+        emit({"id": job["id"], "event": "started", "pid": process.pid})
+        try:
+            stdout, _ = process.communicate(json.dumps(job), timeout=job.get("timeout"))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            return {"status": "timeout"}
+    lines = stdout.strip().splitlines()
+    if not lines:
+        return {"status": "crashed", "exit_code": process.returncode}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--preload", default="")
+    parser.add_argument("--once", action="store_true", help="Run a single job read from stdin and exit")
+    args = parser.parse_args()
+
+    os.chdir(args.root)
+    # Modules next to this script must not shadow modules of the repository under test.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path = [os.getcwd()] + [path for path in sys.path if os.path.abspath(path or ".") != here]
+
+    if args.once:
+        job = json.loads(sys.stdin.read())
+        result = _run_pytest(job)
+        sys.stdout.flush()
+        os.write(1, ("\n" + json.dumps(result) + "\n").encode())
+        return
+
+    # Keep the protocol channel private; stray prints of preloaded modules go to stderr.
+    protocol = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    def emit(event: dict):
+        protocol.write(json.dumps(event) + "\n")
+        protocol.flush()
+
+    import pytest  # noqa: F401
+
+    preloaded = []
+    for name in filter(None, args.preload.split(",")):
+        try:
+            __import__(name)
+            preloaded.append(name)
+        except Exception:
+            pass
+    emit({"event": "ready", "pid": os.getpid(), "preloaded": preloaded})
+
+    run = _run_forked if hasattr(os, "fork") else _run_subprocess
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        try:
+            result = run(job, emit)
+        except Exception as e:
+            result = {"status": "error", "error": repr(e)}
+        emit({"id": job["id"], "event": "finished", "result": result})
+
+
+if __name__ == "__main__":
+    main()
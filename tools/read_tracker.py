@@ -0,0 +1,80 @@
+"""
+Per-conversation memory of what read_file already delivered.
+
+For every session (context_variables["session_id"], one per instance run)
+the last text returned for each file region is kept. A repeated read of
+an unchanged region returns a short marker and a read of a changed region
+a unified diff against the delivered version, when that is shorter than
+the text itself. Memory is bounded; the least recently used entries are
+forgotten first, which only means the next read delivers full text again.
+"""
+import difflib
+import threading
+from collections import OrderedDict
+
+DEFAULT_SESSION = "default"
+MAX_TRACKED_CHARS = 64 * 1024 * 1024
+# A diff is only returned if it is at most this fraction of the full text.
+MAX_DIFF_RATIO = 0.6
+
+_delivered = OrderedDict()
+_counters = {}
+_used = 0
+_lock = threading.Lock()
+
+
+def session_of(context_variables) -> str:
+    if isinstance(context_variables, dict) and context_variables.get("session_id"):
+        return str(context_variables["session_id"])
+    return DEFAULT_SESSION
+
+
+def _forget(key):
+    global _used
+    entry = _delivered.pop(key, None)
+    if entry is not None:
+        _used -= len(entry["text"])
+
+
+def deliver(session_id: str, path: str, region: tuple, text: str, label: str) -> str:
+    """
+    Returns what to send for a read of `region` of `path` whose full answer is `text`, and remembers the delivery.
+
+    Args:
+        session_id (str): The conversation.
+        path (str): Real path of the file.
+        region (tuple): Normalized read arguments; only reads of the same region are compared.
+        text (str): The full answer of the read.
+        label (str): File name shown in markers.
+    """
+    global _used
+    key = (session_id, path, region)
+    with _lock:
+        number = _counters[session_id] = _counters.get(session_id, 0) + 1
+        previous = _delivered.get(key)
+        _forget(key)
+        _delivered[key] = {"text": text, "number": number if previous is None or previous["text"] != text else previous["number"]}
+        _used += len(text)
+        while _used > MAX_TRACKED_CHARS and len(_delivered) > 1:
+            _forget(next(iter(_delivered)))
+
+    if previous is None:
+        return text
+    if previous["text"] == text:
+        return f"[{label} unchanged since read #{previous['number']}, its content is in the conversation above]"
+    diff = "".join(difflib.unified_diff(previous["text"].splitlines(keepends=True), text.splitlines(keepends=True),
+                                        fromfile=f"a/{label}", tofile=f"b/{label}", n=2))
+    if len(diff) > MAX_DIFF_RATIO * len(text):
+        return text
+    return f"[{label} changed since read #{previous['number']} (now read #{number}), diff against that version:]\n{diff}"
+
+
+def reset(session_id: str = None):
+    """Forgets the deliveries of one session (or of all sessions)."""
+    with _lock:
+        for key in [key for key in _delivered if session_id is None or key[0] == session_id]:
+            _forget(key)
+        if session_id is None:
+            _counters.clear()
+        else:
+            _counters.pop(session_id, None)
@@ -0,0 +1,187 @@
+"""
+Persistent per-repository file index.
+
+The file list of a checkout is stored on disk together with the mtimes of
+all directories that contain indexed files. A refresh only re-lists the
+repository (with `git ls-files`, so .gitignore is respected) when one of
+those directories or the git index changed.
+"""
+import fnmatch
+import json
+import os
+import subprocess
+import threading
+
+from tools.workspace import cache_dir, checkout_key
+
+# Directories that are never listed when a checkout is not a git repository.
+EXCLUDED_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".tox", ".nox", ".venv", "venv",
+                 "build", "dist", ".eggs", ".mypy_cache", ".pytest_cache"}
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _index_path(repo_path: str) -> str:
+    name = checkout_key(repo_path)
+    return os.path.join(cache_dir("file_index"), f"{name}.json")
+
+
+def _git_dir(repo_path: str):
+    dot_git = os.path.join(repo_path, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+    if os.path.isfile(dot_git):
+        # Worktrees have a .git file pointing to their git directory.
+        with open(dot_git, "r") as file:
+            line = file.read().strip()
+        if line.startswith("gitdir:"):
+            return os.path.join(repo_path, line[len("gitdir:"):].strip())
+    return None
+
+
+def _git_state(repo_path: str):
+    git_dir = _git_dir(repo_path)
+    if git_dir is None:
+        return None
+    state = []
+    for name in ("index", "HEAD"):
+        try:
+            state.append(os.stat(os.path.join(git_dir, name)).st_mtime_ns)
+        except FileNotFoundError:
+            state.append(None)
+    return state
+
+
+def _gitignore_patterns(repo_path: str) -> list:
+    try:
+        with open(os.path.join(repo_path, ".gitignore"), "r") as file:
+            lines = [line.strip() for line in file]
+    except (FileNotFoundError, UnicodeDecodeError):
+        return []
+    return [line.rstrip("/") for line in lines if line and not line.startswith(("#", "!"))]
+
+
+def _ignored(relative_path: str, name: str, patterns: list) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern.lstrip("/"))
+               for pattern in patterns)
+
+
+def _list_files(repo_path: str) -> list:
+    if _git_dir(repo_path) is not None:
+        try:
+            output = subprocess.run(
+                ["git", "-C", repo_path, "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                check=True, capture_output=True,
+            ).stdout
+            return sorted(set(path for path in output.decode("utf-8", "replace").split("\0") if path))
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            pass
+
+    patterns = _gitignore_patterns(repo_path)
+    files = []
+    for root, dirs, names in os.walk(repo_path):
+        relative_root = os.path.relpath(root, repo_path).replace(os.sep, "/")
+        relative_root = "" if relative_root == "." else relative_root + "/"
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS and not d.endswith(".egg-info")
+                   and not _ignored(relative_root + d, d, patterns)]
+        files.extend(relative_root + name for name in names if not _ignored(relative_root + name, name, patterns))
+    return sorted(files)
+
+
+def _dir_mtimes(repo_path: str, files: list) -> dict:
+    dirs = {""}
+    for path in files:
+        parent = path.rpartition("/")[0]
+        while parent not in dirs:
+            dirs.add(parent)
+            parent = parent.rpartition("/")[0]
+    mtimes = {}
+    for directory in dirs:
+        try:
+            mtimes[directory] = os.stat(os.path.join(repo_path, directory)).st_mtime_ns
+        except FileNotFoundError:
+            mtimes[directory] = None
+    return mtimes
+
+
+def _is_current(repo_path: str, index: dict) -> bool:
+    if index.get("git") != _git_state(repo_path):
+        return False
+    for directory, mtime in index["dirs"].items():
+        try:
+            if os.stat(os.path.join(repo_path, directory)).st_mtime_ns != mtime:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _save(repo_path: str, index: dict):
+    path = _index_path(repo_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, path)
+
+
+def get_files(repo_path: str) -> list:
+    """
+    Returns the sorted, repository relative paths of all files in a checkout.
+
+    Args:
+        repo_path (str): Path to the checkout.
+
+    Returns:
+        list: Paths using "/" as separator.
+    """
+    key = os.path.realpath(repo_path)
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            try:
+                with open(_index_path(repo_path), "r") as file:
+                    index = json.load(file)
+            except (FileNotFoundError, ValueError):
+                index = None
+
+        if index is None or not _is_current(repo_path, index):
+            git_state = _git_state(repo_path)
+            files = _list_files(repo_path)
+            index = {"git": git_state, "dirs": _dir_mtimes(repo_path, files), "files": files}
+            _save(repo_path, index)
+        _indexes[key] = index
+        return index["files"]
+
+
+def note_write(repo_path: str, relative_path: str):
+    """Adds a file written by the toolkit to the index without re-listing the repository."""
+    key = os.path.realpath(repo_path)
+    relative_path = os.path.normpath(relative_path).replace(os.sep, "/")
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or not os.path.exists(os.path.join(repo_path, relative_path)):
+            return
+        if relative_path not in index["files"]:
+            index["files"] = sorted(index["files"] + [relative_path])
+        index["dirs"].update(_dir_mtimes(repo_path, [relative_path]))
+        _save(repo_path, index)
+
+
+def filter_files(files: list, pattern: str = None, max_depth: int = None) -> list:
+    """Filters paths by a glob pattern (matched against the whole relative path) and directory depth."""
+    if pattern:
+        files = [path for path in files if fnmatch.fnmatch(path, pattern)]
+    if max_depth is not None:
+        files = [path for path in files if path.count("/") < max_depth]
+    return files
+
+
+def summarize(files: list, depth: int = 1) -> list:
+    """Groups paths by their first `depth` directories and counts the files in each group."""
+    counts = {}
+    for path in files:
+        directories = path.split("/")[:-1][:depth]
+        key = "/".join(directories) + "/" if directories else "./"
+        counts[key] = counts.get(key, 0) + 1
+    return [f"{directory} ({count} files)" for directory, count in sorted(counts.items())]
@@ -0,0 +1,258 @@
+"""
+Span-based editing of Python sources.
+
+Definitions are located in the parsed module by their (optionally
+qualified) name and edited by replacing only their text span, taken from
+the node positions, so comments and formatting elsewhere in the file are
+kept and the resulting diff is minimal. Functions, async functions,
+methods (`Class.method`) and decorated definitions are supported.
+"""
+import ast
+import difflib
+import io
+import textwrap
+import tokenize
+
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+MAX_DIFF_CHARS = 4000
+
+
+def definitions(tree: ast.Module):
+    """Yields (qualified name, node) for all functions and classes of a module in source order."""
+    def walk(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, DEFINITIONS):
+                name = f"{prefix}{child.name}"
+                yield name, child
+                yield from walk(child, f"{name}.")
+            elif not isinstance(child, ast.expr):
+                yield from walk(child, prefix)
+    yield from walk(tree, "")
+
+
+def find_definition(tree: ast.Module, name: str, kinds=FUNCTIONS):
+    """
+    Finds a definition by qualified name ("Class.method"); plain names ("method") match the first definition
+    of that name at any level. Returns (qualified name, node), or (None, None) for an unknown plain name.
+    Raises ValueError for an unknown qualified name instead of editing a namesake in another scope.
+    """
+    matches = [(qualified, node) for qualified, node in definitions(tree) if isinstance(node, kinds)]
+    for qualified, node in matches:
+        if qualified == name:
+            return qualified, node
+    scope, _, plain = name.rpartition(".")
+    namesakes = [qualified for qualified, node in matches if node.name == plain]
+    if scope:
+        hint = f" Definitions named {plain}: {', '.join(namesakes)}." if namesakes else ""
+        raise ValueError(f"{name} not found.{hint}")
+    for qualified, node in matches:
+        if node.name == plain:
+            return qualified, node
+    return None, None
+
+
+class Source:
+    """Source text with conversion from ast positions (1-based lines, UTF-8 byte columns) to string offsets."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.splitlines(keepends=True)
+        self.starts = [0]
+        for line in self.lines:
+            self.starts.append(self.starts[-1] + len(line))
+
+    def offset(self, lineno: int, col_offset: int = 0) -> int:
+        if lineno > len(self.lines):
+            return len(self.text)
+        line = self.lines[lineno - 1]
+        return self.starts[lineno - 1] + len(line.encode("utf-8")[:col_offset].decode("utf-8", errors="ignore"))
+
+    def line_start(self, lineno: int) -> int:
+        return self.starts[min(lineno, len(self.lines) + 1) - 1]
+
+    def line_end(self, lineno: int) -> int:
+        """Offset of the end of a line, before its line break."""
+        if lineno > len(self.lines):
+            return len(self.text)
+        line = self.lines[lineno - 1]
+        return self.starts[lineno - 1] + len(line.rstrip("\r\n"))
+
+    def newline(self) -> str:
+        return "\r\n" if self.lines and self.lines[0].endswith("\r\n") else "\n"
+
+
+def first_line(node) -> int:
+    """First line of a definition including its decorators."""
+    return min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+
+
+def apply_edits(text: str, edits: list) -> str:
+    """Applies non-overlapping (start, end, replacement) edits given as string offsets."""
+    for start, end, replacement in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def reindent(code: str, indent: str, newline: str = "\n") -> str:
+    """Dedents code and indents every non-empty line with `indent`."""
+    lines = textwrap.dedent(code.strip("\r\n")).splitlines()
+    return newline.join(indent + line if line.strip() else "" for line in lines)
+
+
+def _indent_of(source: Source, lineno: int) -> str:
+    line = source.lines[lineno - 1]
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _header_tokens(source: Source, node):
+    """Yields (token, start offset, end offset) for the header of a function, from `def` up to the colon."""
+    start = source.offset(node.lineno, node.col_offset)
+    end = source.offset(node.body[0].lineno, node.body[0].col_offset)
+    segment = source.text[start:end]
+    base_line = node.lineno
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(segment).readline):
+            row, col = token.start
+            end_row, end_col = token.end
+            # Token columns are string offsets; the first row starts at the def itself.
+            token_start = (start + col) if row == 1 else source.line_start(base_line + row - 1) + col
+            token_end = (start + end_col) if end_row == 1 else source.line_start(base_line + end_row - 1) + end_col
+            yield token, token_start, token_end
+    except tokenize.TokenError:
+        return
+
+
+def _parameter_span(source: Source, node):
+    """Offsets of the text between the parentheses of a function's parameter list."""
+    depth = 0
+    opening = None
+    seen_name = False
+    for token, token_start, token_end in _header_tokens(source, node):
+        if not seen_name:
+            seen_name = token.type == tokenize.NAME and token.string == node.name
+            continue
+        if token.type == tokenize.OP and token.string == "(":
+            if depth == 0:
+                opening = token_end
+            depth += 1
+        elif token.type == tokenize.OP and token.string == ")":
+            depth -= 1
+            if depth == 0:
+                return opening, token_start
+    raise ValueError(f"Could not find the parameter list of {node.name}.")
+
+
+def replace_definition(text: str, name: str, content: str) -> str:
+    """
+    Replaces a function. If `content` is a complete (optionally decorated) def or async def, the whole
+    function including its decorators is replaced, otherwise only its body.
+    """
+    source = Source(text)
+    qualified, node = find_definition(ast.parse(text), name)
+    if node is None:
+        raise ValueError(f"Function {name} not found.")
+    newline = source.newline()
+
+    try:
+        parsed = ast.parse(textwrap.dedent(content.strip("\r\n")))
+        is_definition = len(parsed.body) == 1 and isinstance(parsed.body[0], FUNCTIONS)
+    except SyntaxError:
+        is_definition = False
+
+    end = source.line_end(node.end_lineno)
+    if is_definition:
+        start = source.line_start(first_line(node))
+        return apply_edits(text, [(start, end, reindent(content, _indent_of(source, node.lineno), newline))])
+
+    body = node.body[0]
+    start = source.offset(node.lineno, node.col_offset)
+    header = text[start:source.offset(body.lineno, body.col_offset)].rstrip()
+    if body.lineno > node.lineno:
+        indent = _indent_of(source, body.lineno)
+    else:
+        indent = _indent_of(source, node.lineno) + "    "
+    return apply_edits(text, [(start, end, header + newline + reindent(content, indent, newline))])
+
+
+def replace_parameters(text: str, name: str, parameters: list) -> str:
+    """Replaces the parameter list of a function with the given parameters (e.g. "x", "y: int = 0")."""
+    source = Source(text)
+    _, node = find_definition(ast.parse(text), name)
+    if node is None:
+        raise ValueError(f"Function {name} not found.")
+    start, end = _parameter_span(source, node)
+    return apply_edits(text, [(start, end, ", ".join(parameters))])
+
+
+def replace_return_annotation(text: str, name: str, annotation: str) -> str:
+    """Sets the return annotation of a function."""
+    source = Source(text)
+    _, node = find_definition(ast.parse(text), name)
+    if node is None:
+        raise ValueError(f"Function {name} not found.")
+    if node.returns is not None:
+        start = source.offset(node.returns.lineno, node.returns.col_offset)
+        end = source.offset(node.returns.end_lineno, node.returns.end_col_offset)
+        return apply_edits(text, [(start, end, annotation)])
+    _, closing = _parameter_span(source, node)
+    return apply_edits(text, [(closing + 1, closing + 1, f" -> {annotation}")])
+
+
+def _removal(source: Source, node):
+    """Edit removing a definition with its decorators and the blank lines it leaves behind."""
+    first = first_line(node)
+    last = node.end_lineno
+    # Drop the blank lines following the definition if it is preceded by blank lines, so the gap does not grow.
+    if first > 1 and not source.lines[first - 2].strip():
+        while last < len(source.lines) and not source.lines[last].strip():
+            last += 1
+    # The last definition of a file takes the blank lines before it along, so none are left at the end.
+    if last >= len(source.lines):
+        while first > 1 and not source.lines[first - 2].strip():
+            first -= 1
+    end = source.line_start(last + 1) if last < len(source.lines) else len(source.text)
+    return source.line_start(first), end, ""
+
+
+def remove_definition(text: str, name: str, kinds=FUNCTIONS) -> str:
+    """Removes a function (or, with kinds=DEFINITIONS, a class) including its decorators."""
+    source = Source(text)
+    _, node = find_definition(ast.parse(text), name, kinds)
+    if node is None:
+        raise ValueError(f"{name} not found.")
+    return apply_edits(text, [_removal(source, node)])
+
+
+def move_function_into_class(text: str, function_name: str, class_name: str) -> str:
+    """Moves a module level function to the end of a class and adds `self` as its first parameter."""
+    tree = ast.parse(text)
+    source = Source(text)
+    _, function = find_definition(tree, function_name)
+    _, cls = find_definition(tree, class_name, (ast.ClassDef,))
+    if function is None:
+        raise ValueError(f"Function {function_name} not found.")
+    if cls is None:
+        raise ValueError(f"Class {class_name} not found.")
+    if cls.lineno <= function.lineno <= cls.end_lineno:
+        raise ValueError(f"{function_name} already is part of {class_name}.")
+    newline = source.newline()
+
+    opening, closing = _parameter_span(source, function)
+    parameters = text[opening:closing]
+    function_text = (text[source.line_start(first_line(function)):opening]
+                     + ("self, " + parameters.lstrip() if parameters.strip() else "self")
+                     + text[closing:source.line_end(function.end_lineno)])
+    indent = _indent_of(source, cls.body[0].lineno) if cls.body[0].lineno > cls.lineno else "    "
+    insertion = source.line_end(cls.end_lineno)
+    method = newline + newline + reindent(function_text, indent, newline)
+    return apply_edits(text, [_removal(source, function), (insertion, insertion, method)])
+
+
+def unified_diff(old: str, new: str, path: str) -> str:
+    """Unified diff of one edit, cut to MAX_DIFF_CHARS."""
+    diff = "".join(difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True),
+                                        fromfile=f"a/{path}", tofile=f"b/{path}"))
+    if len(diff) > MAX_DIFF_CHARS:
+        diff = diff[:MAX_DIFF_CHARS] + f"\n... diff cut, {len(diff) - MAX_DIFF_CHARS} more characters"
+    return diff
@@ -0,0 +1,283 @@
+"""
+Repository wide index of qualified symbols.
+
+Every module, class, function and method of a checkout is stored with its
+qualified name (package.module.Class.method), file, line span, signature
+and the first lines of its docstring in a SQLite database per commit.
+Files are parsed in a process pool on the first build; later lookups only
+re-parse files whose mtime or size changed or that were written through
+the toolkit. Pending edit-session buffers are parsed on the fly.
+"""
+import ast
+import difflib
+import os
+import sqlite3
+import threading
+
+from tools import edit_session, repo_index
+from tools.import_graph import module_names
+from tools.source_splice import definitions
+from tools.workspace import cache_dir, checkout_key, head_commit, map_chunks, repo_path
+
+MAX_DOC_CHARS = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    qualname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    start_line INTEGER,
+    end_line INTEGER,
+    signature TEXT,
+    doc TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_qualname ON symbols (qualname);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+"""
+
+_dirty = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+def _signature(node) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(base) for base in node.bases] + [ast.unparse(keyword) for keyword in node.keywords]
+        return f"class {node.name}" + (f"({', '.join(bases)})" if bases else "")
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _doc(node) -> str:
+    doc = ast.get_docstring(node) or ""
+    return doc[:MAX_DOC_CHARS]
+
+
+def symbols_of(source: str, path: str, module: str) -> list:
+    """Returns the symbol rows (qualname, name, kind, path, start, end, signature, doc) of one module."""
+    tree = ast.parse(source)
+    lines = source.count("\n") + 1
+    rows = [(module, module.rpartition(".")[2], "module", path, 1, lines, "", _doc(tree))]
+    found = list(definitions(tree))
+    classes = {qualified for qualified, node in found if isinstance(node, ast.ClassDef)}
+    for qualified, node in found:
+        if isinstance(node, ast.ClassDef):
+            kind = "class"
+        elif qualified.rpartition(".")[0] in classes:
+            kind = "method"
+        else:
+            kind = "function"
+        start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        rows.append((f"{module}.{qualified}" if module else qualified, node.name, kind, path, start, node.end_lineno,
+                     _signature(node), _doc(node)))
+    return rows
+
+
+def _parse_chunk(repo_dir: str, chunk: list) -> list:
+    rows = []
+    for path, module in chunk:
+        try:
+            with open(os.path.join(repo_dir, path), "r", encoding="utf-8", errors="replace") as file:
+                rows.extend(symbols_of(file.read(), path, module))
+        except (SyntaxError, ValueError, OSError):
+            continue
+    return rows
+
+
+def _db_path(repo_dir: str, commit: str) -> str:
+    name = checkout_key(repo_dir)
+    return os.path.join(cache_dir("symbols"), f"{name}-{commit}.sqlite")
+
+
+def note_write(repo_dir: str, rel_path: str):
+    """Write hook: the file is re-parsed on the next lookup."""
+    if rel_path.endswith(".py"):
+        with _lock:
+            _dirty.setdefault(os.path.realpath(repo_dir), set()).add(rel_path)
+
+
+edit_session.on_write(note_write)
+
+
+def open_index(repo_dir: str, workers: int = None) -> sqlite3.Connection:
+    """
+    Opens the symbol database of a checkout and brings it up to date.
+
+    Args:
+        repo_dir (str): Path to the checkout.
+        workers (int): Number of parser processes for large updates. Defaults to the number of CPUs.
+
+    Returns:
+        sqlite3.Connection: Connection to the current database.
+    """
+    key = os.path.realpath(repo_dir)
+    with _lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        conn = sqlite3.connect(_db_path(repo_dir, head_commit(repo_dir)), timeout=60)
+        conn.executescript(_SCHEMA)
+
+        files = [path for path in repo_index.get_files(repo_dir) if path.endswith(".py")]
+        modules = module_names(files)
+        module_of = {path: module for module, path in modules.items()}
+        known = {path: (mtime, size) for path, mtime, size in conn.execute("SELECT path, mtime, size FROM files")}
+        with _lock:
+            dirty = _dirty.pop(key, set())
+
+        stale = []
+        stats = {}
+        for path in files:
+            try:
+                stat = os.stat(os.path.join(repo_dir, path))
+            except FileNotFoundError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+            if path in dirty or known.get(path) != stats[path]:
+                stale.append((path, module_of.get(path, path[:-3].replace("/", "."))))
+        removed = [path for path in known if path not in stats]
+        if not stale and not removed:
+            return conn
+
+        rows = [row for chunk_rows in map_chunks(_parse_chunk, repo_dir, stale, workers) for row in chunk_rows]
+
+        with conn:
+            paths = [(path,) for path, _ in stale] + [(path,) for path in removed]
+            conn.executemany("DELETE FROM symbols WHERE path = ?", paths)
+            conn.executemany("DELETE FROM files WHERE path = ?", paths)
+            conn.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO files VALUES (?, ?, ?)", [(path, *stats[path]) for path, _ in stale])
+        return conn
+
+
+_COLUMNS = "qualname, name, kind, path, start_line, end_line, signature, doc"
+
+
+def _pending_rows(repo_dir: str, conn: sqlite3.Connection) -> tuple:
+    """Symbols of files with pending edit-session edits, which replace their rows from the database."""
+    session = edit_session.active(repo_dir)
+    if session is None:
+        return set(), []
+    paths = {path for path in session.buffers if path.endswith(".py")}
+    rows = []
+    module_of = None
+    for path in paths:
+        module = conn.execute("SELECT qualname FROM symbols WHERE path = ? AND kind = 'module'", (path,)).fetchone()
+        if module is None and module_of is None:
+            # New files: resolve their module names like the indexed ones.
+            files = {path for path in repo_index.get_files(repo_dir) if path.endswith(".py")} | paths
+            module_of = {path: module for module, path in module_names(sorted(files)).items()}
+        name = module[0] if module else module_of.get(path, path[:-3].replace("/", "."))
+        try:
+            rows.extend(symbols_of(session.buffers[path], path, name))
+        except SyntaxError:
+            continue
+    return paths, rows
+
+
+def _as_dict(row) -> dict:
+    qualname, name, kind, path, start, end, signature, doc = row
+    result = {"qualname": qualname, "kind": kind, "file": path, "span": [start, end]}
+    if signature:
+        result["signature"] = signature
+    if doc:
+        result["doc"] = doc
+    return result
+
+
+def lookup(repo_dir: str, query: str, kind: str = None, limit: int = 20) -> list:
+    """Symbols matching a qualified, partially qualified or plain name; fuzzy matches when nothing matches exactly."""
+    conn = open_index(repo_dir)
+    try:
+        pending_paths, pending = _pending_rows(repo_dir, conn)
+        plain = query.rpartition(".")[2]
+        pattern = f"%{query.lower()}%"
+        rows = conn.execute(f"SELECT {_COLUMNS} FROM symbols WHERE name = ? OR lower(qualname) LIKE ?", (plain, pattern)).fetchall()
+        rows = [row for row in rows if row[3] not in pending_paths]
+        rows += [row for row in pending if row[1] == plain or query.lower() in row[0].lower()]
+
+        if not rows:
+            names = [name for (name,) in conn.execute("SELECT DISTINCT name FROM symbols")]
+            names += [row[1] for row in pending]
+            close = difflib.get_close_matches(plain, set(names), n=5, cutoff=0.6)
+            if not close:
+                close = [name for name in set(names) if plain.lower() in name.lower()][:20]
+            if close:
+                marks = ",".join("?" * len(close))
+                rows = conn.execute(f"SELECT {_COLUMNS} FROM symbols WHERE name IN ({marks})", close).fetchall()
+                rows = [row for row in rows if row[3] not in pending_paths]
+                rows += [row for row in pending if row[1] in close]
+    finally:
+        conn.close()
+
+    if kind:
+        rows = [row for row in rows if row[2] == kind]
+
+    def rank(row):
+        qualname, name = row[0], row[1]
+        if qualname == query:
+            exactness = 0
+        elif qualname.endswith("." + query):
+            exactness = 1
+        elif name == plain:
+            exactness = 2
+        else:
+            exactness = 3
+        return exactness, "test" in row[3], qualname.count("."), qualname
+
+    return [_as_dict(row) for row in sorted(set(rows), key=rank)[:limit]]
+
+
+def find_symbol(repository_name: str, query: str, kind: str = None, limit: int = 20) -> list:
+    """
+    Finds classes, functions, methods and modules anywhere in the repository by name.
+
+    Args:
+        repository_name (str): The name of the repository.
+        query (str): Qualified name ("django.db.models.Model.save"), partially qualified name ("Model.save"),
+                     plain name ("save") or an approximate name.
+        kind (str): Optional filter: "class", "function", "method" or "module".
+        limit (int): Maximum number of results (default: 20).
+
+    Returns:
+        list: Matches with qualname, kind, file, span [start_line, end_line], signature and docstring, best first.
+    """
+    repo_dir = repo_path(repository_name)
+    if not os.path.exists(repo_dir):
+        return [f"Error: Repository path '{repo_dir}' does not exist."]
+    return lookup(repo_dir, query, kind, limit) or [f"No symbol matching '{query}' found."]
+
+
+def goto_symbol(repository_name: str, qualname: str, context_lines: int = 0) -> dict:
+    """
+    Returns the source code of a symbol, found by (partially) qualified name, without having to know its file.
+
+    Args:
+        repository_name (str): The name of the repository.
+        qualname (str): Qualified or partially qualified name, e.g. "QuerySet.filter".
+        context_lines (int): Additional lines before and after the symbol (default: 0).
+
+    Returns:
+        dict: qualname, file, span and the line numbered code, plus other candidates if the name is ambiguous.
+    """
+    repo_dir = repo_path(repository_name)
+    if not os.path.exists(repo_dir):
+        return {"error": f"Repository path '{repo_dir}' does not exist."}
+    matches = [match for match in lookup(repo_dir, qualname, limit=10) if match["kind"] != "module"]
+    if not matches:
+        return {"error": f"No symbol matching '{qualname}' found."}
+    best = matches[0]
+    lines = edit_session.read(repo_dir, best["file"]).splitlines()
+    start = max(1, best["span"][0] - context_lines)
+    end = min(len(lines), best["span"][1] + context_lines)
+    result = dict(best, code="\n".join(f"{number}: {lines[number - 1]}" for number in range(start, end + 1)))
+    if len(matches) > 1:
+        result["other_candidates"] = [match["qualname"] for match in matches[1:]]
+    return result
@@ -0,0 +1,148 @@
+"""
+Compact digests of pytest results for the agents' context.
+
+Failures with the same error at the same crash location (the frames
+inside the repository below the test function) are grouped, frames outside
+the repository are dropped and the digest is cut to a fixed size. The
+complete result is stored under a handle that get_test_details() resolves
+when an agent needs more.
+"""
+import json
+import os
+import re
+
+from tools.workspace import cache_dir
+
+MAX_DIGEST_CHARS = 4000
+MAX_GROUPS = 8
+MAX_IDS_PER_GROUP = 5
+MAX_FRAMES = 4
+MAX_MESSAGE_CHARS = 400
+
+_NOISE_RE = re.compile(r"0x[0-9a-fA-F]+|\b\d+\b")
+
+
+def _repo_relative(path: str, repo_dir: str):
+    """Returns the repository relative path of a frame, or None for frames outside the repository."""
+    if not path:
+        return None
+    if os.path.isabs(path):
+        path = os.path.relpath(path, os.path.abspath(repo_dir))
+    path = path.replace(os.sep, "/")
+    if path.startswith("../") or "site-packages/" in path or path.startswith("<"):
+        return None
+    return path
+
+
+def _message(failure: dict) -> str:
+    crash = failure.get("crash")
+    if crash and crash.get("message"):
+        return crash["message"]
+    report = failure.get("report", "")
+    lines = [line for line in report.splitlines() if line.startswith("E ")]
+    if lines:
+        return "\n".join(lines)
+    return report.strip().splitlines()[-1] if report.strip() else ""
+
+
+def group_failures(failures: list, repo_dir: str) -> list:
+    """Groups failures by error message and crash location, the in-repository frames below the test function."""
+    groups = {}
+    for failure in failures:
+        frames = []
+        for frame in failure.get("frames", []):
+            path = _repo_relative(frame.get("path"), repo_dir)
+            if path:
+                frames.append(f"{path}:{frame.get('lineno')}" + (f"  {frame['source']}" if frame.get("source") else ""))
+        # The outermost frame is the test function itself; tests failing in the same helper share everything below it.
+        crash = frames[1:] if len(frames) > 1 and frames[0].startswith(f"{failure['id'].split('::')[0]}:") else frames
+        message = _message(failure)
+        key = (_NOISE_RE.sub("#", message.splitlines()[-1] if message else ""), tuple(crash[-MAX_FRAMES:]))
+        group = groups.setdefault(key, {"message": message[:MAX_MESSAGE_CHARS], "frames": frames[-MAX_FRAMES:], "tests": []})
+        group["tests"].append(failure["id"])
+    return sorted(groups.values(), key=lambda group: -len(group["tests"]))
+
+
+def store_report(handle: str, result: dict) -> str:
+    path = os.path.join(cache_dir("test_reports"), f"{handle}.json")
+    with open(path, "w") as file:
+        json.dump(result, file)
+    return path
+
+
+def load_report(handle: str):
+    try:
+        with open(os.path.join(cache_dir("test_reports"), f"{os.path.basename(handle)}.json"), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def digest(raw: dict, repo_dir: str, handle: str, max_chars: int = MAX_DIGEST_CHARS) -> dict:
+    """
+    Builds the bounded digest of a raw pytest result and stores the full result under `handle`.
+
+    Returns:
+        dict: failure groups (count, example test ids, message, in-repo frames), the number of failing
+        tests and the handle for get_test_details.
+    """
+    store_report(handle, raw)
+    failures = raw.get("failures", [])
+    groups = []
+    for group in group_failures(failures, repo_dir)[:MAX_GROUPS]:
+        tests = group["tests"]
+        entry = {"count": len(tests), "tests": tests[:MAX_IDS_PER_GROUP], "message": group["message"],
+                 "frames": group["frames"]}
+        if len(tests) > MAX_IDS_PER_GROUP:
+            entry["tests"].append(f"... and {len(tests) - MAX_IDS_PER_GROUP} more")
+        groups.append(entry)
+
+    result = {"failing": len(failures), "groups": groups, "details_handle": handle}
+    # Drop the least frequent groups until the digest fits.
+    while len(json.dumps(result)) > max_chars and len(groups) > 1:
+        groups.pop()
+        result["truncated"] = True
+    if len(json.dumps(result)) > max_chars and groups:
+        groups[0]["message"] = groups[0]["message"][:max_chars // 4]
+        groups[0]["frames"] = groups[0]["frames"][-2:]
+    return result
+
+
+def get_test_details(handle: str, test_id: str = None, offset: int = 0, max_chars: int = 8000) -> str:
+    """
+    Returns details of an earlier test run that were left out of its digest.
+
+    Args:
+        handle (str): details_handle of the test run.
+        test_id (str): Failing test to show the full report for. Without it all failing test ids are listed.
+        offset (int): Character offset into the report (or index into the list of failing tests) for paging.
+        max_chars (int): Maximum number of characters returned (default: 8000).
+
+    Returns:
+        str: The requested details or an error message.
+    """
+    report = load_report(handle)
+    if report is None:
+        return f"Error: No test report with handle '{handle}'."
+    failures = report.get("failures", [])
+    if test_id is None:
+        ids = [failure["id"] for failure in failures]
+        page = []
+        size = 0
+        for test in ids[offset:]:
+            size += len(test) + 1
+            if size > max_chars:
+                break
+            page.append(test)
+        text = "\n".join(page)
+        if offset + len(page) < len(ids):
+            text += f"\n... {len(ids) - offset - len(page)} more, call again with offset={offset + len(page)}"
+        return text or "No failing tests."
+    for failure in failures:
+        if failure["id"] == test_id:
+            text = failure.get("report", "")
+            chunk = text[offset:offset + max_chars]
+            if offset + max_chars < len(text):
+                chunk += f"\n... {len(text) - offset - max_chars} more characters, call again with offset={offset + max_chars}"
+            return chunk
+    return f"Error: '{test_id}' did not fail in run '{handle}'."
@@ -0,0 +1,205 @@
+"""
+Test impact selection for a checkout.
+
+Changed files and functions are taken from `git diff` against a base
+commit. Test modules are selected when they (transitively) import a
+changed module, and single tests when they reference a changed function
+or, if a coverage map exists for the commit, execute a changed line.
+"""
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+from tools import ast_cache
+from tools.import_graph import build_graph
+from tools.workspace import cache_dir, checkout_key
+
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+def _git(repo_dir: str, *args) -> str:
+    return subprocess.run(["git", "-C", repo_dir, *args], check=True, capture_output=True, text=True).stdout
+
+
+def is_test_file(path: str) -> bool:
+    name = os.path.basename(path)
+    if not path.endswith(".py") or name in ("conftest.py", "__init__.py"):
+        return False
+    in_test_dir = any(part in ("tests", "testing") for part in path.split("/")[:-1])
+    return name.startswith("test") or name.endswith(("_test.py", "_tests.py")) or in_test_dir
+
+
+def changed_lines(repo_dir: str, base: str = "HEAD") -> dict:
+    """Maps changed files to the (start, end) line ranges changed in their current version."""
+    ranges = {}
+    current = None
+    for line in _git(repo_dir, "diff", "-U0", "--no-color", base).splitlines():
+        if line.startswith("+++ "):
+            current = line[6:] if line.startswith("+++ b/") else None
+            if current:
+                ranges.setdefault(current, [])
+        elif current and line.startswith("@@"):
+            match = _HUNK_RE.match(line)
+            if match:
+                start, count = int(match.group(1)), int(match.group(2) or 1)
+                ranges[current].append((start, start + max(count, 1) - 1))
+    for path in _git(repo_dir, "ls-files", "--others", "--exclude-standard").splitlines():
+        ranges[path] = [(1, float("inf"))]
+    return ranges
+
+
+def _definitions(tree: ast.Module):
+    """Yields (qualified name, node) for all functions and classes of a module."""
+    stack = [(tree, "")]
+    while stack:
+        node, prefix = stack.pop()
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = f"{prefix}{child.name}"
+                yield name, child
+                stack.append((child, f"{name}."))
+
+
+def changed_functions(repo_dir: str, ranges: dict) -> dict:
+    """Maps changed Python files to the qualified names of the functions and classes overlapping the changes."""
+    result = {}
+    for path, spans in ranges.items():
+        full_path = os.path.join(repo_dir, path)
+        if not path.endswith(".py") or not os.path.exists(full_path):
+            continue
+        try:
+            tree = ast_cache.get_tree(full_path)
+        except (SyntaxError, ValueError):
+            continue
+        names = set()
+        for name, node in _definitions(tree):
+            start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            if any(start <= end and node.end_lineno >= begin for begin, end in spans):
+                names.add(name)
+        result[path] = names
+    return result
+
+
+def _test_ids(repo_dir: str, path: str) -> dict:
+    """Maps the pytest ids of the tests in a module to the names they reference."""
+    try:
+        tree = ast_cache.get_tree(os.path.join(repo_dir, path))
+    except (SyntaxError, ValueError, OSError):
+        return {}
+    tests = {}
+    # Pytest collects test functions of modules and (nested) classes only, helpers defined inside tests are no tests.
+    stack = [(tree, "")]
+    while stack:
+        parent, prefix = stack.pop()
+        for node in parent.body:
+            if isinstance(node, ast.ClassDef):
+                stack.append((node, f"{prefix}{node.name}::"))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+                tests[f"{path}::{prefix}{node.name}"] = _referenced_names(node)
+    return tests
+
+
+def _referenced_names(node: ast.AST) -> set:
+    referenced = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            referenced.add(child.id)
+        elif isinstance(child, ast.Attribute):
+            referenced.add(child.attr)
+    return referenced
+
+
+def coverage_map_path(repo_dir: str) -> str:
+    commit = _git(repo_dir, "rev-parse", "HEAD").strip()
+    name = checkout_key(repo_dir)
+    return os.path.join(cache_dir("coverage"), f"{name}-{commit}.json")
+
+
+def build_coverage_map(repo_dir: str, args: list = None, timeout: float = 3600, python: str = None) -> str:
+    """
+    Runs the test suite once under coverage with per-test contexts and stores a {file: {line: [test ids]}} map
+    for the current commit. Needs pytest-cov in the environment of the checkout.
+
+    Returns:
+        str: Path of the stored map.
+    """
+    path = coverage_map_path(repo_dir)
+    raw_path = os.path.abspath(f"{path}.raw.json")
+    python = python or sys.executable
+    subprocess.run([python, "-m", "pytest", "-q", "--cov=.", "--cov-context=test", "-p", "no:cacheprovider", *(args or [])],
+                   cwd=repo_dir, capture_output=True, timeout=timeout)
+    subprocess.run([python, "-m", "coverage", "json", "--show-contexts", "-o", raw_path],
+                   cwd=repo_dir, check=True, capture_output=True)
+    with open(raw_path, "r") as file:
+        raw = json.load(file)
+    os.remove(raw_path)
+
+    coverage_map = {}
+    for file_path, data in raw.get("files", {}).items():
+        lines = {}
+        for line, contexts in data.get("contexts", {}).items():
+            tests = sorted({context.split("|")[0] for context in contexts if context})
+            if tests:
+                lines[line] = tests
+        coverage_map[os.path.relpath(os.path.join(repo_dir, file_path), repo_dir).replace(os.sep, "/")] = lines
+    with open(path, "w") as file:
+        json.dump(coverage_map, file)
+    return path
+
+
+def load_coverage_map(repo_dir: str):
+    try:
+        with open(coverage_map_path(repo_dir), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def select_tests(repo_dir: str, base: str = "HEAD") -> dict:
+    """
+    Selects the tests affected by the changes of a checkout against `base`.
+
+    Args:
+        repo_dir (str): Path to the checkout.
+        base (str): Commit to diff against. Defaults to HEAD, i.e. the uncommitted changes.
+
+    Returns:
+        dict: changed_files, changed_functions, test_ids (most specific selection) and test_modules (broader selection).
+    """
+    ranges = changed_lines(repo_dir, base)
+    functions = changed_functions(repo_dir, ranges)
+    changed = sorted(path for path in ranges if path.endswith(".py"))
+    changed_names = {name.rpartition(".")[2] for names in functions.values() for name in names}
+
+    graph = build_graph(repo_dir)
+    impacted = set(changed) | set(graph.dependents(changed))
+    test_modules = sorted(path for path in impacted if is_test_file(path))
+
+    test_ids = set()
+    for path in test_modules:
+        if path in ranges:
+            # Changed or new test modules are run completely.
+            test_ids.add(path)
+            continue
+        for test_id, referenced in _test_ids(repo_dir, path).items():
+            if referenced & changed_names:
+                test_ids.add(test_id)
+
+    coverage_map = load_coverage_map(repo_dir)
+    if coverage_map:
+        for path, spans in ranges.items():
+            for line, tests in coverage_map.get(path, {}).items():
+                if any(begin <= int(line) <= end for begin, end in spans):
+                    test_ids.update(tests)
+
+    # Drop single tests of modules that are selected completely.
+    test_ids = sorted(test_id for test_id in test_ids if "::" not in test_id or test_id.split("::")[0] not in test_ids)
+    return {
+        "changed_files": changed,
+        "changed_functions": {path: sorted(names) for path, names in functions.items() if names},
+        "test_ids": test_ids,
+        "test_modules": test_modules,
+    }
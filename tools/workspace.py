@@ -0,0 +1,75 @@
+"""Locations on disk shared by the toolkits."""
+import contextvars
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+CACHE_DIR = os.getenv("SWARM_CACHE_DIR", ".swarm_cache")
+# Below this number of files map_chunks works in the current process, which is faster than starting a pool.
+PARALLEL_THRESHOLD = 200
+
+# Repository name -> checkout name, set per branch by swarm_best_of_n so every branch works in its own worktree.
+_redirects = contextvars.ContextVar("swarm_repository_redirects", default={})
+
+
+def cache_dir(*parts: str) -> str:
+    """Returns (and creates) a directory below the swarm cache directory."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def checkout_key(repo_dir: str) -> str:
+    """File name for the per-checkout caches of `repo_dir`, derived from its real path."""
+    return os.path.realpath(repo_dir).strip(os.sep).replace(os.sep, "__").replace(":", "")
+
+
+def head_commit(repo_dir: str) -> str:
+    """Commit checked out in `repo_dir`, or "worktree" outside of git. The per-checkout caches are keyed by it."""
+    try:
+        return subprocess.run(["git", "-C", repo_dir, "rev-parse", "HEAD"],
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "worktree"
+
+
+def map_chunks(function, repo_dir: str, items: list, workers: int = None) -> list:
+    """
+    Calls `function(repo_dir, chunk)` on consecutive chunks of `items` and returns the results in order.
+
+    Large inputs are split over a process pool. Its workers start from a fork server (fresh interpreters
+    on Windows) instead of forking the agents' process with whatever its threads hold locked.
+    """
+    if len(items) < PARALLEL_THRESHOLD:
+        return [function(repo_dir, items)]
+    workers = workers or os.cpu_count() or 1
+    size = -(-len(items) // (workers * 4))
+    chunks = [items[start:start + size] for start in range(0, len(items), size)]
+    context = multiprocessing.get_context("spawn" if os.name == "nt" else "forkserver")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(function, [repo_dir] * len(chunks), chunks))
+
+
+def workspace_root() -> str:
+    """Directory holding the repository checkouts. Batch runs point SWARM_WORKSPACE to a directory per instance."""
+    return os.getenv("SWARM_WORKSPACE", "./coding")
+
+
+def repo_path(repository: str) -> str:
+    """Path of the checkout of a repository in the current workspace."""
+    return f"{workspace_root()}/{_redirects.get().get(repository, repository)}"
+
+
+@contextmanager
+def redirect_repositories(redirects: dict):
+    """
+    Resolves repository names to other checkouts in the current context (thread or asyncio task), e.g.
+    {"django": "django__cand1"}. Threads started with asyncio.to_thread inherit the redirects.
+    """
+    token = _redirects.set(dict(_redirects.get(), **redirects))
+    try:
+        yield
+    finally:
+        _redirects.reset(token)